@@ -17,11 +17,14 @@ import partcad.logging as pc_logging
 from partcad.user_config import user_config
 
 from .cli_add import *
+from .cli_bench import *
+from .cli_cache import *
 from .cli_init import *
 from .cli_info import *
 from .cli_install import *
 from .cli_list import *
 from .cli_render import *
+from .cli_runtime import *
 from .cli_inspect import *
 from .cli_status import *
 from .cli_supply_find import *
@@ -32,7 +35,12 @@ from .cli_test import *
 
 
 # Initialize plugins that are not enabled by default
-pc.plugins.export_png = pc.PluginExportPngReportlab()
+if pc.user_config.png_exporter == "numpy":
+    pc.plugins.export_png = pc.PluginExportPngNumpy(
+        fallback=pc.PluginExportPngReportlab()
+    )
+else:
+    pc.plugins.export_png = pc.PluginExportPngReportlab()
 
 
 def main():
@@ -66,6 +74,20 @@ def main():
         default=None,
         dest="config_path",
     )
+    parser.add_argument(
+        "--trace",
+        help="Record the timings of all actions and save them to this file (see '--trace-format')",
+        type=str,
+        default=None,
+        dest="trace",
+    )
+    parser.add_argument(
+        "--trace-format",
+        help="The format of the trace file: 'chrome' (chrome://tracing, Perfetto) or 'otlp' (OpenTelemetry JSON)",
+        choices=["chrome", "otlp"],
+        default="chrome",
+        dest="trace_format",
+    )
     # TODO(clairbee): add a config option to change logging mechanism and level
 
     # Top level commands
@@ -75,11 +97,14 @@ def main():
         help="Print PartCAD version and exit",
     )
     cli_help_add(subparsers)
+    cli_help_bench(subparsers)
+    cli_help_cache(subparsers)
     cli_help_init(subparsers)
     cli_help_info(subparsers)
     cli_help_install(subparsers)
     cli_help_list(subparsers)
     cli_help_render(subparsers)
+    cli_help_runtime(subparsers)
     cli_help_inspect(subparsers)
     cli_help_status(subparsers)
     cli_help_test(subparsers)
@@ -114,6 +139,9 @@ def main():
         else:
             pc.logging.setLevel(logging.INFO)
 
+    if args.trace is not None:
+        pc.tracing.tracer.enable()
+
     try:
         # First, handle the commands that don't require a context or initialize it
         # in their own way
@@ -123,6 +151,14 @@ def main():
         elif args.command == "status":
             cli_status(args)
             return
+        elif args.command == "cache":
+            with pc_logging.Process("Cache", "this"):
+                cli_cache(args)
+            return
+        elif args.command == "bench":
+            with pc_logging.Process("Bench", "this"):
+                cli_bench(args)
+            return
         elif args.command == "version":
             pc_logging.info("PartCAD version: %s" % pc.__version__)
             return
@@ -194,6 +230,10 @@ def main():
             with pc_logging.Process("inspect", "this"):
                 cli_inspect(args, ctx)
 
+        elif args.command == "runtime":
+            with pc_logging.Process("Runtime", "this"):
+                cli_runtime(args, ctx)
+
         elif args.command == "supply":
             if args.supply_command == "find":
                 with pc_logging.Process("SupplyFind", "this"):
@@ -221,6 +261,15 @@ def main():
     except:
         pc.logging.exception("PartCAD CLI exception")
 
+    if args.trace is not None:
+        try:
+            pc.tracing.tracer.save(
+                args.trace, args.trace_format, pc.__version__
+            )
+            pc_logging.info("Trace saved to %s" % args.trace)
+        except Exception as e:
+            pc_logging.error("Failed to save the trace: %s" % e)
+
     if not args.no_ansi:
         pc.logging_ansi_terminal_fini()
     if pc_logging.had_errors:
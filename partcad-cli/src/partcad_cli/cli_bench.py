@@ -0,0 +1,127 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-11
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import json
+import os
+
+import partcad as pc
+import partcad.logging as pc_logging
+from partcad.benchmark import create_suite
+
+
+# TODO(clairbee): fix type checking here
+# def cli_help_bench(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]):
+def cli_help_bench(subparsers):
+    parser_bench = subparsers.add_parser(
+        "bench",
+        help="Measure instantiation and rendering performance using the bundled examples",
+    )
+    parser_bench.add_argument(
+        "--examples",
+        help="Path to the examples package (default: ./examples)",
+        type=str,
+        dest="examples",
+        default="examples",
+    )
+    parser_bench.add_argument(
+        "-n",
+        "--rounds",
+        help="The number of warm rounds per benchmark (default: 5)",
+        type=int,
+        dest="rounds",
+        default=5,
+    )
+    parser_bench.add_argument(
+        "-k",
+        help="Only run the benchmarks containing this substring (e.g. 'render/'), can be repeated",
+        type=str,
+        dest="filters",
+        action="append",
+        default=None,
+    )
+    parser_bench.add_argument(
+        "--json",
+        help="Write the results to this file",
+        type=str,
+        dest="json",
+        default=None,
+    )
+    parser_bench.add_argument(
+        "--compare",
+        help="Compare the results with a file produced by '--json' earlier",
+        type=str,
+        dest="compare",
+        default=None,
+    )
+    parser_bench.add_argument(
+        "--threshold",
+        help="Report the slowdowns above this percentage as regressions (default: 10)",
+        type=float,
+        dest="threshold",
+        default=10.0,
+    )
+
+
+def cli_bench(args):
+    if not os.path.exists(os.path.join(args.examples, "partcad.yaml")):
+        pc_logging.error("Examples package not found: %s" % args.examples)
+        return
+
+    baseline = None
+    if args.compare is not None:
+        with open(args.compare, "r") as f:
+            baseline = json.load(f)
+
+    ctx = pc.init(args.examples)
+    suite = create_suite(ctx, rounds=args.rounds, filters=args.filters)
+    try:
+        suite.run()
+    finally:
+        suite.cleanup()
+
+    for result in suite.results:
+        if result.error is not None:
+            continue
+        median = result.get_median()
+        throughput, unit = result.get_throughput()
+        memory = "%s: %.1fMB" % (
+            "Python" if result.peak_traced else "RSS",
+            result.peak_rss / 1048576.0,
+        )
+        if result.workers_peak_rss is not None:
+            memory += " workers: %.1fMB" % (result.workers_peak_rss / 1048576.0)
+        pc_logging.info(
+            "%-50s cold: %8.4fs warm: %8.4fs %10.2f %s %s"
+            % (
+                result.id,
+                result.cold,
+                median,
+                throughput or 0.0,
+                unit or "",
+                memory,
+            )
+        )
+
+    if args.json is not None:
+        with open(args.json, "w") as f:
+            json.dump(suite.to_dict(), f, indent=2)
+        pc_logging.info("Results saved to %s" % args.json)
+
+    if baseline is not None:
+        for id, before, after, ratio in suite.compare(baseline):
+            message = "%-50s %8.4fs -> %8.4fs (%+.1f%%)" % (
+                id,
+                before,
+                after,
+                (ratio - 1.0) * 100.0,
+            )
+            if (ratio - 1.0) * 100.0 > args.threshold:
+                pc_logging.warning("Regression: %s" % message)
+            else:
+                pc_logging.info(message)
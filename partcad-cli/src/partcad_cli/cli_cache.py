@@ -0,0 +1,80 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-05
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import partcad.logging as pc_logging
+from partcad.cache import cache
+
+
+# TODO(clairbee): fix type checking here
+# def cli_help_cache(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]):
+def cli_help_cache(subparsers):
+    parser_cache = subparsers.add_parser(
+        "cache",
+        help="Inspect or prune the persistent cache of build artifacts",
+    )
+    cache_subparsers = parser_cache.add_subparsers(dest="cache_command")
+
+    cache_subparsers.add_parser(
+        "status",
+        help="Display the size of the cache (default)",
+    )
+
+    parser_prune = cache_subparsers.add_parser(
+        "prune",
+        help="Evict the least recently used artifacts",
+    )
+    parser_prune.add_argument(
+        "-s",
+        "--max-size",
+        help="The size in megabytes to shrink the cache to (default: the configured limit)",
+        dest="max_size",
+        type=int,
+        default=None,
+    )
+
+    cache_subparsers.add_parser(
+        "clear",
+        help="Remove all artifacts from the cache",
+    )
+
+
+def cli_cache(args):
+    if args.cache_command == "prune":
+        max_size = None
+        if args.max_size is not None:
+            max_size = args.max_size * 1048576
+        count, freed = cache.prune(max_size)
+        pc_logging.info(
+            "Evicted %d artifacts (%.2fMB)" % (count, freed / 1048576.0)
+        )
+    elif args.cache_command == "clear":
+        cache.clear()
+        pc_logging.info("Cache cleared: %s" % cache.path)
+    else:
+        pc_logging.info("Cache location: %s" % cache.path)
+        if not cache.enabled:
+            pc_logging.info("Cache is disabled")
+
+        total_count = 0
+        total_size = 0
+        for kind, stats in cache.stats().items():
+            pc_logging.info(
+                "Cached %s: %d artifacts (%.2fMB)"
+                % (kind, stats["count"], stats["size"] / 1048576.0)
+            )
+            total_count += stats["count"]
+            total_size += stats["size"]
+        pc_logging.info(
+            "Total: %d artifacts (%.2fMB out of %.2fMB)"
+            % (
+                total_count,
+                total_size / 1048576.0,
+                cache.max_size / 1048576.0,
+            )
+        )
@@ -11,6 +11,7 @@ import asyncio
 from pprint import pformat
 
 import partcad.logging as pc_logging
+from partcad.memory import budget, format_size
 
 
 def cli_help_info(subparsers):
@@ -56,8 +57,10 @@ def cli_help_info(subparsers):
 
     parser_info.add_argument(
         "object",
-        help="Part (default), assembly or scene to show",
+        help="Part (default), assembly or scene to show (default: show the memory usage of the loaded packages only)",
         type=str,
+        nargs="?",
+        default=None,
     )
 
     parser_info.add_argument(
@@ -71,6 +74,10 @@ def cli_help_info(subparsers):
 
 
 def cli_info(args, ctx):
+    if args.object is None:
+        show_memory(ctx)
+        return
+
     params = {}
     if not args.params is None:
         for kv in args.params:
@@ -107,3 +114,31 @@ def cli_info(args, ctx):
         info = obj.info()
         for k, v in info.items():
             pc_logging.info("INFO: %s: %s" % (k, pformat(v)))
+        show_memory(ctx)
+
+
+def show_memory(ctx):
+    ctx.stats_recalc()
+    for name, stats in sorted(ctx.stats_memory_packages.items()):
+        if stats["shapes"] == 0:
+            continue
+        pc_logging.info(
+            "MEMORY: %s: %d shape(s), %d instantiated: Python %s, OCCT %s"
+            % (
+                name,
+                stats["shapes"],
+                stats["instantiated"],
+                format_size(stats["python"]),
+                format_size(stats["native"]),
+            )
+        )
+    pc_logging.info("MEMORY: Total: %s" % format_size(ctx.stats_memory))
+    if budget.enabled:
+        pc_logging.info(
+            "MEMORY: Budget: %s of %s used, %d shape(s) evicted"
+            % (
+                format_size(budget.size),
+                format_size(budget.limit),
+                budget.stats_evicted,
+            )
+        )
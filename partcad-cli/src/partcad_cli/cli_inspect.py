@@ -7,7 +7,10 @@
 # Licensed under Apache License, Version 2.0.
 #
 
+import asyncio
+
 import partcad.logging as pc_logging
+from partcad.properties import describe
 
 
 # TODO(clairbee): fix type checking here
@@ -119,5 +122,11 @@ def cli_inspect(args, ctx):
             pc_logging.info("Summary: %s" % summary)
             if args.quiet > 0:
                 print("%s" % summary)
+
+            if hasattr(obj, "get_properties"):
+                properties = asyncio.run(obj.get_properties(ctx))
+                pc_logging.info("Properties: %s" % describe(properties))
+                if args.quiet > 0:
+                    print("%s" % describe(properties))
         else:
             obj.show()
@@ -50,6 +50,27 @@ def cli_help_render(subparsers: argparse.ArgumentParser):
         ],
     )
 
+    parser_render.add_argument(
+        "-j",
+        "--jobs",
+        help="The number of shapes to instantiate or project concurrently (default: the number of CPU cores)",
+        dest="jobs",
+        type=int,
+        default=None,
+    )
+    parser_render.add_argument(
+        "--timings",
+        help="Display the time spent on each rendering job",
+        dest="timings",
+        action="store_true",
+    )
+    parser_render.add_argument(
+        "--force",
+        help="Render the files even if they are up to date",
+        dest="force",
+        action="store_true",
+    )
+
     parser_render.add_argument(
         "-P",
         "--package",
@@ -101,6 +122,9 @@ def cli_help_render(subparsers: argparse.ArgumentParser):
 
 def cli_render(args, ctx):
     ctx.option_create_dirs = args.create_dirs
+    ctx.option_render_jobs = args.jobs
+    ctx.option_render_timings = args.timings
+    ctx.option_force = args.force
 
     package = args.package if args.package is not None else ""
     if args.recursive:
@@ -0,0 +1,66 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-15
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import partcad.logging as pc_logging
+import partcad.utils as pc_utils
+
+
+# TODO(clairbee): fix type checking here
+# def cli_help_runtime(subparsers: argparse._SubParsersAction[argparse.ArgumentParser]):
+def cli_help_runtime(subparsers):
+    parser_runtime = subparsers.add_parser(
+        "runtime",
+        help="Manage the Python runtimes used to execute scripts",
+    )
+    runtime_subparsers = parser_runtime.add_subparsers(
+        dest="runtime_command",
+        required=True,
+    )
+
+    parser_prepare = runtime_subparsers.add_parser(
+        "prepare",
+        help="Install everything the parts and sketches need ahead of time (e.g. in CI)",
+    )
+    parser_prepare.add_argument(
+        "-P",
+        "--package",
+        help="Package to start from (default: the current package)",
+        type=str,
+        dest="package",
+        default="",
+    )
+    parser_prepare.add_argument(
+        "--no-recursive",
+        help="Do not prepare the runtimes of the imported packages",
+        dest="recursive",
+        action="store_false",
+    )
+
+
+def cli_runtime(args, ctx):
+    if args.runtime_command == "prepare":
+        package = args.package if args.package is not None else ""
+        start_package = pc_utils.get_child_project_path(
+            ctx.get_current_project_path(), package
+        )
+        if args.recursive:
+            packages = list(
+                map(
+                    lambda p: p["name"],
+                    ctx.get_all_packages(start_package),
+                )
+            )
+        else:
+            packages = [start_package]
+
+        ctx.prepare_runtimes(packages)
+        pc_logging.info(
+            "Prepared %d runtime(s) for %d package(s)"
+            % (len(ctx.runtimes_python), len(packages))
+        )
@@ -33,6 +33,12 @@ def cli_help_test(subparsers: argparse.ArgumentParser):
         dest="recursive",
         action="store_true",
     )
+    parser_test.add_argument(
+        "--force",
+        help="Test the shapes even if they passed with the same inputs before",
+        dest="force",
+        action="store_true",
+    )
 
     group_type = parser_test.add_mutually_exclusive_group(required=False)
     group_type.add_argument(
@@ -69,6 +75,8 @@ def cli_help_test(subparsers: argparse.ArgumentParser):
 
 
 def cli_test(args, ctx):
+    ctx.option_force = args.force
+
     package = args.package if args.package is not None else ""
     if args.recursive:
         start_package = pc_utils.get_child_project_path(
@@ -98,13 +106,15 @@ def cli_test(args, ctx):
             prj.test()
         else:
             # Test the requested part or assembly
+            if args.interface:
+                prj.get_interface(args.object).test()
+                continue
+
             if args.sketch:
                 shape = prj.get_sketch(args.object)
-            elif args.interface:
-                shape = prj.get_interface(args.object)
             elif args.assembly:
                 shape = prj.get_assembly(args.object)
             else:
                 shape = prj.get_part(args.object)
 
-            shape.test()
+            prj.test([shape])
@@ -14,6 +14,7 @@ from .globals import (
     render,
 )
 from .ai import supported_models
+from .cache import cache
 from .consts import *
 from .context import Context
 from .assembly import Assembly
@@ -25,9 +26,11 @@ from .project_factory_tar import ProjectFactoryTar
 from .user_config import user_config
 from .plugins import plugins
 from .plugin_export_png_reportlab import PluginExportPngReportlab
+from .plugin_export_png_numpy import PluginExportPngNumpy
 from .logging_ansi_terminal import init as logging_ansi_terminal_init
 from .logging_ansi_terminal import fini as logging_ansi_terminal_fini
 from . import logging
+from . import tracing
 from . import utils
 from . import exception
 
@@ -48,6 +51,7 @@ __all__ = [
     "assembly",
     "assembly_factory",
     "assembly_factory_python",
+    "cache",
     "scene",
     "main_cli",
     "plugins",
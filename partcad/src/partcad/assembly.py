@@ -11,11 +11,15 @@ import copy
 import typing
 
 import build123d as b3d
+from OCP.TopoDS import TopoDS_Builder, TopoDS_Compound
 
 from .shape import Shape
 from .shape_ai import ShapeWithAi
 from . import sync_threads as pc_thread
 from . import logging as pc_logging
+from . import memory as pc_memory
+from . import gltf_exporter
+from . import step_exporter
 
 
 class AssemblyChild:
@@ -28,6 +32,9 @@ class AssemblyChild:
 class Assembly(ShapeWithAi):
     path: typing.Optional[str] = None
 
+    # It is cheaper to rebuild the assembly out of its children
+    persist_evicted = False
+
     def __init__(self, config={}):
         super().__init__(config)
 
@@ -76,43 +83,92 @@ class Assembly(ShapeWithAi):
     async def get_shape(self):
         await self.do_instantiate()
         async with self.lock:
-            if self.shape is None:
-                child_shapes = []
-                tasks = []
-
-                async def per_child(child):
-                    item = copy.copy(await child.item.get_build123d())
-                    if not child.name is None:
-                        item.label = child.name
-                    if not child.location is None:
-                        item.locate(child.location)
-                    return item
-
+            # The shape may be evicted concurrently, see memory.py
+            shape = self.shape
+            if shape is None:
                 if len(self.children) == 0:
                     pc_logging.warning(
                         "The assembly %s:%s is empty"
                         % (self.project_name, self.name)
                     )
-                for child in self.children:
-                    tasks.append(per_child(child))
 
-                # TODO(clairbee): revisit whether non-determinism here is acceptable
-                for f in asyncio.as_completed(tasks):
-                    item = await f
-                    child_shapes.append(item)
+                # Each child is a located reference to the shape of the item
+                # (no copies are made), so repeated parts share the geometry
+                # in memory and in the exported BREP. The location of the
+                # child replaces the location of the item (if any).
+                async def per_child(child):
+                    shape = await child.item.get_wrapped()
+                    if shape is None:
+                        return None
+                    if not child.location is None:
+                        shape = shape.Located(child.location.wrapped)
+                    return shape
+
+                child_shapes = await asyncio.gather(
+                    *map(per_child, self.children)
+                )
+
+                builder = TopoDS_Builder()
+                compound = TopoDS_Compound()
+                builder.MakeCompound(compound)
+                for child_shape in child_shapes:
+                    if child_shape is not None:
+                        builder.Add(compound, child_shape)
 
-                compound = b3d.Compound(children=child_shapes)
-                if not self.name is None:
-                    compound.label = self.name
                 if not self.location is None:
-                    compound.locate(self.location)
-                self.shape = compound.wrapped
-            if self.shape is None:
+                    b3d_compound = b3d.Compound(compound)
+                    b3d_compound.locate(self.location)
+                    compound = b3d_compound.wrapped
+                shape = compound
+                self.shape = shape
+                await self.instantiated(shape)
+            else:
+                pc_memory.budget.touch(self)
+            if shape is None:
                 pc_logging.warning("The shape is None")
-            return self.shape
-            # return copy.copy(
-            #     self.shape
-            # )  # TODO(clairbee): fix this for the case when the parts are made with cadquery
+            return shape
+
+    async def get_build123d(self) -> b3d.Compound:
+        """
+        Returns the compound of the children labeled with their names. The
+        geometry is shared with the shapes of the children.
+        """
+        if "offset" in self.config or "scale" in self.config:
+            # The transformed compound, the labels are not known
+            return b3d.Compound(await self.get_wrapped())
+
+        await self.do_instantiate()
+
+        async def per_child(child):
+            item = await child.item.get_build123d()
+            if item is None or item.wrapped is None:
+                return None
+            # The copy references the same geometry
+            item = copy.copy(item)
+            if not child.name is None:
+                item.label = child.name
+            if not child.location is None:
+                item.locate(child.location)
+            return item
+
+        items = await asyncio.gather(*map(per_child, self.children))
+        compound = b3d.Compound(
+            children=list(filter(lambda i: i is not None, items))
+        )
+        if not self.name is None:
+            compound.label = self.name
+        if not self.location is None:
+            compound.locate(self.location)
+        return compound
+
+    def get_native_memory_usage(self) -> int:
+        # The geometry is owned by the parts, the assembly only holds the
+        # located references to it
+        if self.shape is None:
+            return 0
+        return pc_memory.SIZE_SHAPE + pc_memory.SIZE_REFERENCE * (
+            len(self.children) + 1
+        )
 
     async def get_bom(self):
         await self.do_instantiate()
@@ -135,6 +191,70 @@ class Assembly(ShapeWithAi):
                         bom[part_name] = 1
             return bom
 
+    async def render_step_async(
+        self,
+        ctx,
+        project=None,
+        filepath=None,
+    ):
+        # Assemblies are exported with their structure, so that each unique
+        # part is written once
+        with pc_logging.Action("RenderSTEP", self.project_name, self.name):
+            step_opts, filepath = self.render_getopts(
+                "step", ".step", project, filepath
+            )
+
+            node = await step_exporter.get_assembly_node(self)
+
+            def do_render_step():
+                nonlocal project, filepath, node
+                if not project is None:
+                    project.ctx.ensure_dirs_for_file(filepath)
+                doc = step_exporter.build_document(node)
+                step_exporter.write_step(doc, filepath)
+
+            await pc_thread.run(do_render_step)
+
+    async def render_gltf_async(
+        self,
+        ctx,
+        project=None,
+        filepath=None,
+        binary=None,
+        tolerance=None,
+        angularTolerance=None,
+    ):
+        # Each unique part is triangulated and written once, its instances
+        # are the nodes referencing the same mesh
+        with pc_logging.Action("RenderGLTF", self.project_name, self.name):
+            gltf_opts, filepath = self.render_getopts(
+                "gltf", ".json", project, filepath
+            )
+
+            tolerance, angularTolerance = self.render_getopts_tolerance(
+                gltf_opts, tolerance, angularTolerance
+            )
+
+            if binary is None:
+                if "binary" in gltf_opts and not gltf_opts["binary"] is None:
+                    binary = gltf_opts["binary"]
+                else:
+                    binary = False
+
+            levels = [(tolerance, angularTolerance, None)]
+            levels += self.render_getopts_lods(
+                gltf_opts, tolerance, angularTolerance
+            )
+            node = await gltf_exporter.get_assembly_node(self, levels)
+
+            def do_render_gltf():
+                nonlocal project, filepath, node, binary
+                if not project is None:
+                    project.ctx.ensure_dirs_for_file(filepath)
+                gltf_exporter.write_gltf(node, filepath, binary=binary)
+
+            await pc_thread.run(do_render_gltf)
+
     async def _render_txt_real(self, file):
         await self.do_instantiate()
         for child in self.children:
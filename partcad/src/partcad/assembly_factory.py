@@ -39,6 +39,13 @@ class AssemblyFactory(ShapeFactory):
             assembly_self
         )
         self.assembly.info = lambda: self.info(self.assembly)
+        self.assembly.get_fingerprint_inputs = (
+            lambda: self.get_fingerprint_inputs(self.assembly)
+        )
+        self.assembly.get_dependencies = lambda: self.get_dependencies(
+            self.assembly
+        )
         self.assembly.with_ports = self.with_ports
+        self.assembly.memory_stats = self.ctx.memory_stats
 
         self.ctx.stats_assemblies += 1
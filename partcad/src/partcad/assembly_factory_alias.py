@@ -68,6 +68,9 @@ class AssemblyFactoryAlias(pf.AssemblyFactory):
 
             pc_logging.debug("Initializing an alias to %s" % self.source)
 
+    def get_dependencies(self, assembly):
+        return [self.ctx._get_assembly(self.source)]
+
     def instantiate(self, assembly):
         with pc_logging.Action("Alias", assembly.project_name, assembly.name):
             source = self.ctx._get_assembly(self.source)
@@ -0,0 +1,527 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-11
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import asyncio
+from io import BytesIO
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from OCP.BRep import BRep_Builder
+from OCP.BRepTools import BRepTools
+from OCP.TopoDS import TopoDS_Shape
+
+from .cache import Cache, cache
+from .plugin_export_png_numpy import PluginExportPngNumpy
+from .plugin_export_png_reportlab import PluginExportPngReportlab
+from .render import (
+    DEFAULT_RENDER_HEIGHT,
+    DEFAULT_RENDER_WIDTH,
+    PNG_MODE_SHADED,
+)
+from .render_planner import OUTPUT_FORMATS
+from . import logging as pc_logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
+import brep_codec
+from cq_serialize import register as register_cq_helper
+from wrapper_ipc import pack_message, unpack_message
+
+# The shapes from the bundled examples used by the default suite
+BENCHMARK_PARTS = [
+    "/produce_part_cadquery_primitive:cube",
+    "/produce_part_build123d_primitive:cube",
+    "/produce_part_step:bolt",
+    "/produce_part_stl:cube",
+]
+BENCHMARK_ASSEMBLIES = ["/produce_assembly_assy:primitive"]
+BENCHMARK_RENDER_PART = "/produce_part_cadquery_primitive:cube"
+BENCHMARK_RENDER_FORMATS = [
+    "svg",
+    "png",
+    "step",
+    "stl",
+    "3mf",
+    "threejs",
+    "obj",
+    "gltf",
+]
+# The PNG exporters compared by the benchmark
+BENCHMARK_PNG_EXPORTERS = {
+    "reportlab": PluginExportPngReportlab,
+    "numpy": PluginExportPngNumpy,
+}
+
+
+def reset_peak_rss() -> bool:
+    """
+    Resets the peak memory of this process, so that the memory used by the
+    previous cases is not reported. Returns False if not supported.
+    """
+    try:
+        # Supported by Linux since 4.0
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+        return True
+    except Exception:
+        return False
+
+
+def get_peak_rss() -> int:
+    """Returns the peak memory used by this process in bytes (0 if unknown)."""
+    try:
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+    try:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes while macOS reports bytes
+        return rss if sys.platform == "darwin" else rss * 1024
+    except Exception:
+        return 0
+
+
+class BenchmarkCase:
+    """
+    A measured operation. 'reset' is called before each round with
+    'cold=True' before the first one. It is expected to drop the state that
+    makes the subsequent rounds faster (e.g. the instantiated shape).
+    """
+
+    def __init__(
+        self,
+        subsystem,
+        name,
+        action,
+        reset=None,
+        setup=None,
+        size=None,
+        use_cache=True,
+    ):
+        self.subsystem = subsystem
+        self.name = name
+        self.action = action
+        self.reset = reset
+        self.setup = setup
+        # The number of bytes processed in each round, if applicable
+        self.size = size
+        # Whether the persistent cache is used while measuring
+        self.use_cache = use_cache
+
+    @property
+    def id(self) -> str:
+        return "%s/%s" % (self.subsystem, self.name)
+
+
+class BenchmarkResult:
+    def __init__(self, case: BenchmarkCase):
+        self.id = case.id
+        self.subsystem = case.subsystem
+        self.name = case.name
+        self.size = None
+        self.cold = None
+        self.warm = []
+        # The peak memory of this process during the case
+        self.peak_rss = 0
+        # Whether only the Python allocations are counted in 'peak_rss'
+        self.peak_traced = False
+        # The peak memory of the Python runtime workers used by the case
+        self.workers_peak_rss = None
+        self.error = None
+
+    def get_median(self):
+        if self.warm:
+            return statistics.median(self.warm)
+        return self.cold
+
+    def get_throughput(self):
+        median = self.get_median()
+        if not median:
+            return None, None
+        if self.size:
+            return self.size / median / 1048576.0, "MB/s"
+        return 1.0 / median, "op/s"
+
+    def to_dict(self) -> dict:
+        throughput, unit = self.get_throughput()
+        return {
+            "id": self.id,
+            "subsystem": self.subsystem,
+            "name": self.name,
+            "cold": self.cold,
+            "warm": {
+                "rounds": len(self.warm),
+                "min": min(self.warm) if self.warm else None,
+                "median": statistics.median(self.warm) if self.warm else None,
+                "mean": statistics.mean(self.warm) if self.warm else None,
+                "stdev": (
+                    statistics.stdev(self.warm) if len(self.warm) > 1 else None
+                ),
+            },
+            "size": self.size,
+            "throughput": throughput,
+            "throughput_unit": unit,
+            "peak_rss": self.peak_rss,
+            "peak_traced": self.peak_traced,
+            "workers_peak_rss": self.workers_peak_rss,
+            "error": None if self.error is None else str(self.error),
+        }
+
+
+class BenchmarkSuite:
+    """
+    Measures the cold (first) and warm (subsequent) timings of the registered
+    cases, one case at a time.
+    """
+
+    def __init__(self, ctx, rounds=5, filters=None, output_dir=None):
+        self.ctx = ctx
+        self.rounds = rounds
+        self.filters = filters
+        if output_dir is None:
+            output_dir = tempfile.mkdtemp(prefix="partcad-bench-")
+        self.output_dir = output_dir
+        self.cases: list[BenchmarkCase] = []
+        self.results: list[BenchmarkResult] = []
+
+    def add(self, *args, **kwargs) -> BenchmarkCase:
+        case = BenchmarkCase(*args, **kwargs)
+        if self.filters and not any(map(lambda f: f in case.id, self.filters)):
+            return case
+        self.cases.append(case)
+        return case
+
+    async def _measure(self, case, result, cold):
+        if case.reset is not None:
+            case.reset(cold)
+        start = time.perf_counter()
+        size = await case.action()
+        duration = time.perf_counter() - start
+        if size is not None:
+            result.size = size
+        return duration
+
+    def _get_worker_pools(self):
+        with self.ctx.runtimes_python_lock:
+            runtimes = list(self.ctx.runtimes_python.values())
+        return [r.worker_pool for r in runtimes if r.worker_pool is not None]
+
+    async def run_case(self, case: BenchmarkCase) -> BenchmarkResult:
+        result = BenchmarkResult(case)
+        result.size = case.size
+
+        # Each case starts its own workers
+        for pool in self._get_worker_pools():
+            pool.reset_peak_rss()
+
+        enabled = cache.enabled
+        with pc_logging.Action("Bench", case.subsystem, case.name):
+            try:
+                if case.setup is not None:
+                    await case.setup()
+                if not case.use_cache:
+                    cache.enabled = False
+                result.peak_traced = not reset_peak_rss()
+                result.cold = await self._measure(case, result, True)
+                for _ in range(self.rounds):
+                    result.warm.append(
+                        await self._measure(case, result, False)
+                    )
+                if result.peak_traced:
+                    # The peak memory of the process can't be reset here, so
+                    # the Python allocations of an extra round are traced
+                    tracemalloc.start()
+                    try:
+                        await self._measure(case, result, False)
+                        result.peak_rss = tracemalloc.get_traced_memory()[1]
+                    finally:
+                        tracemalloc.stop()
+                else:
+                    result.peak_rss = get_peak_rss()
+            except Exception as e:
+                result.error = e
+                pc_logging.error("Benchmark %s failed: %s" % (case.id, e))
+            finally:
+                cache.enabled = enabled
+
+        workers_peak_rss = [p.stats_peak_rss for p in self._get_worker_pools()]
+        if any(workers_peak_rss):
+            result.workers_peak_rss = max(workers_peak_rss)
+        return result
+
+    async def run_async(self):
+        self.results = []
+        for case in self.cases:
+            self.results.append(await self.run_case(case))
+        return self.results
+
+    def run(self):
+        return asyncio.run(self.run_async())
+
+    def cleanup(self):
+        """Removes the files produced by the benchmarks."""
+        shutil.rmtree(self.output_dir, ignore_errors=True)
+
+    def to_dict(self) -> dict:
+        return {
+            "partcad": sys.modules["partcad"].__version__,
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "rounds": self.rounds,
+            "results": list(map(lambda r: r.to_dict(), self.results)),
+        }
+
+    def compare(self, baseline: dict) -> list:
+        """
+        Returns (id, baseline median, median, ratio) for the cases present in
+        both this run and the baseline (the output of 'to_dict()').
+        """
+        baseline_results = {r["id"]: r for r in baseline.get("results", [])}
+        comparison = []
+        for result in self.results:
+            if result.id not in baseline_results:
+                continue
+            before = baseline_results[result.id]["warm"]["median"]
+            if before is None:
+                before = baseline_results[result.id]["cold"]
+            after = result.get_median()
+            if not before or after is None:
+                continue
+            comparison.append((result.id, before, after, after / before))
+        return comparison
+
+
+def _add_instantiate_cases(suite, shape):
+    def reset(cold):
+        # Also removes the shape from the memory budget and the stats
+        shape.evict()
+        # Instantiate it again rather than restoring it
+        shape.evicted_key = None
+
+    async def action():
+        await shape.get_wrapped()
+
+    # The persistent cache is disabled to measure the instantiation itself.
+    # The cold round includes starting and preparing the Python runtime.
+    suite.add(
+        "instantiate",
+        "%s:%s" % (shape.project_name, shape.name),
+        action,
+        reset=reset,
+        use_cache=False,
+    )
+
+
+def _add_runtime_cases(suite, ctx):
+    runtime = ctx.get_python_runtime("3.10")
+
+    async def setup():
+        runtime.once()
+        await runtime.ensure("cadquery")
+
+    async def run_python(code):
+        await runtime.run(["-c", code])
+
+    suite.add(
+        "runtime",
+        "subprocess",
+        lambda: run_python("pass"),
+        setup=setup,
+    )
+    suite.add(
+        "runtime",
+        "import-cadquery",
+        lambda: run_python("import cadquery"),
+        setup=setup,
+    )
+
+
+def _add_serialize_cases(suite, shape):
+    wrapped = None
+
+    async def setup():
+        nonlocal wrapped
+        wrapped = await shape.get_wrapped()
+        register_cq_helper()
+
+    async def round_trip():
+        data = pack_message({"success": True, "shapes": [wrapped]})
+        unpack_message(data)
+        return len(data)
+
+    async def brep_hash():
+        Cache.hash_shape(wrapped)
+
+    async def brep_read():
+        key = Cache.hash("bench", shape.get_shape_hash(wrapped))
+        cache.put_shape(key, wrapped)
+        cache.get_shape(key)
+
+    name = "%s:%s" % (shape.project_name, shape.name)
+    suite.add("serialize", "message:%s" % name, round_trip, setup=setup)
+    _add_codec_cases(suite, name, lambda: wrapped, setup)
+    suite.add("serialize", "brep-hash:%s" % name, brep_hash, setup=setup)
+    suite.add("cache", "put-get-shape:%s" % name, brep_read, setup=setup)
+
+
+def _add_codec_cases(suite, name, get_wrapped, setup):
+    """
+    Compares the text BREP format used earlier with the binary encoding
+    and its compression methods. The size is the size of the encoded shape.
+    """
+
+    def encode_text():
+        with BytesIO() as bio:
+            BRepTools.Write_s(get_wrapped(), bio)
+            return bio.getvalue()
+
+    def decode_text(data):
+        shape = TopoDS_Shape()
+        with BytesIO(data) as bio:
+            BRepTools.Read_s(shape, bio, BRep_Builder())
+
+    codecs = [("brep-text", encode_text, decode_text)]
+    for compression in brep_codec.get_compressions():
+        codecs.append(
+            (
+                "brep-binary-%s" % compression,
+                lambda c=compression: brep_codec.encode(get_wrapped(), c),
+                brep_codec.decode,
+            )
+        )
+
+    for codec, encode, decode in codecs:
+        _add_codec_case(suite, "%s:%s" % (codec, name), encode, decode, setup)
+
+
+def _add_codec_case(suite, name, encode, decode, setup):
+    encoded = None
+
+    async def encode_action():
+        return len(encode())
+
+    async def decode_setup():
+        nonlocal encoded
+        await setup()
+        encoded = encode()
+
+    async def decode_action():
+        decode(encoded)
+        return len(encoded)
+
+    suite.add("serialize", "encode-%s" % name, encode_action, setup=setup)
+    suite.add(
+        "serialize", "decode-%s" % name, decode_action, setup=decode_setup
+    )
+
+
+def _add_render_cases(suite, shape):
+    for kind in BENCHMARK_RENDER_FORMATS:
+        method = getattr(shape, "render_%s_async" % kind)
+        filepath = os.path.join(
+            suite.output_dir, "%s%s" % (shape.name, OUTPUT_FORMATS[kind])
+        )
+
+        def reset(cold, kind=kind):
+            # The warm rounds reuse the shared prerequisites (the projection
+            # for PNG, the tessellation for the mesh formats).
+            if cold or kind == "svg":
+                shape.svg_path = None
+            if cold:
+                shape.meshes = {}
+
+        async def action(method=method, filepath=filepath):
+            await method(suite.ctx, None, filepath)
+            return os.path.getsize(filepath)
+
+        suite.add(
+            "render",
+            kind,
+            action,
+            reset=reset,
+            setup=shape.get_wrapped,
+            use_cache=False,
+        )
+
+
+def _add_rasterize_cases(suite, shape):
+    svg_path = None
+
+    async def setup():
+        nonlocal svg_path
+        svg_path = await shape._get_svg_path(ctx=suite.ctx, project=None)
+
+    for name, plugin_class in BENCHMARK_PNG_EXPORTERS.items():
+        plugin = plugin_class()
+        filepath = os.path.join(
+            suite.output_dir, "%s-%s.png" % (shape.name, name)
+        )
+
+        async def action(plugin=plugin, filepath=filepath):
+            if svg_path is None:
+                raise Exception("The SVG file was not rendered")
+            await asyncio.get_running_loop().run_in_executor(
+                None,
+                plugin.export,
+                None,
+                svg_path,
+                DEFAULT_RENDER_WIDTH,
+                DEFAULT_RENDER_HEIGHT,
+                filepath,
+            )
+            return os.path.getsize(filepath)
+
+        # Only the rasterization of the already projected shape is measured
+        suite.add("rasterize", name, action, setup=setup)
+
+    # The shaded image is rendered from the already computed triangulation
+    filepath = os.path.join(suite.output_dir, "%s-shaded.png" % shape.name)
+
+    async def shaded_setup():
+        await shape.get_mesh()
+
+    async def shaded_action():
+        await shape.render_png_async(
+            suite.ctx,
+            None,
+            filepath,
+            DEFAULT_RENDER_WIDTH,
+            DEFAULT_RENDER_HEIGHT,
+            mode=PNG_MODE_SHADED,
+        )
+        return os.path.getsize(filepath)
+
+    suite.add("rasterize", "shaded", shaded_action, setup=shaded_setup)
+
+
+def create_suite(ctx, rounds=5, filters=None, output_dir=None):
+    """Returns the default suite based on the bundled examples."""
+    suite = BenchmarkSuite(ctx, rounds, filters, output_dir)
+
+    _add_runtime_cases(suite, ctx)
+    for name in BENCHMARK_PARTS:
+        _add_instantiate_cases(suite, ctx._get_part(name))
+    for name in BENCHMARK_ASSEMBLIES:
+        _add_instantiate_cases(suite, ctx._get_assembly(name))
+    for name in BENCHMARK_PARTS:
+        _add_serialize_cases(suite, ctx._get_part(name))
+    _add_render_cases(suite, ctx._get_part(BENCHMARK_RENDER_PART))
+    _add_rasterize_cases(suite, ctx._get_part(BENCHMARK_RENDER_PART))
+    return suite
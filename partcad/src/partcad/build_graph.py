@@ -0,0 +1,168 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-10
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import threading
+
+from .cache import Cache
+from .user_config import user_config
+from . import logging as pc_logging
+
+# Bump this to invalidate all previously recorded outputs
+FINGERPRINT_VERSION = 1
+
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        while True:
+            chunk = f.read(1048576)
+            if not chunk:
+                break
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+async def get_fingerprint(ctx, shape):
+    """
+    Returns the hash of all inputs of the shape: its config section, its
+    source file, the factory specific inputs (e.g. Python requirements) and
+    the fingerprints of the shapes it is made of. The result is memoized.
+    """
+    if shape.fingerprint is not None:
+        return shape.fingerprint
+
+    inputs = [
+        FINGERPRINT_VERSION,
+        sys.modules["partcad"].__version__,
+        shape.kind,
+        shape.project_name,
+        shape.name,
+        shape.config,
+    ]
+
+    project = ctx.projects.get(shape.project_name, None)
+    if project is not None:
+        inputs.append(project.config_obj.get("version", None))
+
+    path = getattr(shape, "path", None)
+    if path is not None and os.path.isfile(path):
+        inputs.append(_hash_file(path))
+    else:
+        # The file is not downloaded yet or the shape is not file based
+        inputs.append(None)
+
+    inputs.extend(shape.get_fingerprint_inputs())
+
+    dependencies = list(shape.get_dependencies())
+    if shape.kind == "assemblies":
+        # This only parses the assembly, the children are not instantiated
+        await shape.do_instantiate()
+        for child in shape.children:
+            dependencies.append(child.item)
+            inputs.append([child.name, str(child.location)])
+    for dependency in dependencies:
+        inputs.append(await get_fingerprint(ctx, dependency))
+
+    shape.fingerprint = Cache.hash(*inputs)
+    return shape.fingerprint
+
+
+class BuildManifest:
+    """
+    Records the fingerprints of the inputs of the previously built targets
+    (e.g. rendered files or passed tests) to skip them on subsequent runs
+    until any of the inputs change.
+    """
+
+    def __init__(self, name, path=None):
+        if path is None:
+            path = os.path.join(
+                user_config.internal_state_dir, "build", "%s.json" % name
+            )
+        self.path = path
+        self.lock = threading.Lock()
+        self.targets = {}
+        self.dirty = False
+
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r") as f:
+                    self.targets = json.load(f)
+            except Exception as e:
+                pc_logging.warning(
+                    "Ignoring the broken build manifest %s: %s" % (path, e)
+                )
+
+    @staticmethod
+    def _stat(path):
+        if path is None:
+            return None
+        try:
+            stat = os.stat(path)
+        except OSError:
+            return False
+        return [stat.st_size, stat.st_mtime_ns]
+
+    def is_up_to_date(self, target, fingerprint, path=None) -> bool:
+        """
+        Checks if the target was built with the same inputs. If 'path' is
+        given, the file must also be unchanged since then.
+        """
+        with self.lock:
+            record = self.targets.get(target, None)
+        if record is None or record["fingerprint"] != fingerprint:
+            return False
+        stat = BuildManifest._stat(path)
+        return stat is not False and stat == record.get("stat", None)
+
+    def record(self, target, fingerprint, path=None):
+        stat = BuildManifest._stat(path)
+        if stat is False:
+            # The output was not produced
+            return
+        with self.lock:
+            self.targets[target] = {"fingerprint": fingerprint, "stat": stat}
+            self.dirty = True
+
+    def forget(self, target):
+        with self.lock:
+            if self.targets.pop(target, None) is not None:
+                self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            data = json.dumps(self.targets, sort_keys=True, indent=1)
+            self.dirty = False
+
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(
+                dir=os.path.dirname(self.path), suffix=".tmp"
+            )
+            with os.fdopen(fd, "w") as f:
+                f.write(data)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            pc_logging.warning(
+                "Failed to save the build manifest %s: %s" % (self.path, e)
+            )
+
+
+def get_manifest(project, purpose) -> BuildManifest:
+    """Returns the manifest for the given purpose (e.g. "render")."""
+    return BuildManifest(
+        "%s-%s" % (purpose, Cache.hash(os.path.abspath(project.path))[:16])
+    )
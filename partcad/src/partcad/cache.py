@@ -0,0 +1,420 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-05
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import hashlib
+import json
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import threading
+
+from OCP.TopoDS import TopoDS_Builder, TopoDS_Compound, TopoDS_Iterator
+
+from .consts import DEFAULT_PACKAGE_CONFIG
+from .user_config import user_config
+from . import logging as pc_logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
+import brep_codec
+from cq_serialize import downcast
+
+# The hashes of the source files by path: ((size, mtime), hash)
+_sources = {}
+_sources_lock = threading.Lock()
+
+
+class Cache:
+    """
+    Content-addressed on-disk store for build artifacts (e.g. instantiated
+    shapes). Entries are grouped by kind and are evicted in the
+    least-recently-used order once the total size exceeds the limit.
+    The modification time of each entry is used to track recent use.
+    """
+
+    # When pruning, stop once the cache is this much below the limit
+    # to avoid pruning again on the very next write.
+    PRUNE_WATERMARK = 0.9
+
+    def __init__(self, path=None, max_size=None, enabled=None):
+        if path is None:
+            path = os.path.join(user_config.internal_state_dir, "cache")
+        if max_size is None:
+            max_size = user_config.cache_max_size
+        if enabled is None:
+            enabled = user_config.cache
+        self.path = path
+        self.max_size = max_size
+        self.enabled = enabled
+
+        self.lock = threading.Lock()
+        # The total size is computed lazily on the first write
+        self.size = None
+
+    @staticmethod
+    def hash(*items) -> str:
+        """Produces a cache key out of the given inputs."""
+        hasher = hashlib.sha256()
+        for item in items:
+            if isinstance(item, (bytes, bytearray, memoryview)):
+                hasher.update(b"b")
+                hasher.update(item)
+            else:
+                hasher.update(b"j")
+                hasher.update(
+                    json.dumps(item, sort_keys=True, default=str).encode()
+                )
+            # Make sure the items can't be shifted against each other
+            hasher.update(b"\0")
+        return hasher.hexdigest()
+
+    @staticmethod
+    def hash_sources(*paths) -> str:
+        """
+        Produces a cache key out of the content of the Python files in the
+        given folders and their subfolders (e.g. the local modules imported
+        by the scripts). The folders of other packages are skipped.
+        """
+        files = []
+        for path in dict.fromkeys(os.path.abspath(p) for p in paths):
+            for root, dirs, names in os.walk(path):
+                dirs[:] = sorted(
+                    d
+                    for d in dirs
+                    if not d.startswith(".")
+                    and d != "__pycache__"
+                    and not os.path.exists(
+                        os.path.join(root, d, DEFAULT_PACKAGE_CONFIG)
+                    )
+                )
+                for name in sorted(names):
+                    if name.endswith(".py"):
+                        files.append((path, os.path.join(root, name)))
+
+        items = []
+        for path, file_path in files:
+            try:
+                stat = os.stat(file_path)
+                # Files are only read again when they change
+                signature = (stat.st_size, stat.st_mtime_ns)
+                with _sources_lock:
+                    cached = _sources.get(file_path, None)
+                if cached is None or cached[0] != signature:
+                    with open(file_path, "rb") as f:
+                        cached = (signature, Cache.hash(f.read()))
+                    with _sources_lock:
+                        _sources[file_path] = cached
+            except OSError:
+                continue
+            # The keys must not depend on the location of the package
+            items.append([os.path.relpath(file_path, path), cached[1]])
+        return Cache.hash(*items)
+
+    def get_entry_path(self, kind: str, key: str) -> str:
+        return os.path.join(self.path, kind, key[:2], key)
+
+    def get(self, kind: str, key: str):
+        """Returns the cached bytes or None."""
+        if not self.enabled or key is None:
+            return None
+
+        entry_path = self.get_entry_path(kind, key)
+        try:
+            with open(entry_path, "rb") as f:
+                data = f.read()
+            # Mark as recently used
+            os.utime(entry_path)
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            pc_logging.debug("Failed to read the cache entry: %s" % e)
+            return None
+        return data
+
+    def put(self, kind: str, key: str, data: bytes):
+        if not self.enabled or key is None:
+            return
+
+        def write(entry_dir):
+            # Write to a temporary file first so that concurrent readers
+            # (including other processes) never see partial entries
+            fd, tmp_path = tempfile.mkstemp(dir=entry_dir, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            return tmp_path
+
+        self._put(kind, key, write)
+
+    def put_file(self, kind: str, key: str, path: str):
+        """Moves the file into the cache (or copies it if impossible)."""
+        if not self.enabled or key is None:
+            return
+
+        def write(entry_dir):
+            tmp_path = os.path.join(
+                entry_dir, "%s.%d.tmp" % (key, threading.get_ident())
+            )
+            try:
+                os.replace(path, tmp_path)
+            except OSError:
+                # Different file systems
+                shutil.copyfile(path, tmp_path)
+            return tmp_path
+
+        self._put(kind, key, write)
+
+    def _put(self, kind: str, key: str, write):
+        entry_path = self.get_entry_path(kind, key)
+        entry_dir = os.path.dirname(entry_path)
+        try:
+            os.makedirs(entry_dir, exist_ok=True)
+            old_size = (
+                os.path.getsize(entry_path)
+                if os.path.exists(entry_path)
+                else 0
+            )
+
+            tmp_path = write(entry_dir)
+            size = os.path.getsize(tmp_path)
+            os.replace(tmp_path, entry_path)
+        except Exception as e:
+            pc_logging.warning("Failed to write the cache entry: %s" % e)
+            return
+
+        with self.lock:
+            if self.size is None:
+                self.size = self._get_total_size()
+            else:
+                self.size += size - old_size
+            need_pruning = self.size > self.max_size
+
+        if need_pruning:
+            self.prune()
+
+    def delete(self, kind: str, key: str):
+        """Removes the entry (if any), e.g. once it is no longer needed."""
+        if not self.enabled or key is None:
+            return
+
+        entry_path = self.get_entry_path(kind, key)
+        with self.lock:
+            try:
+                size = os.path.getsize(entry_path)
+                os.unlink(entry_path)
+            except FileNotFoundError:
+                return
+            except Exception as e:
+                pc_logging.debug("Failed to delete the cache entry: %s" % e)
+                return
+            if self.size is not None:
+                self.size -= size
+
+    def entries(self, kind: str = None):
+        """Returns the list of (path, size, mtime) for all entries."""
+        result = []
+        if kind is None:
+            if not os.path.isdir(self.path):
+                return result
+            kinds = [f.name for f in os.scandir(self.path) if f.is_dir()]
+        else:
+            kinds = [kind]
+
+        for kind in kinds:
+            for dirpath, _, filenames in os.walk(os.path.join(self.path, kind)):
+                for filename in filenames:
+                    if filename.endswith(".tmp"):
+                        continue
+                    entry_path = os.path.join(dirpath, filename)
+                    try:
+                        stat = os.stat(entry_path)
+                    except FileNotFoundError:
+                        continue
+                    result.append((entry_path, stat.st_size, stat.st_mtime))
+        return result
+
+    def _get_total_size(self):
+        return sum(map(lambda e: e[1], self.entries()))
+
+    def stats(self) -> dict[str, dict[str, int]]:
+        """Returns the number of entries and their size for each kind."""
+        result = {}
+        if not os.path.isdir(self.path):
+            return result
+        for kind in sorted(
+            [f.name for f in os.scandir(self.path) if f.is_dir()]
+        ):
+            entries = self.entries(kind)
+            result[kind] = {
+                "count": len(entries),
+                "size": sum(map(lambda e: e[1], entries)),
+            }
+        return result
+
+    def prune(self, max_size: int = None):
+        """
+        Evicts the least recently used entries until the total size is below
+        the limit. Returns the number of evicted entries and freed bytes.
+        """
+        if max_size is None:
+            max_size = int(self.max_size * Cache.PRUNE_WATERMARK)
+
+        with self.lock:
+            entries = self.entries()
+            total = sum(map(lambda e: e[1], entries))
+
+            count = 0
+            freed = 0
+            # Oldest first
+            for entry_path, entry_size, _ in sorted(
+                entries, key=lambda e: e[2]
+            ):
+                if total <= max_size:
+                    break
+                try:
+                    os.unlink(entry_path)
+                except FileNotFoundError:
+                    pass
+                total -= entry_size
+                freed += entry_size
+                count += 1
+
+            self.size = total
+
+        if count > 0:
+            pc_logging.debug(
+                "Evicted %d cache entries (%.2fMB)"
+                % (count, freed / 1048576.0)
+            )
+        return count, freed
+
+    def clear(self, kind: str = None):
+        with self.lock:
+            if kind is None:
+                path = self.path
+            else:
+                path = os.path.join(self.path, kind)
+            if os.path.isdir(path):
+                shutil.rmtree(path)
+            self.size = None
+
+    @staticmethod
+    def hash_shape(shape) -> str:
+        """Produces a cache key out of the geometry of the shape."""
+        # Leave out triangulations as they depend on the prior use
+        return Cache.hash(
+            "brep-bin", brep_codec.write_payload(shape, with_triangles=False)
+        )
+
+    @staticmethod
+    def read_shape(source):
+        """
+        Reads the shape from bytes or a file path. Both the encoding of
+        'brep_codec' and the text BREP format are accepted.
+        """
+        if isinstance(source, str):
+            with open(source, "rb") as f:
+                source = f.read()
+        shape = brep_codec.decode(source)
+        if shape.IsNull():
+            return None
+        return downcast(shape)
+
+    def get_shape(self, key: str):
+        """Returns the cached OCCT shape or None."""
+        data = self.get("shape", key)
+        if data is None:
+            return None
+
+        try:
+            return Cache.read_shape(data)
+        except Exception as e:
+            pc_logging.warning("Failed to load the cached shape: %s" % e)
+            return None
+
+    def put_shape(self, key: str, shape):
+        if not self.enabled or key is None or shape is None:
+            return
+
+        try:
+            data = brep_codec.encode(
+                shape, compression=user_config.cache_compression
+            )
+        except Exception as e:
+            pc_logging.warning("Failed to serialize the shape: %s" % e)
+            return
+        self.put("shape", key, data)
+
+    def get_components(self, key: str):
+        """Returns the cached (nested) list of the components or None."""
+        data = self.get("components", key)
+        if data is None:
+            return None
+
+        try:
+            size = struct.unpack_from("<I", data)[0]
+            structure = json.loads(data[4 : 4 + size])
+            leaves = []
+            if len(data) > 4 + size:
+                compound = Cache.read_shape(data[4 + size :])
+                iterator = TopoDS_Iterator(compound)
+                while iterator.More():
+                    leaves.append(downcast(iterator.Value()))
+                    iterator.Next()
+        except Exception as e:
+            pc_logging.warning("Failed to load the cached components: %s" % e)
+            return None
+
+        def build(items):
+            return [
+                build(item) if isinstance(item, list) else leaves[item]
+                for item in items
+            ]
+
+        return build(structure)
+
+    def put_components(self, key: str, components: list):
+        """
+        Stores the (nested) list of the components: the layout of the list
+        followed by the compound of all shapes in their order.
+        """
+        if not self.enabled or key is None or components is None:
+            return
+
+        builder = TopoDS_Builder()
+        compound = TopoDS_Compound()
+        builder.MakeCompound(compound)
+        count = 0
+
+        def flatten(items):
+            nonlocal count
+            structure = []
+            for item in items:
+                if isinstance(item, list):
+                    structure.append(flatten(item))
+                else:
+                    builder.Add(compound, item)
+                    structure.append(count)
+                    count += 1
+            return structure
+
+        try:
+            structure = json.dumps(flatten(components)).encode()
+            data = struct.pack("<I", len(structure)) + structure
+            if count > 0:
+                data += brep_codec.encode(
+                    compound, compression=user_config.cache_compression
+                )
+        except Exception as e:
+            pc_logging.warning("Failed to serialize the components: %s" % e)
+            return
+        self.put("components", key, data)
+
+
+cache = Cache()
@@ -13,6 +13,7 @@ import threading
 from . import consts
 from . import logging as pc_logging
 from .mating import Mating
+from .memory import MemoryStats, format_size
 from . import project_config
 from . import runtime_python_all
 from . import project_factory_local as rfl
@@ -42,6 +43,7 @@ class Context(project_config.Configuration):
     stats_providers: int
     stats_provider_queries: int
     stats_memory: int
+    stats_memory_packages: dict[str, dict[str, int]]
 
     # name is the package path (not a filesystem path) of the root package
     # in case it's configured to be something other than '/' (default)
@@ -104,6 +106,11 @@ class Context(project_config.Configuration):
         self.lock = threading.RLock()
 
         self.option_create_dirs = False
+        # The number of concurrent subprocess-bound rendering jobs
+        self.option_render_jobs = None
+        self.option_render_timings = False
+        # Rebuild the outputs and rerun the tests even if they are up to date
+        self.option_force = False
         self.runtimes_python = {}
         self.runtimes_python_lock = threading.Lock()
 
@@ -120,6 +127,9 @@ class Context(project_config.Configuration):
         self.stats_providers = 0
         self.stats_provider_queries = 0
         self.stats_memory = 0
+        self.stats_memory_packages = {}
+        # The instantiated shapes, see Shape.instantiated()
+        self.memory_stats = MemoryStats()
 
         self.mates = {}
         # self.projects contains all projects known to this context
@@ -141,7 +151,32 @@ class Context(project_config.Configuration):
             )
 
     def stats_recalc(self, verbose=False):
-        self.stats_memory = total_size(self, verbose)
+        """
+        Updates the memory usage estimate of the packages and their shapes.
+        Only the instantiated shapes are visited, they are registered as
+        they are instantiated and evicted.
+        """
+        stats = MemoryStats()
+        with self.lock:
+            projects = list(self.projects.values())
+        for project in projects:
+            stats.add_project(project)
+        stats.add_totals(self.memory_stats)
+
+        self.stats_memory = stats.total
+        self.stats_memory_packages = stats.packages
+        if verbose:
+            for name, package_stats in stats.packages.items():
+                pc_logging.debug(
+                    "Memory: %s: %d shapes (%d instantiated): %s Python, %s OCCT"
+                    % (
+                        name,
+                        package_stats["shapes"],
+                        package_stats["instantiated"],
+                        format_size(package_stats["python"]),
+                        format_size(package_stats["native"]),
+                    )
+                )
 
     def get_current_project_path(self):
         return self.current_project_path
@@ -945,6 +980,36 @@ class Context(project_config.Configuration):
                 )
             return self.runtimes_python[runtime_name]
 
+    def prepare_runtimes(self, packages):
+        asyncio.run(self.prepare_runtimes_async(packages))
+
+    async def prepare_runtimes_async(self, packages):
+        """
+        Provisions the runtimes used by the sketches and parts of the given
+        packages ahead of time. The packages are prepared in parallel.
+        """
+
+        async def prepare_package(package):
+            project = self.get_project(package)
+            if project is None:
+                pc_logging.error("Package not found: %s" % package)
+                return
+            with pc_logging.Action("Prepare", project.name):
+                for shape in [
+                    *project.sketches.values(),
+                    *project.parts.values(),
+                ]:
+                    await shape.prepare_runtime()
+
+        tasks = []
+        for package in packages:
+            tasks.append(
+                asyncio.create_task(
+                    sync_threads.run_async(prepare_package, package)
+                )
+            )
+        await asyncio.gather(*tasks)
+
     def ensure_dirs(self, path):
         if not self.option_create_dirs:
             return
@@ -0,0 +1,331 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-17
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+# Assemblies are exported to glTF with their structure: each unique part is
+# triangulated and written once as a mesh, which is referenced by the nodes
+# of all of its instances with their transformations. All meshes are packed
+# into a single binary buffer which is streamed to the file mesh by mesh.
+# The coarser levels of detail of the meshes (if any) are written using the
+# MSFT_lod extension, so that the viewers can load them first.
+
+import json
+import os
+import struct
+
+import numpy as np
+
+from OCP.TopLoc import TopLoc_Location
+
+from .mesh import Mesh
+
+# glTF constants
+COMPONENT_UNSIGNED_SHORT = 5123
+COMPONENT_UNSIGNED_INT = 5125
+COMPONENT_FLOAT = 5126
+TARGET_ARRAY_BUFFER = 34962
+TARGET_ELEMENT_ARRAY_BUFFER = 34963
+MODE_TRIANGLES = 4
+
+IDENTITY = [1.0, 0, 0, 0, 0, 1.0, 0, 0, 0, 0, 1.0, 0, 0, 0, 0, 1.0]
+# glTF is Y-up and in metres, while the shapes are Z-up and in millimetres:
+# (x, y, z) -> (x, z, -y) / 1000
+ROOT_MATRIX = [0.001, 0, 0, 0, 0, 0, -0.001, 0, 0, 0.001, 0, 0, 0, 0, 0, 1.0]
+
+
+class GltfAssemblyNode:
+    """
+    A snapshot of an assembly taken in the event loop, so that the file can
+    be written in a different thread.
+    'children' is a list of (node or part, name, location), where 'part' is
+    (key, name, meshes) and 'meshes' are the levels of detail, the finest
+    first.
+    """
+
+    def __init__(self, key, name, location):
+        self.key = key
+        self.name = name
+        self.location = location
+        self.children = []
+
+
+async def get_part(shape, levels):
+    """
+    Returns the part entry with the triangulations of the shape at the given
+    levels: (tolerance, angularTolerance, decimate) tuples.
+    """
+    meshes = []
+    for level in levels:
+        meshes.append(await shape.get_mesh(*level))
+    return (id(shape), shape.name, meshes)
+
+
+async def get_assembly_node(assembly, levels, nodes=None, parts=None):
+    """
+    Collects the tree of the assembly with the triangulations of all parts.
+    Repeated parts and sub-assemblies are collected once.
+    """
+    if nodes is None:
+        nodes = {}
+    if parts is None:
+        parts = {}
+    if id(assembly) in nodes:
+        return nodes[id(assembly)]
+
+    location = None
+    if assembly.location is not None:
+        location = assembly.location.wrapped
+    node = GltfAssemblyNode(id(assembly), assembly.name, location)
+    nodes[id(assembly)] = node
+
+    await assembly.do_instantiate()
+    for child in assembly.children:
+        item = child.item
+        if hasattr(item, "children"):
+            child_node = await get_assembly_node(item, levels, nodes, parts)
+        else:
+            if id(item) not in parts:
+                parts[id(item)] = await get_part(item, levels)
+            child_node = parts[id(item)]
+        child_location = TopLoc_Location()
+        if child.location is not None:
+            child_location = child.location.wrapped
+            if not hasattr(item, "children"):
+                # The location of the child replaces the one of the part,
+                # which is applied to the mesh of the part already
+                wrapped = await item.get_wrapped()
+                if wrapped is not None and not wrapped.Location().IsIdentity():
+                    child_location = child_location.Multiplied(
+                        wrapped.Location().Inverted()
+                    )
+        node.children.append((child_node, child.name, child_location))
+    return node
+
+
+def _get_matrix(location):
+    """Returns the column-major 4x4 matrix of the location (if any)."""
+    if location is None or location.IsIdentity():
+        return None
+    trsf = location.Transformation()
+    matrix = []
+    for column in range(1, 5):
+        for row in range(1, 4):
+            matrix.append(trsf.Value(row, column))
+        matrix.append(1.0 if column == 4 else 0.0)
+    if matrix == IDENTITY:
+        return None
+    return matrix
+
+
+class _Buffer:
+    """The layout of the binary buffer, the data is written later."""
+
+    def __init__(self):
+        self.size = 0
+        self.chunks = []
+        self.views = []
+
+    def add(self, data: np.ndarray, target: int) -> int:
+        self.views.append(
+            {
+                "buffer": 0,
+                "byteOffset": self.size,
+                "byteLength": data.nbytes,
+                "target": target,
+            }
+        )
+        self.chunks.append(data)
+        self.size += data.nbytes
+        # Each buffer view must be aligned to 4 bytes
+        padding = -data.nbytes % 4
+        if padding:
+            self.chunks.append(np.zeros(padding, dtype=np.uint8))
+            self.size += padding
+        return len(self.views) - 1
+
+    def write(self, f):
+        for chunk in self.chunks:
+            # No copies are made for the contiguous arrays
+            f.write(memoryview(np.ascontiguousarray(chunk)).cast("B"))
+
+
+def _add_mesh(gltf, buffer, name, mesh: Mesh) -> int:
+    accessors = gltf["accessors"]
+
+    bbox_min, bbox_max = mesh.get_bbox()
+    accessors.append(
+        {
+            "bufferView": buffer.add(mesh.vertices, TARGET_ARRAY_BUFFER),
+            "componentType": COMPONENT_FLOAT,
+            "count": len(mesh.vertices),
+            "type": "VEC3",
+            "min": bbox_min.astype(float).tolist(),
+            "max": bbox_max.astype(float).tolist(),
+        }
+    )
+    accessors.append(
+        {
+            "bufferView": buffer.add(mesh.normals, TARGET_ARRAY_BUFFER),
+            "componentType": COMPONENT_FLOAT,
+            "count": len(mesh.normals),
+            "type": "VEC3",
+        }
+    )
+
+    # Small meshes use 16-bit indices
+    indices = mesh.triangles.ravel()
+    component = COMPONENT_UNSIGNED_INT
+    if len(mesh.vertices) <= 0xFFFF:
+        indices = indices.astype(np.uint16)
+        component = COMPONENT_UNSIGNED_SHORT
+    accessors.append(
+        {
+            "bufferView": buffer.add(indices, TARGET_ELEMENT_ARRAY_BUFFER),
+            "componentType": component,
+            "count": len(indices),
+            "type": "SCALAR",
+        }
+    )
+
+    gltf["meshes"].append(
+        {
+            "name": str(name),
+            "primitives": [
+                {
+                    "attributes": {
+                        "POSITION": len(accessors) - 3,
+                        "NORMAL": len(accessors) - 2,
+                    },
+                    "indices": len(accessors) - 1,
+                    "mode": MODE_TRIANGLES,
+                }
+            ],
+        }
+    )
+    return len(gltf["meshes"]) - 1
+
+
+def build_gltf(node):
+    """
+    Returns the glTF document of the assembly tree (or of a single part) and
+    the layout of its binary buffer. Nodes can not be shared in glTF, so the
+    repeated sub-assemblies are expanded, but their meshes are shared.
+    The tree is wrapped into the root node which converts the coordinates.
+    """
+    gltf = {
+        "asset": {"version": "2.0", "generator": "PartCAD"},
+        "scene": 0,
+        "scenes": [{"nodes": []}],
+        "nodes": [],
+        "meshes": [],
+        "accessors": [],
+    }
+    buffer = _Buffer()
+    meshes = {}
+
+    def add_node(name, location, mesh=None):
+        gltf_node = {}
+        if name is not None:
+            gltf_node["name"] = str(name)
+        matrix = _get_matrix(location)
+        if matrix is not None:
+            gltf_node["matrix"] = matrix
+        if mesh is not None:
+            gltf_node["mesh"] = mesh
+        gltf["nodes"].append(gltf_node)
+        return len(gltf["nodes"]) - 1, gltf_node
+
+    def add_part(part, name, location):
+        key, part_name, part_meshes = part
+        if key not in meshes:
+            meshes[key] = []
+            if not part_meshes[0].is_empty():
+                for mesh in part_meshes:
+                    meshes[key].append(
+                        _add_mesh(gltf, buffer, part_name, mesh)
+                    )
+        if name is None:
+            name = part_name
+        if not meshes[key]:
+            return add_node(name, location)[0]
+
+        index, gltf_node = add_node(name, location, meshes[key][0])
+        if len(meshes[key]) > 1:
+            # The nodes of the coarser levels replace the node of the part,
+            # so they have the same transformation and are not in the scene
+            lods = []
+            for lod, mesh in enumerate(meshes[key][1:]):
+                lods.append(
+                    add_node("%s-lod%d" % (name, lod + 1), location, mesh)[0]
+                )
+            gltf_node["extensions"] = {"MSFT_lod": {"ids": lods}}
+            gltf["extensionsUsed"] = ["MSFT_lod"]
+        return index
+
+    def add_assembly(node, name, location):
+        index, gltf_node = add_node(
+            name if name is not None else node.name, location
+        )
+        children = []
+        for child, child_name, child_location in node.children:
+            if isinstance(child, GltfAssemblyNode):
+                children.append(add_assembly(child, child_name, child_location))
+            else:
+                children.append(add_part(child, child_name, child_location))
+        if children:
+            gltf_node["children"] = children
+        return index
+
+    if isinstance(node, GltfAssemblyNode):
+        root = add_assembly(node, None, node.location)
+    else:
+        root = add_part(node, None, None)
+    # The coordinate system conversion is applied to the whole scene, so the
+    # meshes are written as is
+    gltf["nodes"].append({"children": [root], "matrix": ROOT_MATRIX})
+    gltf["scenes"][0]["nodes"].append(len(gltf["nodes"]) - 1)
+
+    if buffer.size > 0:
+        gltf["buffers"] = [{"byteLength": buffer.size}]
+        gltf["bufferViews"] = buffer.views
+    else:
+        # Empty arrays are not allowed
+        del gltf["meshes"]
+        del gltf["accessors"]
+    return gltf, buffer
+
+
+def write_gltf(node, filepath: str, binary: bool = False):
+    """
+    Writes the glTF 2.0 file of the assembly tree (or of a single part). The
+    binary buffer is either embedded (GLB) or written next to the JSON file.
+    """
+    gltf, buffer = build_gltf(node)
+
+    if not binary:
+        if buffer.size > 0:
+            bin_path = os.path.splitext(filepath)[0] + ".bin"
+            gltf["buffers"][0]["uri"] = os.path.basename(bin_path)
+            with open(bin_path, "wb") as f:
+                buffer.write(f)
+        with open(filepath, "w") as f:
+            json.dump(gltf, f)
+        return
+
+    json_chunk = json.dumps(gltf).encode()
+    json_chunk += b" " * (-len(json_chunk) % 4)
+    total_size = 12 + 8 + len(json_chunk)
+    if buffer.size > 0:
+        total_size += 8 + buffer.size
+    with open(filepath, "wb") as f:
+        f.write(struct.pack("<4sII", b"glTF", 2, total_size))
+        f.write(struct.pack("<I4s", len(json_chunk), b"JSON"))
+        f.write(json_chunk)
+        if buffer.size > 0:
+            f.write(struct.pack("<I4s", buffer.size, b"BIN\0"))
+            buffer.write(f)
@@ -11,6 +11,8 @@ from logging import DEBUG, INFO, WARN, WARNING, ERROR, CRITICAL
 import threading
 import time
 
+from .tracing import tracer
+
 # Track if any errors occurred during the execution for test purposes and for
 # the main program to know if it should exit with an error code.
 had_errors = False
@@ -104,6 +106,8 @@ class Process(object):
         self.item = item
         self.succeeded = False
         self.start = 0.0
+        self.span = None
+        self.token = None
 
     async def __aenter__(self):
         self.__enter__()
@@ -113,6 +117,9 @@ class Process(object):
 
         if process_lock.acquire():
             self.start = time.time()
+            self.span, self.token = tracer.start(
+                "process", self.op, self.package, self.item
+            )
             ops.process_start(self.op, self.package, self.item)
             self.succeeded = True
         else:
@@ -122,13 +129,14 @@ class Process(object):
     async def __aexit__(self, *args):
         self.__exit__(*args)
 
-    def __exit__(self, *_args):
+    def __exit__(self, _type=None, value=None, _traceback=None):
         global process_lock
         global info
 
         if self.succeeded:
             process_lock.release()
             ops.process_end(self.op, self.package, self.item)
+            tracer.end(self.span, self.token, value)
 
             delta = time.time() - self.start
             if self.item is None:
@@ -150,15 +158,21 @@ class Action(object):
             self.item = item + " : " + extra
         else:
             self.item = item
+        self.span = None
+        self.token = None
 
     async def __aenter__(self):
         self.__enter__()
 
     def __enter__(self):
+        self.span, self.token = tracer.start(
+            "action", self.op, self.package, self.item
+        )
         ops.action_start(self.op, self.package, self.item)
 
     async def __aexit__(self, *args):
         self.__exit__(*args)
 
-    def __exit__(self, *_args):
+    def __exit__(self, _type=None, value=None, _traceback=None):
         ops.action_end(self.op, self.package, self.item)
+        tracer.end(self.span, self.token, value)
@@ -0,0 +1,318 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-17
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+# Memory accounting of the shapes. Walking the Python object graph is slow
+# and does not see the memory allocated by OCCT, which is where almost all of
+# the memory goes. Instead, the native memory is estimated from the topology
+# and the geometry of the shapes (the number of poles of the curves and
+# surfaces, the size of the triangulations). The estimate is computed once
+# per instantiated shape and is reused until the shape changes.
+
+import collections
+import sys
+import threading
+
+from OCP.BRep import BRep_Tool
+from OCP.BRepAdaptor import BRepAdaptor_Curve, BRepAdaptor_Surface
+from OCP.GeomAbs import (
+    GeomAbs_BezierCurve,
+    GeomAbs_BezierSurface,
+    GeomAbs_BSplineCurve,
+    GeomAbs_BSplineSurface,
+)
+from OCP.TopAbs import (
+    TopAbs_EDGE,
+    TopAbs_FACE,
+    TopAbs_FORWARD,
+    TopAbs_VERTEX,
+)
+from OCP.TopLoc import TopLoc_Location
+from OCP.TopoDS import TopoDS, TopoDS_Iterator
+from OCP.TopTools import TopTools_MapOfShape
+
+from .user_config import user_config
+from . import logging as pc_logging
+
+# The approximate size of the OCCT objects (64-bit builds)
+SIZE_SHAPE = 96  # TopoDS_TShape and the list of its children
+SIZE_REFERENCE = 48  # TopoDS_Shape (a located reference) in the list
+SIZE_VERTEX = 160  # BRep_TVertex and its point representation
+SIZE_EDGE = 256  # BRep_TEdge and its curve representations
+SIZE_FACE = 192  # BRep_TFace
+SIZE_ELEMENTARY = 160  # Lines, circles, planes, cylinders etc
+SIZE_POLE = 32  # gp_Pnt and its weight
+SIZE_NODE = 24  # gp_Pnt of a triangulation
+SIZE_NODE_NORMAL = 12
+SIZE_NODE_UV = 16
+SIZE_TRIANGLE = 12
+
+
+def _get_curve_size(edge) -> int:
+    if BRep_Tool.Degenerated_s(edge):
+        return 0
+    try:
+        curve = BRepAdaptor_Curve(edge)
+        curve_type = curve.GetType()
+        if curve_type == GeomAbs_BSplineCurve:
+            bspline = curve.BSpline()
+            return SIZE_ELEMENTARY + SIZE_POLE * (
+                bspline.NbPoles() + bspline.NbKnots()
+            )
+        if curve_type == GeomAbs_BezierCurve:
+            return SIZE_ELEMENTARY + SIZE_POLE * curve.Bezier().NbPoles()
+    except Exception:
+        pass
+    return SIZE_ELEMENTARY
+
+
+def _get_surface_size(face) -> int:
+    size = SIZE_ELEMENTARY
+    try:
+        surface = BRepAdaptor_Surface(face, False)
+        surface_type = surface.GetType()
+        if surface_type == GeomAbs_BSplineSurface:
+            bspline = surface.BSpline()
+            size += SIZE_POLE * (
+                bspline.NbUPoles() * bspline.NbVPoles()
+                + bspline.NbUKnots()
+                + bspline.NbVKnots()
+            )
+        elif surface_type == GeomAbs_BezierSurface:
+            bezier = surface.Bezier()
+            size += SIZE_POLE * bezier.NbUPoles() * bezier.NbVPoles()
+    except Exception:
+        pass
+
+    triangulation = BRep_Tool.Triangulation_s(face, TopLoc_Location())
+    if triangulation is not None:
+        nodes = triangulation.NbNodes()
+        node_size = SIZE_NODE
+        if triangulation.HasNormals():
+            node_size += SIZE_NODE_NORMAL
+        if triangulation.HasUVNodes():
+            node_size += SIZE_NODE_UV
+        size += nodes * node_size
+        size += triangulation.NbTriangles() * SIZE_TRIANGLE
+    return size
+
+
+def get_native_size(shape) -> int:
+    """
+    Returns the estimated amount of memory allocated by OCCT for the shape.
+    The sub-shapes shared by several parents (including the instances of
+    the same geometry in assemblies) are counted once.
+    """
+    if shape is None or shape.IsNull():
+        return 0
+
+    size = SIZE_REFERENCE
+    identity = TopLoc_Location()
+    seen = TopTools_MapOfShape()
+    stack = [shape]
+    while stack:
+        current = stack.pop()
+        # The same geometry regardless of the location and the orientation
+        key = current.Located(identity).Oriented(TopAbs_FORWARD)
+        if not seen.Add(key):
+            continue
+
+        shape_type = current.ShapeType()
+        if shape_type == TopAbs_VERTEX:
+            size += SIZE_VERTEX
+        elif shape_type == TopAbs_EDGE:
+            size += SIZE_EDGE + _get_curve_size(TopoDS.Edge_s(current))
+        elif shape_type == TopAbs_FACE:
+            size += SIZE_FACE + _get_surface_size(TopoDS.Face_s(current))
+        else:
+            size += SIZE_SHAPE
+
+        iterator = TopoDS_Iterator(current, False, False)
+        while iterator.More():
+            size += SIZE_REFERENCE
+            stack.append(iterator.Value())
+            iterator.Next()
+
+    return size
+
+
+def get_python_size(shape) -> int:
+    """
+    Returns the approximate size of the Python objects owned by the shape:
+    the object itself, its attributes and its configuration. The objects
+    shared with the rest of the context (e.g. the project) are not counted.
+    """
+    size = sys.getsizeof(shape) + sys.getsizeof(shape.__dict__)
+    size += _get_config_size(getattr(shape, "config", None))
+    for mesh in getattr(shape, "meshes", {}).values():
+        for array in (mesh.vertices, mesh.normals, mesh.triangles):
+            size += array.nbytes
+    return size
+
+
+def _get_config_size(obj) -> int:
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        for key, value in obj.items():
+            size += _get_config_size(key) + _get_config_size(value)
+    elif isinstance(obj, (list, tuple)):
+        for value in obj:
+            size += _get_config_size(value)
+    return size
+
+
+def format_size(size: int) -> str:
+    if size < 1048576:
+        return "%.2f KB" % (size / 1024.0)
+    return "%.2f MB" % (size / 1048576.0)
+
+
+class MemoryStats:
+    """
+    The memory used by the shapes of each package: the number of shapes,
+    the number of instantiated shapes and the size of the Python and OCCT
+    objects. The instantiated shapes are registered as they are
+    instantiated and evicted, while their memory usage is only estimated
+    when the totals are requested (see add_totals()).
+    """
+
+    def __init__(self):
+        self.packages = {}
+        # The instantiated shapes by their ids
+        self.shapes = {}
+        self.lock = threading.Lock()
+
+    def _get_package(self, package_name) -> dict:
+        if package_name not in self.packages:
+            self.packages[package_name] = {
+                "shapes": 0,
+                "instantiated": 0,
+                "python": 0,
+                "native": 0,
+            }
+        return self.packages[package_name]
+
+    def add_project(self, project):
+        """Accounts for the package itself and the number of its shapes."""
+        stats = self._get_package(project.name)
+        stats["shapes"] += (
+            len(project.sketches)
+            + len(project.parts)
+            + len(project.assemblies)
+        )
+        stats["python"] += sys.getsizeof(project) + _get_config_size(
+            project.config_obj
+        )
+
+    def add_totals(self, other):
+        """
+        Adds the memory usage of the shapes instantiated in 'other'. It is
+        estimated here, once per instantiated shape.
+        """
+        with other.lock:
+            shapes = list(other.shapes.values())
+        for shape in shapes:
+            python_size, native_size = shape.get_memory_usage()
+            stats = self._get_package(shape.project_name)
+            stats["instantiated"] += 1
+            stats["python"] += python_size
+            stats["native"] += native_size
+
+    def add_shape(self, shape):
+        """Registers the instantiated shape (once)."""
+        with self.lock:
+            self.shapes[id(shape)] = shape
+
+    def remove_shape(self, shape):
+        """Unregisters the shape (e.g. if it is evicted)."""
+        with self.lock:
+            self.shapes.pop(id(shape), None)
+
+    @property
+    def python(self) -> int:
+        return sum(map(lambda s: s["python"], self.packages.values()))
+
+    @property
+    def native(self) -> int:
+        return sum(map(lambda s: s["native"], self.packages.values()))
+
+    @property
+    def total(self) -> int:
+        return self.python + self.native
+
+
+class MemoryBudget:
+    """
+    Limits the memory used by the instantiated shapes. Once the estimated
+    OCCT memory of the instantiated shapes exceeds the limit, the least
+    recently used shapes are evicted (see 'Shape.evict()'). They are
+    restored from the persistent cache (or instantiated again) on the next
+    access.
+    """
+
+    def __init__(self, limit=None):
+        if limit is None:
+            limit = user_config.shape_memory_limit
+        self.limit = limit
+
+        self.lock = threading.Lock()
+        # id(shape) -> (shape, size), the least recently used first
+        self.shapes = collections.OrderedDict()
+        self.size = 0
+
+        self.stats_evicted = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.limit > 0
+
+    def touch(self, shape):
+        """Marks the shape as recently used."""
+        if not self.enabled:
+            return
+        with self.lock:
+            if id(shape) in self.shapes:
+                self.shapes.move_to_end(id(shape))
+
+    def add(self, shape):
+        """Accounts for the newly instantiated shape."""
+        if not self.enabled:
+            return
+        _, size = shape.get_memory_usage()
+
+        victims = []
+        with self.lock:
+            old = self.shapes.pop(id(shape), None)
+            if old is not None:
+                self.size -= old[1]
+            self.shapes[id(shape)] = (shape, size)
+            self.size += size
+
+            # Never evict the shape that is being added
+            while self.size > self.limit and len(self.shapes) > 1:
+                _, (victim, victim_size) = self.shapes.popitem(last=False)
+                self.size -= victim_size
+                victims.append(victim)
+            self.stats_evicted += len(victims)
+
+        for victim in victims:
+            pc_logging.debug(
+                "Evicting %s:%s from memory"
+                % (victim.project_name, victim.name)
+            )
+            victim.evict()
+
+    def remove(self, shape):
+        """Stops accounting for the shape (e.g. if it is evicted)."""
+        with self.lock:
+            old = self.shapes.pop(id(shape), None)
+            if old is not None:
+                self.size -= old[1]
+
+
+budget = MemoryBudget()
@@ -0,0 +1,408 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-07
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import json
+import os
+import struct
+import zipfile
+from xml.sax.saxutils import quoteattr
+
+import numpy as np
+
+from OCP.BRep import BRep_Tool
+from OCP.BRepMesh import BRepMesh_IncrementalMesh
+from OCP.IMeshTools import IMeshTools_Parameters
+from OCP.TopAbs import TopAbs_FACE, TopAbs_REVERSED
+from OCP.TopExp import TopExp_Explorer
+from OCP.TopLoc import TopLoc_Location
+from OCP.TopoDS import TopoDS
+
+
+class Mesh:
+    """
+    Triangulation of a shape. It is computed once per tolerance pair and
+    shared by all mesh exporters (STL, 3MF, ThreeJS, OBJ, glTF).
+    """
+
+    MAGIC = b"PCMESH1\0"
+    HEADER = struct.Struct("<II")
+
+    vertices: np.ndarray  # (N, 3) float32
+    normals: np.ndarray  # (N, 3) float32
+    triangles: np.ndarray  # (M, 3) uint32
+
+    def __init__(self, vertices=None, normals=None, triangles=None):
+        if vertices is None:
+            vertices = np.zeros((0, 3), dtype=np.float32)
+        if normals is None:
+            normals = np.zeros((0, 3), dtype=np.float32)
+        if triangles is None:
+            triangles = np.zeros((0, 3), dtype=np.uint32)
+        self.vertices = np.ascontiguousarray(vertices, dtype=np.float32)
+        self.normals = np.ascontiguousarray(normals, dtype=np.float32)
+        self.triangles = np.ascontiguousarray(triangles, dtype=np.uint32)
+
+    def is_empty(self) -> bool:
+        return len(self.triangles) == 0
+
+    def get_bbox(self):
+        """Returns the minimum and maximum corners of the bounding box."""
+        if len(self.vertices) == 0:
+            return np.zeros(3), np.zeros(3)
+        return self.vertices.min(axis=0), self.vertices.max(axis=0)
+
+    def get_face_normals(self) -> np.ndarray:
+        v = self.vertices[self.triangles]
+        normals = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+        length = np.linalg.norm(normals, axis=1, keepdims=True)
+        length[length == 0] = 1
+        return (normals / length).astype(np.float32)
+
+    def to_bytes(self) -> bytes:
+        return b"".join(
+            [
+                Mesh.MAGIC,
+                Mesh.HEADER.pack(len(self.vertices), len(self.triangles)),
+                self.vertices.tobytes(),
+                self.normals.tobytes(),
+                self.triangles.tobytes(),
+            ]
+        )
+
+    @staticmethod
+    def from_bytes(data: bytes):
+        if data[: len(Mesh.MAGIC)] != Mesh.MAGIC:
+            raise ValueError("Not a mesh")
+        offset = len(Mesh.MAGIC)
+        vertex_count, triangle_count = Mesh.HEADER.unpack_from(data, offset)
+        offset += Mesh.HEADER.size
+
+        def take(dtype, count):
+            nonlocal offset
+            array = np.frombuffer(
+                data, dtype=dtype, count=count, offset=offset
+            )
+            offset += array.nbytes
+            return array.reshape((-1, 3))
+
+        vertices = take(np.float32, vertex_count * 3)
+        normals = take(np.float32, vertex_count * 3)
+        triangles = take(np.uint32, triangle_count * 3)
+        return Mesh(vertices, normals, triangles)
+
+
+def tessellate(shape, tolerance: float, angular_tolerance: float) -> Mesh:
+    """
+    Triangulates the shape. Vertices are not shared between faces so that
+    the normals stay sharp on the edges.
+    """
+    # Same settings as used by CadQuery and build123d exporters
+    parameters = IMeshTools_Parameters()
+    parameters.Deflection = tolerance
+    parameters.Angle = angular_tolerance
+    parameters.Relative = True
+    parameters.InParallel = True
+    # The triangulation stored in the shape is replaced even if it is finer
+    # (e.g. a coarse level of detail is requested after the default one)
+    parameters.AllowQualityDecrease = True
+    BRepMesh_IncrementalMesh(shape, parameters)
+
+    vertices = []
+    normals = []
+    triangles = []
+    offset = 0
+
+    explorer = TopExp_Explorer(shape, TopAbs_FACE)
+    while explorer.More():
+        face = TopoDS.Face_s(explorer.Current())
+        explorer.Next()
+
+        location = TopLoc_Location()
+        poly = BRep_Tool.Triangulation_s(face, location)
+        if poly is None:
+            continue
+        trsf = location.Transformation()
+
+        face_vertices = np.empty((poly.NbNodes(), 3), dtype=np.float64)
+        for i in range(poly.NbNodes()):
+            p = poly.Node(i + 1).Transformed(trsf)
+            face_vertices[i] = (p.X(), p.Y(), p.Z())
+
+        face_triangles = np.empty((poly.NbTriangles(), 3), dtype=np.int64)
+        for i in range(poly.NbTriangles()):
+            face_triangles[i] = poly.Triangle(i + 1).Get()
+        face_triangles -= 1
+        if face.Orientation() == TopAbs_REVERSED:
+            face_triangles = face_triangles[:, [0, 2, 1]]
+
+        # Smooth normals within the face, weighted by the triangle area
+        v = face_vertices[face_triangles]
+        triangle_normals = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+        face_normals = np.zeros_like(face_vertices)
+        for corner in range(3):
+            np.add.at(
+                face_normals, face_triangles[:, corner], triangle_normals
+            )
+        length = np.linalg.norm(face_normals, axis=1, keepdims=True)
+        length[length == 0] = 1
+        face_normals /= length
+
+        vertices.append(face_vertices)
+        normals.append(face_normals)
+        triangles.append(face_triangles + offset)
+        offset += len(face_vertices)
+
+    if not triangles:
+        return Mesh()
+    return Mesh(
+        np.concatenate(vertices),
+        np.concatenate(normals),
+        np.concatenate(triangles),
+    )
+
+
+def _get_quadric_positions(mesh: Mesh, cell: np.ndarray, count: int):
+    """
+    Returns the positions of the clustered vertices minimizing the sum of
+    the squared distances to the planes of the triangles around them.
+    """
+    vertices = mesh.vertices.astype(np.float64)
+    v = vertices[mesh.triangles]
+    normals = np.cross(v[:, 1] - v[:, 0], v[:, 2] - v[:, 0])
+    # The length of the cross product is twice the area: used as the weight
+    area = np.linalg.norm(normals, axis=1)
+    valid = area > 0
+    unit = np.zeros_like(normals)
+    unit[valid] = normals[valid] / area[valid, None]
+    offset = -np.einsum("ij,ij->i", unit, v[:, 0])
+
+    a = area[:, None, None] * unit[:, :, None] * unit[:, None, :]
+    b = (area * offset)[:, None] * unit
+    quadric_a = np.zeros((count, 3, 3))
+    quadric_b = np.zeros((count, 3))
+    for corner in range(3):
+        np.add.at(quadric_a, cell[mesh.triangles[:, corner]], a)
+        np.add.at(quadric_b, cell[mesh.triangles[:, corner]], b)
+
+    # Flat and linear clusters have no unique optimum, so the solution is
+    # pulled towards the centroid of the cluster
+    centroid = np.zeros((count, 3))
+    np.add.at(centroid, cell, vertices)
+    centroid /= np.maximum(np.bincount(cell, minlength=count), 1)[:, None]
+    scale = np.trace(quadric_a, axis1=1, axis2=2) + 1e-12
+    regularization = 1e-3 * scale
+    quadric_a += regularization[:, None, None] * np.eye(3)
+    quadric_b -= regularization[:, None] * centroid
+    return np.linalg.solve(quadric_a, -quadric_b[:, :, None])[:, :, 0]
+
+
+def decimate(mesh: Mesh, ratio: float) -> Mesh:
+    """
+    Reduces the number of vertices to approximately the given share using
+    the vertex clustering with quadric error metrics: the vertices are
+    clustered in a uniform grid and each cluster is replaced with the point
+    minimizing the quadric error. The vertices of differently oriented
+    faces are kept apart so that the sharp edges stay sharp.
+    """
+    if mesh.is_empty() or ratio >= 1.0:
+        return mesh
+
+    bbox_min, bbox_max = mesh.get_bbox()
+    bbox_min = bbox_min.astype(np.float64)
+    size = max(float((bbox_max - bbox_min).max()), 1e-9)
+    # The dominant direction of the normal (6 buckets)
+    axis = np.abs(mesh.normals).argmax(axis=1)
+    sign = np.take_along_axis(mesh.normals, axis[:, None], axis=1)[:, 0] < 0
+    bucket = axis * 2 + sign
+
+    def cluster(resolution):
+        grid = np.floor(
+            (mesh.vertices - bbox_min) / size * (resolution - 1e-6)
+        ).astype(np.int64)
+        keys = (grid[:, 0] * resolution + grid[:, 1]) * resolution + grid[:, 2]
+        _, cell = np.unique(keys, return_inverse=True)
+        return cell.ravel()
+
+    def count_clusters(cell):
+        return len(np.unique(cell * 6 + bucket))
+
+    # Find the grid resolution giving the target number of vertices
+    target = max(int(len(mesh.vertices) * ratio), 4)
+    low, high = 1, 2
+    while count_clusters(cluster(high)) < target and high < 1 << 20:
+        low, high = high, high * 2
+    while high - low > 1:
+        middle = (low + high) // 2
+        if count_clusters(cluster(middle)) < target:
+            low = middle
+        else:
+            high = middle
+    cell = cluster(low)
+    cell_count = int(cell.max()) + 1
+
+    # The position is shared by all vertices of the cell, the normals are
+    # averaged per cell and orientation
+    positions = _get_quadric_positions(mesh, cell, cell_count)
+    keys, vertex = np.unique(cell * 6 + bucket, return_inverse=True)
+    vertex = vertex.ravel()
+    vertices = positions[keys // 6]
+    normals = np.zeros((len(keys), 3))
+    np.add.at(normals, vertex, mesh.normals.astype(np.float64))
+    length = np.linalg.norm(normals, axis=1, keepdims=True)
+    length[length == 0] = 1
+    normals /= length
+
+    # Drop the triangles collapsed into a point or a line
+    triangles = vertex[mesh.triangles]
+    cells = cell[mesh.triangles]
+    valid = (
+        (cells[:, 0] != cells[:, 1])
+        & (cells[:, 1] != cells[:, 2])
+        & (cells[:, 0] != cells[:, 2])
+    )
+    triangles = triangles[valid]
+    if len(triangles) == 0:
+        # Too coarse for this mesh
+        return mesh
+
+    # Drop the unused vertices
+    used, triangles = np.unique(triangles, return_inverse=True)
+    return Mesh(vertices[used], normals[used], triangles.reshape((-1, 3)))
+
+
+def get_lod_path(filepath: str, level: int) -> str:
+    """Returns the path of the given level of detail (1 and above)."""
+    root, extension = os.path.splitext(filepath)
+    return "%s-lod%d%s" % (root, level, extension)
+
+
+def write_stl(mesh: Mesh, filepath: str):
+    """Writes a binary STL file."""
+    record = np.dtype(
+        [
+            ("normal", "<f4", (3,)),
+            ("vertices", "<f4", (3, 3)),
+            ("attribute", "<u2"),
+        ]
+    )
+    records = np.zeros(len(mesh.triangles), dtype=record)
+    records["normal"] = mesh.get_face_normals()
+    records["vertices"] = mesh.vertices[mesh.triangles]
+
+    with open(filepath, "wb") as f:
+        f.write(b"Exported by PartCAD".ljust(80, b" "))
+        f.write(struct.pack("<I", len(records)))
+        f.write(records.tobytes())
+
+
+def write_obj(mesh: Mesh, filepath: str):
+    with open(filepath, "w") as f:
+        f.write("# OBJ file\n")
+        f.writelines(
+            map(lambda v: "v %.4f %.4f %.4f\n" % tuple(v), mesh.vertices)
+        )
+        f.writelines(
+            map(lambda n: "vn %.4f %.4f %.4f\n" % tuple(n), mesh.normals)
+        )
+        # Normals have the same indices as vertices
+        f.writelines(
+            map(
+                lambda t: "f %d//%d %d//%d %d//%d\n" % tuple(t.repeat(2)),
+                mesh.triangles.astype(np.int64) + 1,
+            )
+        )
+
+
+def write_threejs(mesh: Mesh, filepath: str):
+    """Writes a ThreeJS JSON model (format version 3) like CadQuery does."""
+    faces = np.zeros((len(mesh.triangles), 4), dtype=np.int64)
+    faces[:, 1:] = mesh.triangles
+    model = {
+        "metadata": {
+            "formatVersion": 3,
+            "generatedBy": "PartCAD",
+            "vertices": len(mesh.vertices),
+            "faces": len(mesh.triangles),
+            "normals": 0,
+            "colors": 0,
+            "uvs": 0,
+            "materials": 1,
+            "morphTargets": 0,
+        },
+        "scale": 1.0,
+        "materials": [
+            {
+                "DbgColor": 15658734,
+                "DbgIndex": 0,
+                "DbgName": "Material",
+                "colorAmbient": [0.0, 0.0, 0.0],
+                "colorDiffuse": [0.64, 0.10, 0.13],
+                "colorSpecular": [0.5, 0.5, 0.5],
+                "shading": "Lambert",
+                "specularCoef": 50,
+                "transparency": 1.0,
+                "vertexColors": False,
+            }
+        ],
+        "vertices": np.round(mesh.vertices.astype(np.float64), 6)
+        .ravel()
+        .tolist(),
+        "morphTargets": [],
+        "normals": [],
+        "colors": [],
+        "uvs": [[]],
+        "faces": faces.ravel().tolist(),
+    }
+    with open(filepath, "w") as f:
+        json.dump(model, f)
+
+
+def write_3mf(mesh: Mesh, filepath: str, name: str = "PartCAD"):
+    content_types = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Types xmlns="http://schemas.openxmlformats.org/package/2006/content-types">'
+        '<Default Extension="rels" ContentType="application/vnd.openxmlformats-package.relationships+xml"/>'
+        '<Default Extension="model" ContentType="application/vnd.ms-package.3dmanufacturing-3dmodel+xml"/>'
+        "</Types>"
+    )
+    rels = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/relationships">'
+        '<Relationship Target="/3D/3dmodel.model" Id="rel0" Type="http://schemas.microsoft.com/3dmanufacturing/2013/01/3dmodel"/>'
+        "</Relationships>"
+    )
+
+    vertices = "".join(
+        map(
+            lambda v: '<vertex x="%g" y="%g" z="%g"/>' % tuple(v),
+            mesh.vertices.astype(np.float64),
+        )
+    )
+    triangles = "".join(
+        map(
+            lambda t: '<triangle v1="%d" v2="%d" v3="%d"/>' % tuple(t),
+            mesh.triangles.astype(np.int64),
+        )
+    )
+    model = (
+        '<?xml version="1.0" encoding="UTF-8"?>\n'
+        '<model unit="millimeter" xml:lang="en-US" xmlns="http://schemas.microsoft.com/3dmanufacturing/core/2015/02">'
+        "<resources>"
+        '<object id="1" name=%s type="model">'
+        "<mesh><vertices>%s</vertices><triangles>%s</triangles></mesh>"
+        "</object>"
+        "</resources>"
+        '<build><item objectid="1"/></build>'
+        "</model>"
+    ) % (quoteattr(str(name)), vertices, triangles)
+
+    with zipfile.ZipFile(filepath, "w", zipfile.ZIP_DEFLATED) as z:
+        z.writestr("[Content_Types].xml", content_types)
+        z.writestr("_rels/.rels", rels)
+        z.writestr("3D/3dmodel.model", model)
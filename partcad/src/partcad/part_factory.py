@@ -40,7 +40,11 @@ class PartFactory(ShapeFactory):
         # TODO(clairbee): Make the next line work for part_factory_file only
         part.instantiate = lambda part_self: self.instantiate(part_self)
         part.info = lambda: self.info(part)
+        part.get_fingerprint_inputs = lambda: self.get_fingerprint_inputs(part)
+        part.get_dependencies = lambda: self.get_dependencies(part)
+        part.prepare_runtime = lambda: self.prepare_runtime(part)
         part.with_ports = self.with_ports
+        part.memory_stats = self.ctx.memory_stats
         return part
 
     def _create(self, config: object):
@@ -66,6 +66,9 @@ class PartFactoryAlias(pf.PartFactory):
 
             pc_logging.debug("Initializing an alias to %s" % self.source)
 
+    def get_dependencies(self, part):
+        return [self.ctx._get_part(self.source)]
+
     async def instantiate(self, part):
         with pc_logging.Action("Alias", part.project_name, part.name):
 
@@ -7,10 +7,7 @@
 # Licensed under Apache License, Version 2.0.
 #
 
-import base64
 import os
-import pickle
-import sys
 
 from OCP.gp import gp_Ax1
 from OCP.TopoDS import (
@@ -22,15 +19,15 @@ from OCP.TopoDS import (
 )
 from OCP.TopLoc import TopLoc_Location
 
+from .cache import cache
 from .part_factory_python import PartFactoryPython
-from . import wrapper
+from .runtime_python import BUILD123D_REQUIREMENTS
 from . import logging as pc_logging
 
-sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
-from cq_serialize import register as register_cq_helper
-
 
 class PartFactoryBuild123d(PartFactoryPython):
+    requirements = BUILD123D_REQUIREMENTS
+
     def __init__(
         self, ctx, source_project, target_project, config, can_create=False
     ):
@@ -68,13 +65,14 @@ class PartFactoryBuild123d(PartFactoryPython):
                 )
                 return None
 
-            # Finish initialization of PythonRuntime
-            # which was too expensive to do in the constructor
-            await self.prepare_python()
-
-            # Get the path to the wrapper script
-            # which needs to be executed
-            wrapper_path = wrapper.get("build123d.py")
+            # Reuse the shape instantiated earlier with the same inputs
+            cache_key = self.get_cache_key(part)
+            shape = cache.get_shape(cache_key)
+            components = cache.get_components(cache_key)
+            if shape is not None and components is not None:
+                self.ctx.stats_parts_instantiated += 1
+                part.components = components
+                return shape
 
             # Build the request
             request = {"build_parameters": {}}
@@ -90,28 +88,10 @@ class PartFactoryBuild123d(PartFactoryPython):
                 patch.update(self.config["patch"])
             request["patch"] = patch
 
-            # Serialize the request
-            register_cq_helper()
-            picklestring = pickle.dumps(request)
-            request_serialized = base64.b64encode(picklestring).decode()
-
-            await self.runtime.ensure("ocp-tessellate")
-            await self.runtime.ensure("cadquery")
-            await self.runtime.ensure("numpy==1.24.1")
-            await self.runtime.ensure("numpy-quaternion==2023.0.4")
-            await self.runtime.ensure("nptyping==1.24.1")
-            await self.runtime.ensure("typing_extensions>=4.6.0,<5")
-            await self.runtime.ensure("build123d")
-            cwd = self.project.config_dir
-            if self.cwd is not None:
-                cwd = os.path.join(self.project.config_dir, self.cwd)
-            response_serialized, errors = await self.runtime.run(
-                [
-                    wrapper_path,
-                    os.path.abspath(part.path),
-                    os.path.abspath(cwd),
-                ],
-                request_serialized,
+            result, errors = await self.run_wrapper(
+                "build123d",
+                part,
+                request,
             )
             if len(errors) > 0:
                 error_lines = errors.split("\n")
@@ -123,15 +103,8 @@ class PartFactoryBuild123d(PartFactoryPython):
                     # part.error("%s: %s" % (part.name, error_line))
                     part.error(error_line)
 
-            try:
-                # pc_logging.error("Response: %s" % response_serialized)
-                response = base64.b64decode(response_serialized)
-                register_cq_helper()
-                result = pickle.loads(response)
-            except Exception as e:
-                part.error(
-                    "Exception while deserializing %s: %s" % (part.name, e)
-                )
+            if result is None:
+                part.error("Failed to get the result of %s" % part.name)
                 return None
 
             if not result["success"]:
@@ -186,4 +159,8 @@ class PartFactoryBuild123d(PartFactoryPython):
             process(result["shapes"], part.components)
             # pc_logging.info("Created: %s" % type(compound))
 
+            # The components are not a part of the compound (e.g. edges and
+            # faces), so they are cached separately
+            cache.put_components(cache_key, part.components)
+            cache.put_shape(cache_key, compound)
             return compound
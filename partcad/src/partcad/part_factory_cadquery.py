@@ -7,25 +7,22 @@
 # Licensed under Apache License, Version 2.0.
 #
 
-import base64
 import os
-import pickle
-import sys
 
 from OCP.TopoDS import (
     TopoDS_Builder,
     TopoDS_Compound,
 )
 
+from .cache import cache
 from .part_factory_python import PartFactoryPython
-from . import wrapper
+from .runtime_python import CADQUERY_REQUIREMENTS
 from . import logging as pc_logging
 
-sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
-from cq_serialize import register as register_cq_helper
-
 
 class PartFactoryCadquery(PartFactoryPython):
+    requirements = CADQUERY_REQUIREMENTS
+
     def __init__(
         self, ctx, source_project, target_project, config, can_create=False
     ):
@@ -62,13 +59,12 @@ class PartFactoryCadquery(PartFactoryPython):
                 )
                 return None
 
-            # Finish initialization of PythonRuntime
-            # which was too expensive to do in the constructor
-            await self.prepare_python()
-
-            # Get the path to the wrapper script
-            # which needs to be executed
-            wrapper_path = wrapper.get("cadquery.py")
+            # Reuse the shape instantiated earlier with the same inputs
+            cache_key = self.get_cache_key(part)
+            shape = cache.get_shape(cache_key)
+            if shape is not None:
+                self.ctx.stats_parts_instantiated += 1
+                return shape
 
             # Build the request
             request = {"build_parameters": {}}
@@ -84,42 +80,18 @@ class PartFactoryCadquery(PartFactoryPython):
                 patch.update(self.config["patch"])
             request["patch"] = patch
 
-            # Serialize the request
-            register_cq_helper()
-            picklestring = pickle.dumps(request)
-            request_serialized = base64.b64encode(picklestring).decode()
-
-            await self.runtime.ensure("ocp-tessellate")
-            await self.runtime.ensure("cadquery")
-            await self.runtime.ensure("numpy==1.24.1")
-            await self.runtime.ensure("numpy-quaternion==2023.0.4")
-            await self.runtime.ensure("nptyping==1.24.1")
-            await self.runtime.ensure("typing_extensions>=4.6.0,<5")
-            cwd = self.project.config_dir
-            if self.cwd is not None:
-                cwd = os.path.join(self.project.config_dir, self.cwd)
-            response_serialized, errors = await self.runtime.run(
-                [
-                    wrapper_path,
-                    os.path.abspath(part.path),
-                    os.path.abspath(cwd),
-                ],
-                request_serialized,
+            result, errors = await self.run_wrapper(
+                "cadquery",
+                part,
+                request,
             )
             if len(errors) > 0:
                 error_lines = errors.split("\n")
                 for error_line in error_lines:
                     part.error("%s: %s" % (part.name, error_line))
 
-            try:
-                # pc_logging.error("Response: %s" % response_serialized)
-                response = base64.b64decode(response_serialized)
-                register_cq_helper()
-                result = pickle.loads(response)
-            except Exception as e:
-                part.error(
-                    "Exception while deserializing %s: %s" % (part.name, e)
-                )
+            if result is None:
+                part.error("Failed to get the result of %s" % part.name)
                 return None
 
             if not result["success"]:
@@ -133,11 +105,13 @@ class PartFactoryCadquery(PartFactoryPython):
             if len(result["shapes"]) == 0:
                 return None
             if len(result["shapes"]) == 1:
-                return result["shapes"][0]
-
-            builder = TopoDS_Builder()
-            compound = TopoDS_Compound()
-            builder.MakeCompound(compound)
-            for shape in result["shapes"]:
-                builder.Add(compound, shape)
-            return compound
+                shape = result["shapes"][0]
+            else:
+                builder = TopoDS_Builder()
+                shape = TopoDS_Compound()
+                builder.MakeCompound(shape)
+                for child in result["shapes"]:
+                    builder.Add(shape, child)
+
+            cache.put_shape(cache_key, shape)
+            return shape
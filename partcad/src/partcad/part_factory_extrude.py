@@ -64,6 +64,9 @@ class PartFactoryExtrude(PartFactory):
 
             self._create(config)
 
+    def get_dependencies(self, part):
+        return [self.ctx.get_sketch(self.source_sketch_spec)]
+
     async def instantiate(self, part):
         with pc_logging.Action("Extrude", part.project_name, part.name):
             shape = None
@@ -17,7 +17,7 @@ import threading
 from .ai import Ai
 from . import logging as pc_logging
 from . import sync_threads as pc_thread
-from .utils import total_size
+from .memory import get_python_size
 from .user_config import user_config
 
 DEFAULT_ALTERNATIVES_GEOMETRIC_MODELING = 3
@@ -678,7 +678,9 @@ Very important not to produce exactly the same script: at least something has to
         # Since this is an ephemeral part, certain things need to be tweaked
         part.instantiate = self.instantiate_orig  # Remove the AI wrapper
         part.path = source_path  # Set the path to the temporary script file
-        pc_logging.debug("Part created: %.2f KB" % (total_size(part) / 1024.0))
+        pc_logging.debug(
+            "Part created: %.2f KB" % (get_python_size(part) / 1024.0)
+        )
 
         def render(part):
             nonlocal exception_text
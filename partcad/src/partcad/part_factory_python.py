@@ -7,58 +7,37 @@
 # Licensed under Apache License, Version 2.0.
 #
 
-from .part_factory_file import PartFactoryFile
-from .runtime_python import PythonRuntime
-
-
-class PartFactoryPython(PartFactoryFile):
-    runtime: PythonRuntime
-    cwd: str
+import sys
 
-    def __init__(
-        self,
-        ctx,
-        source_project,
-        target_project,
-        config,
-        can_create=False,
-        python_version=None,
-    ):
-        super().__init__(
-            ctx,
-            source_project,
-            target_project,
-            config,
-            extension=".py",
-            can_create=can_create,
-        )
-        self.cwd = config.get("cwd", None)
+from .cache import Cache
+from .part_factory_file import PartFactoryFile
+from .shape_factory_python import ShapeFactoryPython
 
-        if python_version is None:
-            # TODO(clairbee): stick to a default constant or configured version
-            python_version = self.project.python_version
-        self.runtime = self.ctx.get_python_runtime(python_version)
 
-    async def prepare_python(self):
+class PartFactoryPython(ShapeFactoryPython, PartFactoryFile):
+    def get_cache_key(self, part):
         """
-        This method is called by child classes
-        to prepare the Python environment
-        before instantiating the part.
+        Returns the key to store the instantiated shape in the persistent cache
+        under. It covers all inputs which may affect the shape.
         """
-
-        # Install dependencies of this package
-        await self.runtime.prepare_for_package(self.project)
-        await self.runtime.prepare_for_shape(self.config)
-
-    def info(self, part):
-        info: dict[str, object] = part.shape_info()
-        info.update(
-            {
-                "runtime_version": self.runtime.version,
-                "runtime_path": self.runtime.path,
-            }
+        with open(part.path, "rb") as f:
+            source = f.read()
+
+        config = {
+            key: part.config[key]
+            for key in ["parameters", "patch", "show", "showObject", "cwd"]
+            if key in part.config
+        }
+        return Cache.hash(
+            part.config.get("type", None),
+            source,
+            config,
+            *self.get_python_inputs(part),
+            sys.modules["partcad"].__version__,
         )
-        return info
+
+    def get_fingerprint_inputs(self, part):
+        return [self.get_cache_key(part)]
 
     async def instantiate(self, part):
         await super().instantiate(part)
@@ -0,0 +1,175 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-17
+#
+# Licensed under Apache License, Version 2.0.
+
+import math
+import os
+import sys
+
+from . import logging as pc_logging
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
+import svg_edges
+
+# The same as in the SVG files
+LINE_COLOR = (64, 192, 64)
+# The margin around the drawing in pixels
+MARGIN = 2
+# The width of the lines in the SVG files relative to the size of the image
+LINE_WIDTH_RATIO = 1.0 / 512.0
+
+
+def rasterize(segments, width, height, line_width=None, color=LINE_COLOR):
+    """
+    Draws the anti-aliased (Xiaolin Wu's algorithm) line segments (x0, y0,
+    x1, y1) fitting them into width x height pixels. Returns the RGBA image
+    as a (height, width, 4) uint8 array, the background is transparent.
+    """
+    import numpy as np
+
+    segments = np.asarray(segments, dtype=np.float64).reshape(-1, 4)
+
+    # Fit the drawing into the image keeping the aspect ratio
+    if len(segments) > 0:
+        xs = segments[:, 0::2]
+        ys = segments[:, 1::2]
+        x_min, x_max = xs.min(), xs.max()
+        y_min, y_max = ys.min(), ys.max()
+    else:
+        x_min = x_max = y_min = y_max = 0.0
+    size_x = max(x_max - x_min, 1e-9)
+    size_y = max(y_max - y_min, 1e-9)
+    scale = min(
+        (width - 2 * MARGIN - 1) / size_x,
+        (height - 2 * MARGIN - 1) / size_y,
+    )
+    image_width = min(width, int(math.ceil(size_x * scale)) + 2 * MARGIN + 1)
+    image_height = min(height, int(math.ceil(size_y * scale)) + 2 * MARGIN + 1)
+
+    image = np.zeros((image_height, image_width, 4), dtype=np.uint8)
+    image[:, :, :3] = color
+    if len(segments) == 0:
+        return image
+
+    if line_width is None:
+        line_width = max(
+            1, int(round(min(image_width, image_height) * LINE_WIDTH_RATIO))
+        )
+
+    # Pixel coordinates, Y pointing down
+    x0 = (segments[:, 0] - x_min) * scale + MARGIN
+    y0 = (y_max - segments[:, 1]) * scale + MARGIN
+    x1 = (segments[:, 2] - x_min) * scale + MARGIN
+    y1 = (y_max - segments[:, 3]) * scale + MARGIN
+
+    # Step along the major axis of each segment
+    steep = np.abs(y1 - y0) > np.abs(x1 - x0)
+    x0, y0 = np.where(steep, y0, x0), np.where(steep, x0, y0)
+    x1, y1 = np.where(steep, y1, x1), np.where(steep, x1, y1)
+    backwards = x0 > x1
+    x0, x1 = np.where(backwards, x1, x0), np.where(backwards, x0, x1)
+    y0, y1 = np.where(backwards, y1, y0), np.where(backwards, y0, y1)
+
+    dx = x1 - x0
+    gradient = np.divide(
+        y1 - y0, dx, out=np.zeros_like(dx), where=dx > 1e-12
+    )
+
+    start = np.floor(x0 + 0.5).astype(np.int64)
+    end = np.floor(x1 + 0.5).astype(np.int64)
+    counts = end - start + 1
+    segment = np.repeat(np.arange(len(counts)), counts)
+    offset = np.arange(counts.sum()) - np.repeat(
+        np.cumsum(counts) - counts, counts
+    )
+
+    x = start[segment] + offset
+    y = y0[segment] + gradient[segment] * (x - x0[segment])
+    y_floor = np.floor(y)
+    fraction = y - y_floor
+    y_floor = y_floor.astype(np.int64)
+
+    # The end points only partially cover the first and the last pixels
+    weight = np.ones(len(x))
+    first = offset == 0
+    last = offset == counts[segment] - 1
+    weight[first] *= 1.0 - np.modf(x0[segment][first] + 0.5)[0]
+    weight[last] *= np.modf(x1[segment][last] + 0.5)[0]
+    weight = np.clip(weight, 0.0, 1.0)
+    # Zero length segments are single points
+    weight[first & last] = 1.0
+
+    # The line is 'line_width' pixels across the minor axis, with the
+    # anti-aliased pixels on both sides
+    lower = y_floor - (line_width - 1) // 2
+    columns = [(lower, (1.0 - fraction) * weight)]
+    for i in range(1, line_width):
+        columns.append((lower + i, weight))
+    columns.append((lower + line_width, fraction * weight))
+
+    all_x = np.concatenate([x] * len(columns))
+    all_y = np.concatenate([c[0] for c in columns])
+    coverage = np.concatenate([c[1] for c in columns])
+    all_steep = np.concatenate([steep[segment]] * len(columns))
+
+    px = np.where(all_steep, all_y, all_x)
+    py = np.where(all_steep, all_x, all_y)
+    inside = (
+        (px >= 0)
+        & (px < image_width)
+        & (py >= 0)
+        & (py < image_height)
+        & (coverage > 0)
+    )
+
+    alpha = np.zeros(image_width * image_height)
+    np.maximum.at(
+        alpha, py[inside] * image_width + px[inside], coverage[inside]
+    )
+    image[:, :, 3] = np.round(alpha * 255.0).reshape(
+        image_height, image_width
+    )
+    return image
+
+
+class PluginExportPngNumpy:
+    """
+    Rasterizes the visible edges written next to the SVG files by the SVG
+    wrapper, without parsing the SVG files. Falls back to the given plugin
+    if the edges are not available.
+    """
+
+    def __init__(self, fallback=None):
+        self.fallback = fallback
+
+    def is_supported(self):
+        try:
+            import numpy
+            import PIL.Image
+        except ImportError:
+            return False
+        return True
+
+    def export(self, project, svg_path, width, height, filepath):
+        import numpy as np
+        from PIL import Image
+
+        edges_path = svg_edges.get_path(svg_path)
+        if not os.path.exists(edges_path):
+            if self.fallback is not None and self.fallback.is_supported():
+                pc_logging.debug("No edges found, falling back: %s" % svg_path)
+                self.fallback.export(project, svg_path, width, height, filepath)
+                return
+            pc_logging.error("No edges found for %s. Aborting." % svg_path)
+            return
+
+        segments = np.frombuffer(svg_edges.read(edges_path), dtype="<f4")
+        image = rasterize(segments, int(width), int(height))
+
+        if not project is None:
+            project.ctx.ensure_dirs_for_file(filepath)
+        Image.fromarray(image, "RGBA").save(filepath, format="PNG")
@@ -17,6 +17,7 @@ import typing
 
 from . import consts
 from . import factory
+from .build_graph import get_fingerprint, get_manifest
 from . import logging as pc_logging
 from . import project_config
 from . import interface
@@ -48,6 +49,7 @@ from . import assembly_config
 from . import provider
 from . import provider_config
 from .render import render_cfg_merge
+from .render_planner import RenderPlanner
 from .utils import resolve_resource_path, normalize_resource_path
 
 
@@ -1427,15 +1429,58 @@ class Project(project_config.Configuration):
                     yaml.dump(config, fp)
                     fp.close()
 
-    def test(self):
-        for interface in self.interfaces.values():
-            interface.test()
-        for sketch in self.sketches.values():
-            sketch.test()
-        for part in self.parts.values():
-            part.test()
-        for assembly in self.assemblies.values():
-            assembly.test()
+    def test(self, shapes=None):
+        """
+        Tests the given or all sketches, parts and assemblies. Shapes which
+        passed the tests with the same inputs before are skipped.
+        """
+        if shapes is None:
+            for interface in self.interfaces.values():
+                interface.test()
+            shapes = [
+                *self.sketches.values(),
+                *self.parts.values(),
+                *self.assemblies.values(),
+            ]
+        asyncio.run(self.test_async(shapes))
+
+    async def test_async(self, shapes):
+        manifest = get_manifest(self, "test")
+        try:
+            for shape in shapes:
+                await self._test_shape(manifest, shape)
+        finally:
+            manifest.save()
+
+    async def _test_shape(self, manifest, shape):
+        target = "%s:%s/%s" % (shape.project_name, shape.kind, shape.name)
+        try:
+            fingerprint = await get_fingerprint(self.ctx, shape)
+        except Exception as e:
+            pc_logging.debug("Failed to fingerprint %s: %s" % (target, e))
+            fingerprint = None
+
+        if (
+            fingerprint is not None
+            and not self.ctx.option_force
+            and manifest.is_up_to_date(target, fingerprint)
+        ):
+            pc_logging.debug("Up to date: %s" % target)
+            return
+
+        # Detect the errors reported while testing this shape only
+        had_errors = pc_logging.had_errors
+        pc_logging.had_errors = False
+        try:
+            wrapped = await shape.get_wrapped()
+            passed = wrapped is not None and not pc_logging.had_errors
+        finally:
+            pc_logging.had_errors = pc_logging.had_errors or had_errors
+
+        if passed and fingerprint is not None:
+            manifest.record(target, fingerprint)
+        else:
+            manifest.forget(target)
 
     async def render_async(
         self,
@@ -1509,7 +1554,7 @@ class Project(project_config.Configuration):
                 shapes.append(shape)
 
             # Render
-            tasks = []
+            planner = RenderPlanner(self.ctx, self)
             for shape in shapes:
                 shape_render = copy.copy(render)
                 if (
@@ -1645,23 +1690,23 @@ class Project(project_config.Configuration):
                     render_gltf = False
 
                 if render_svg:
-                    tasks.append(shape.render_svg_async(self.ctx, self))
+                    planner.add(shape, "svg")
                 if render_png:
-                    tasks.append(shape.render_png_async(self.ctx, self))
+                    planner.add(shape, "png")
                 if render_step:
-                    tasks.append(shape.render_step_async(self.ctx, self))
+                    planner.add(shape, "step")
                 if render_stl:
-                    tasks.append(shape.render_stl_async(self.ctx, self))
+                    planner.add(shape, "stl")
                 if render_3mf:
-                    tasks.append(shape.render_3mf_async(self.ctx, self))
+                    planner.add(shape, "3mf")
                 if render_threejs:
-                    tasks.append(shape.render_threejs_async(self.ctx, self))
+                    planner.add(shape, "threejs")
                 if render_obj:
-                    tasks.append(shape.render_obj_async(self.ctx, self))
+                    planner.add(shape, "obj")
                 if render_gltf:
-                    tasks.append(shape.render_gltf_async(self.ctx, self))
+                    planner.add(shape, "gltf")
 
-            await asyncio.gather(*tasks)
+            await planner.run()
 
             if format == "readme" or (format is None and "readme" in render):
                 self.render_readme_async(render, output_dir)
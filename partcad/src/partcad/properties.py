@@ -0,0 +1,122 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-17
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import json
+
+from OCP.Bnd import Bnd_Box
+from OCP.BRepBndLib import BRepBndLib
+from OCP.BRepGProp import BRepGProp
+from OCP.GProp import GProp_GProps
+from OCP.TopAbs import TopAbs_FACE, TopAbs_SOLID
+from OCP.TopExp import TopExp_Explorer
+
+# Bump this to invalidate the previously cached properties
+PROPERTIES_VERSION = 1
+
+# Volumes and areas below this are considered to be zero
+EPSILON = 1e-9
+
+
+def _count(shape, kind) -> int:
+    count = 0
+    explorer = TopExp_Explorer(shape, kind)
+    while explorer.More():
+        count += 1
+        explorer.Next()
+    return count
+
+
+def _vector(point) -> list[float]:
+    return [point.X(), point.Y(), point.Z()]
+
+
+def compute(shape) -> dict:
+    """
+    Computes the geometric properties of the OCCT shape: the bounding box,
+    the volume, the surface area, the center of mass and the matrix of
+    inertia (relative to the center of mass, assuming the unit density).
+    The values are in the units of the model (millimeters).
+    """
+    properties = {
+        "bbox": None,
+        "size": None,
+        "volume": 0.0,
+        "area": 0.0,
+        "center_of_mass": None,
+        "inertia": None,
+        "solids": 0,
+        "faces": 0,
+    }
+    if shape is None or shape.IsNull():
+        return properties
+
+    # Unlike the one stored in the encoded shapes, this bounding box is
+    # computed precisely (not using the triangulation and the tolerances)
+    box = Bnd_Box()
+    BRepBndLib.AddOptimal_s(shape, box, False, False)
+    if not box.IsVoid():
+        lo = _vector(box.CornerMin())
+        hi = _vector(box.CornerMax())
+        properties["bbox"] = [lo, hi]
+        properties["size"] = [hi[i] - lo[i] for i in range(3)]
+
+    volume_props = GProp_GProps()
+    BRepGProp.VolumeProperties_s(shape, volume_props)
+    surface_props = GProp_GProps()
+    BRepGProp.SurfaceProperties_s(shape, surface_props)
+    properties["volume"] = abs(volume_props.Mass())
+    properties["area"] = surface_props.Mass()
+
+    # Solids are characterized by their volume, sketches by their surface
+    if properties["volume"] > EPSILON:
+        mass_props = volume_props
+    elif properties["area"] > EPSILON:
+        mass_props = surface_props
+    else:
+        mass_props = GProp_GProps()
+        BRepGProp.LinearProperties_s(shape, mass_props)
+
+    if abs(mass_props.Mass()) > EPSILON:
+        properties["center_of_mass"] = _vector(mass_props.CentreOfMass())
+        matrix = mass_props.MatrixOfInertia()
+        properties["inertia"] = [
+            [matrix.Value(row, column) for column in range(1, 4)]
+            for row in range(1, 4)
+        ]
+
+    properties["solids"] = _count(shape, TopAbs_SOLID)
+    properties["faces"] = _count(shape, TopAbs_FACE)
+    return properties
+
+
+def describe(properties: dict) -> str:
+    """Returns a human readable summary of the properties."""
+    items = []
+    if properties["size"] is not None:
+        items.append("size: %.2f x %.2f x %.2f mm" % tuple(properties["size"]))
+    if properties["volume"] > EPSILON:
+        items.append("volume: %.3f cm3" % (properties["volume"] / 1000.0))
+    if properties["area"] > EPSILON:
+        items.append("area: %.3f cm2" % (properties["area"] / 100.0))
+    if properties["center_of_mass"] is not None:
+        items.append(
+            "center of mass: (%.2f, %.2f, %.2f)"
+            % tuple(properties["center_of_mass"])
+        )
+    if len(items) == 0:
+        return "empty"
+    return ", ".join(items)
+
+
+def to_bytes(properties: dict) -> bytes:
+    return json.dumps(properties).encode()
+
+
+def from_bytes(data: bytes) -> dict:
+    return json.loads(data.decode())
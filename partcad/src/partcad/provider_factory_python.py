@@ -7,15 +7,14 @@
 # Licensed under Apache License, Version 2.0.
 #
 
-import base64
 import os
-import pickle
 import sys
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
 from cq_serialize import register as register_cq_helper
 
 from .provider_factory_file import ProviderFactoryFile
+from .runtime_limits import RuntimeLimits
 from .runtime_python import PythonRuntime
 
 from . import wrapper
@@ -128,40 +127,37 @@ class ProviderFactoryPython(ProviderFactoryFile):
             #     patch.update(self.config["patch"])
             # request["patch"] = patch
 
-            # Serialize the request
+            # Make sure the request can be serialized
             register_cq_helper()
-            picklestring = pickle.dumps(request)
-            request_serialized = base64.b64encode(picklestring).decode()
-
-            await self.runtime.ensure("ocp-tessellate")
-            await self.runtime.ensure("numpy==1.24.1")
-            await self.runtime.ensure("numpy-quaternion==2023.0.4")
-            await self.runtime.ensure("nptyping==1.24.1")
-            await self.runtime.ensure("cadquery")
+
+            await self.runtime.ensure_many(
+                [
+                    "ocp-tessellate",
+                    "numpy==1.24.1",
+                    "numpy-quaternion==2023.0.4",
+                    "nptyping==1.24.1",
+                    "cadquery",
+                ]
+            )
             cwd = self.project.config_dir
             if self.cwd is not None:
                 cwd = os.path.join(self.project.config_dir, self.cwd)
-            response_serialized, errors = await self.runtime.run(
+            result, errors = await self.runtime.run_wrapper(
                 [
                     wrapper_path,
                     os.path.abspath(self.path),
                     os.path.abspath(cwd),
                 ],
-                request_serialized,
+                request,
+                limits=RuntimeLimits.from_config(self.config),
             )
             if len(errors) > 0:
                 error_lines = errors.split("\n")
                 for error_line in error_lines:
                     provider.error("%s: %s" % (provider.name, error_line))
 
-            try:
-                response = base64.b64decode(response_serialized)
-                register_cq_helper()
-                result = pickle.loads(response)
-            except Exception as e:
-                provider.error(
-                    "Exception while deserializing %s: %s" % (provider.name, e)
-                )
+            if result is None:
+                provider.error("Failed to get the result of %s" % provider.name)
                 return None
 
             if "exception" in result:
@@ -38,3 +38,46 @@ DEFAULT_RENDER_SVG_OPTS = {
     # "marginLeft": 0,
     # "marginTop": 0,
 }
+
+DEFAULT_SVG_VIEWPORT_ORIGIN = [100, -100, 100]
+
+# The modes of the PNG renders: the wireframe converted from the SVG
+# projection, or the shaded triangulation (see render_shaded.py)
+PNG_MODE_WIREFRAME = "wireframe"
+PNG_MODE_SHADED = "shaded"
+PNG_MODES = [PNG_MODE_WIREFRAME, PNG_MODE_SHADED]
+
+# Named viewpoints of the SVG renders: (viewport origin, viewport up)
+SVG_VIEWS = {
+    "iso": ([100, -100, 100], [0, 0, 1]),
+    "front": ([0, -100, 0], [0, 0, 1]),
+    "back": ([0, 100, 0], [0, 0, 1]),
+    "left": ([-100, 0, 0], [0, 0, 1]),
+    "right": ([100, 0, 0], [0, 0, 1]),
+    "top": ([0, 0, 100], [0, 1, 0]),
+    "bottom": ([0, 0, -100], [0, -1, 0]),
+}
+
+
+def get_svg_view(view):
+    """
+    Returns the name, the viewport origin and the viewport up vector of the
+    view given either by name (see SVG_VIEWS) or by the viewport origin.
+    """
+    if isinstance(view, str):
+        if view not in SVG_VIEWS:
+            raise ValueError(
+                "Unknown view: %s (expected: %s)"
+                % (view, ", ".join(SVG_VIEWS.keys()))
+            )
+        origin, up = SVG_VIEWS[view]
+        return view, origin, up
+
+    origin = list(map(float, view))
+    # Looking along the Z axis, the default up vector does not work
+    if origin[0] == 0 and origin[1] == 0:
+        up = [0, 1, 0]
+    else:
+        up = [0, 0, 1]
+    name = "_".join(map(lambda v: "%g" % v, origin))
+    return name, origin, up
@@ -0,0 +1,294 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-08
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import asyncio
+import time
+
+from .build_graph import get_fingerprint, get_manifest, BuildManifest
+from .cache import Cache
+from .render import PNG_MODE_SHADED
+from . import logging as pc_logging
+from . import sync_threads as pc_thread
+from . import tracing as pc_tracing
+
+# The extensions used for the mesh formats
+MESH_FORMATS = {
+    "stl": ".stl",
+    "3mf": ".3mf",
+    "threejs": ".json",
+    "obj": ".obj",
+    "gltf": ".json",
+}
+
+# The extensions of the formats rendered into files tracked between runs
+OUTPUT_FORMATS = {
+    "svg": ".svg",
+    "png": ".png",
+    "step": ".step",
+    **MESH_FORMATS,
+}
+
+# Jobs that are mostly waiting for other processes to complete
+KIND_SUBPROCESS = "subprocess"
+# Jobs that are mostly busy in this process
+KIND_THREAD = "thread"
+
+
+class RenderJob:
+    def __init__(self, name, kind, action, deps=[]):
+        self.name = name
+        self.kind = kind
+        self.action = action
+        self.deps = list(deps)
+
+        self.task = None
+        self.duration = None
+        self.error = None
+
+
+class RenderTarget:
+    """An output file of the rendering which can be skipped if up to date."""
+
+    def __init__(self, job, shape, kind, path, opts):
+        self.job = job
+        self.shape = shape
+        self.kind = kind
+        self.path = path
+        self.opts = opts
+
+        self.fingerprint = None
+        self.stat = None
+
+
+class RenderPlanner:
+    """
+    Builds the graph of rendering jobs for a package and executes it.
+    The prerequisites shared by several output formats (instantiating the
+    shape, projecting it to SVG, tessellating it) become separate jobs that
+    are executed only once. Jobs are started as soon as their prerequisites
+    are completed, within the limits of the respective pools.
+    Outputs are skipped if they were rendered from the same inputs before
+    (see build_graph.py), unless forced.
+    """
+
+    def __init__(self, ctx, project, jobs=None, manifest=None):
+        self.ctx = ctx
+        self.project = project
+        if manifest is None:
+            manifest = get_manifest(project, "render")
+        self.manifest: BuildManifest = manifest
+        if jobs is None:
+            jobs = ctx.option_render_jobs
+        if jobs is None or jobs < 1:
+            jobs = pc_thread.cpu_count
+
+        self.jobs: dict[str, RenderJob] = {}
+        # The jobs producing the requested outputs
+        self.outputs: list[RenderJob] = []
+        self.targets: list[RenderTarget] = []
+        self.skipped = 0
+        self.limits = {
+            KIND_SUBPROCESS: jobs,
+            KIND_THREAD: pc_thread.cpu_count,
+        }
+        self.wall_time = None
+
+    def _get_job(self, name, kind, action, deps=[]):
+        if name not in self.jobs:
+            self.jobs[name] = RenderJob(name, kind, action, deps)
+        return self.jobs[name]
+
+    @staticmethod
+    def _get_name(shape):
+        # Sketches, parts and assemblies may have the same names
+        return "%s/%s" % (shape.kind, shape.name)
+
+    def _get_shape_job(self, shape):
+        return self._get_job(
+            "%s:instantiate" % RenderPlanner._get_name(shape),
+            KIND_SUBPROCESS,
+            shape.get_wrapped,
+        )
+
+    def _get_svg_job(self, shape):
+        return self._get_job(
+            "%s:svg-source" % RenderPlanner._get_name(shape),
+            KIND_SUBPROCESS,
+            lambda: shape._get_svg_path(ctx=self.ctx, project=self.project),
+            [self._get_shape_job(shape)],
+        )
+
+    def _get_mesh_job(self, shape, kind):
+        opts, _ = shape.render_getopts(
+            kind, OUTPUT_FORMATS[kind], self.project
+        )
+        tolerance, angularTolerance = shape.render_getopts_tolerance(opts)
+        return self._get_job(
+            "%s:mesh(%s,%s)"
+            % (RenderPlanner._get_name(shape), tolerance, angularTolerance),
+            KIND_THREAD,
+            lambda: shape.get_mesh(tolerance, angularTolerance),
+            [self._get_shape_job(shape)],
+        )
+
+    def _is_png_shaded(self, shape):
+        opts, _ = shape.render_getopts("png", ".png", self.project)
+        return shape.render_getopts_png_mode(opts) == PNG_MODE_SHADED
+
+    def add(self, shape, kind):
+        """Plans rendering of the shape in the given format."""
+        if kind == "png" and self._is_png_shaded(shape):
+            # Shaded PNG images are rendered from the triangulation
+            deps = [self._get_mesh_job(shape, kind)]
+        elif kind in ["svg", "png"]:
+            deps = [self._get_svg_job(shape)]
+        elif kind == "gltf" and shape.kind == "assemblies":
+            # Assemblies are exported with the meshes of their parts
+            deps = [self._get_shape_job(shape)]
+        elif kind in MESH_FORMATS:
+            deps = [self._get_mesh_job(shape, kind)]
+        else:
+            deps = [self._get_shape_job(shape)]
+
+        method = getattr(shape, "render_%s_async" % kind)
+        job = self._get_job(
+            "%s:%s" % (RenderPlanner._get_name(shape), kind),
+            KIND_THREAD,
+            lambda: method(self.ctx, self.project),
+            deps,
+        )
+        if job in self.outputs:
+            return
+        self.outputs.append(job)
+
+        if kind in OUTPUT_FORMATS:
+            opts, path = shape.render_getopts(
+                kind, OUTPUT_FORMATS[kind], self.project
+            )
+            self.targets.append(RenderTarget(job, shape, kind, path, opts))
+
+    async def _check_target(self, target):
+        try:
+            fingerprint = await get_fingerprint(self.ctx, target.shape)
+        except Exception as e:
+            pc_logging.debug(
+                "Failed to fingerprint %s: %s" % (target.job.name, e)
+            )
+            return False
+        target.fingerprint = Cache.hash(
+            fingerprint, target.kind, target.opts, target.path
+        )
+        target.stat = BuildManifest._stat(target.path)
+        if self.ctx.option_force:
+            return False
+        return self.manifest.is_up_to_date(
+            target.path, target.fingerprint, target.path
+        )
+
+    async def _skip_up_to_date(self):
+        """Removes the outputs which are up to date and their prerequisites."""
+        results = await asyncio.gather(
+            *map(self._check_target, self.targets)
+        )
+        skipped = set()
+        for target, up_to_date in zip(self.targets, results):
+            if up_to_date:
+                pc_logging.debug("Up to date: %s" % target.path)
+                skipped.add(target.job.name)
+        if not skipped:
+            return
+        self.skipped = len(skipped)
+
+        # Keep the jobs which are needed by the remaining outputs only
+        needed = set()
+        pending = [j for j in self.outputs if j.name not in skipped]
+        while pending:
+            job = pending.pop()
+            if job.name in needed:
+                continue
+            needed.add(job.name)
+            pending.extend(job.deps)
+        # Keep the order: prerequisites are always before their dependents
+        needed_jobs = [j for j in self.jobs.values() if j.name in needed]
+        self.jobs = {j.name: j for j in needed_jobs}
+
+    def _record_targets(self):
+        for target in self.targets:
+            if target.job.name not in self.jobs or target.fingerprint is None:
+                continue
+            # Failures are not always raised, so only the outputs that were
+            # actually rewritten are recorded
+            stat = BuildManifest._stat(target.path)
+            if target.job.error is None and stat and stat != target.stat:
+                self.manifest.record(
+                    target.path, target.fingerprint, target.path
+                )
+            else:
+                self.manifest.forget(target.path)
+        self.manifest.save()
+
+    async def _run_job(self, job, semaphores):
+        for dep in job.deps:
+            await asyncio.wait([dep.task])
+            if dep.error is not None:
+                # The failure is already reported by the prerequisite
+                job.error = dep.error
+                job.duration = 0.0
+                return
+
+        async with semaphores[job.kind]:
+            start = time.perf_counter()
+            try:
+                with pc_tracing.span("RenderJob", self.project.name, job.name):
+                    await job.action()
+            except Exception as e:
+                job.error = e
+                pc_logging.error("Failed to render %s: %s" % (job.name, e))
+            finally:
+                job.duration = time.perf_counter() - start
+
+    async def run(self):
+        semaphores = {
+            kind: asyncio.Semaphore(limit)
+            for kind, limit in self.limits.items()
+        }
+
+        start = time.perf_counter()
+        await self._skip_up_to_date()
+
+        # Prerequisites are always added before the jobs depending on them
+        for job in self.jobs.values():
+            job.task = asyncio.create_task(self._run_job(job, semaphores))
+        if self.jobs:
+            await asyncio.wait(
+                list(map(lambda j: j.task, self.jobs.values()))
+            )
+        self.wall_time = time.perf_counter() - start
+        self._record_targets()
+
+        busy_time = sum(map(lambda j: j.duration or 0.0, self.jobs.values()))
+        for name, duration in self.get_timings():
+            message = "Render job %s: %.3fs" % (name, duration)
+            if self.ctx.option_render_timings:
+                pc_logging.info(message)
+            else:
+                pc_logging.debug(message)
+        pc_logging.info(
+            "Rendered %d jobs in %.2fs (%.2fs of work)"
+            % (len(self.jobs), self.wall_time, busy_time)
+        )
+        if self.skipped:
+            pc_logging.info("Skipped %d up-to-date outputs" % self.skipped)
+
+    def get_timings(self):
+        """Returns (name, seconds) for all jobs, the longest first."""
+        return sorted(
+            map(lambda j: (j.name, j.duration), self.jobs.values()),
+            key=lambda t: -(t[1] or 0.0),
+        )
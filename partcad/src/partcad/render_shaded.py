@@ -0,0 +1,229 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-17
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+# The software renderer of the shaded images (e.g. thumbnails). It draws the
+# triangulation of the shape (see mesh.py) using a z-buffer, so it needs
+# neither the hidden line removal nor a GPU or a display server. All
+# per-pixel work is vectorized with NumPy.
+
+import numpy as np
+
+from .mesh import Mesh
+from .render import DEFAULT_SVG_VIEWPORT_ORIGIN
+
+SHADING_FLAT = "flat"
+SHADING_SMOOTH = "smooth"  # Gouraud shading
+SHADINGS = [SHADING_FLAT, SHADING_SMOOTH]
+
+# The base color of the surfaces, the same hue as the lines of the SVG files
+COLOR = (96, 192, 96)
+# The share of the light that does not depend on the orientation
+AMBIENT = 0.35
+# The margin around the drawing in pixels
+MARGIN = 2
+# Each pixel is averaged over SUPERSAMPLE x SUPERSAMPLE samples
+SUPERSAMPLE = 2
+# The maximum number of candidate pixels processed at once
+CHUNK_SIZE = 1 << 22
+
+
+def _get_camera(origin, up, center):
+    """Returns the right, up and forward vectors of the camera."""
+    forward = center - np.asarray(origin, dtype=np.float64)
+    forward /= max(np.linalg.norm(forward), 1e-12)
+    right = np.cross(forward, np.asarray(up, dtype=np.float64))
+    if np.linalg.norm(right) < 1e-9:
+        # Looking along the up vector
+        right = np.cross(forward, [0.0, 1.0, 0.0])
+        if np.linalg.norm(right) < 1e-9:
+            right = np.cross(forward, [1.0, 0.0, 0.0])
+    right /= np.linalg.norm(right)
+    return right, np.cross(right, forward), forward
+
+
+def _get_chunks(areas):
+    """Splits the spans into ranges of at most CHUNK_SIZE pixels."""
+    ends = np.cumsum(areas)
+    start = 0
+    while start < len(areas):
+        base = ends[start - 1] if start > 0 else 0
+        end = int(np.searchsorted(ends, base + CHUNK_SIZE, side="right"))
+        # A span larger than the chunk is processed on its own
+        end = max(end, start + 1)
+        yield start, end
+        start = end
+
+
+def render(
+    mesh: Mesh,
+    width: int,
+    height: int,
+    origin=DEFAULT_SVG_VIEWPORT_ORIGIN,
+    up=(0, 0, 1),
+    shading=SHADING_FLAT,
+    color=COLOR,
+    supersample=SUPERSAMPLE,
+) -> np.ndarray:
+    """
+    Renders the orthographic view of the mesh from the viewport origin
+    towards the center of the mesh, fitting it into width x height pixels.
+    Returns the RGBA image as a (height, width, 4) uint8 array, the
+    background is transparent.
+    """
+    if shading not in SHADINGS:
+        raise ValueError(
+            "Unknown shading: %s (expected: %s)"
+            % (shading, ", ".join(SHADINGS))
+        )
+
+    image = np.zeros((height, width, 4), dtype=np.uint8)
+    if mesh.is_empty():
+        return image
+
+    vertices = mesh.vertices.astype(np.float64)
+    bbox_min, bbox_max = mesh.get_bbox()
+    center = (bbox_min.astype(np.float64) + bbox_max) / 2.0
+    right, view_up, forward = _get_camera(origin, up, center)
+
+    # Headlight, slightly from the top left
+    light = -forward + 0.5 * view_up - 0.3 * right
+    light /= np.linalg.norm(light)
+
+    def lighting(normals):
+        # Both sides of the surfaces are lit (sketches, open shells)
+        return AMBIENT + (1.0 - AMBIENT) * np.abs(normals @ light)
+
+    if shading == SHADING_FLAT:
+        intensity = lighting(mesh.get_face_normals().astype(np.float64))
+    else:
+        intensity = lighting(mesh.normals.astype(np.float64))
+
+    # Fit the drawing into the image keeping the aspect ratio
+    samples_x = width * supersample
+    samples_y = height * supersample
+    margin = MARGIN * supersample
+    xs = (vertices - center) @ right
+    ys = (vertices - center) @ view_up
+    zs = (vertices - center) @ forward
+    size_x = max(xs.max() - xs.min(), 1e-9)
+    size_y = max(ys.max() - ys.min(), 1e-9)
+    scale = min(
+        (samples_x - 2 * margin) / size_x,
+        (samples_y - 2 * margin) / size_y,
+    )
+    # Pixel coordinates, Y pointing down, the drawing is centered
+    xs = (xs - (xs.max() + xs.min()) / 2.0) * scale + samples_x / 2.0
+    ys = ((ys.max() + ys.min()) / 2.0 - ys) * scale + samples_y / 2.0
+
+    triangles = mesh.triangles.astype(np.int64)
+    tx = xs[triangles]
+    ty = ys[triangles]
+    tz = zs[triangles]
+
+    # The edge functions: w_i = a_i * x + b_i * y + c_i, normalized so that
+    # w_0 + w_1 + w_2 == 1 inside the triangle regardless of the winding
+    det = (tx[:, 1] - tx[:, 0]) * (ty[:, 2] - ty[:, 0]) - (
+        tx[:, 2] - tx[:, 0]
+    ) * (ty[:, 1] - ty[:, 0])
+    valid = np.abs(det) > 1e-12
+
+    y_min = np.ceil(ty.min(axis=1) - 0.5).astype(np.int64).clip(0)
+    y_max = np.floor(ty.max(axis=1) - 0.5).astype(np.int64)
+    y_max = y_max.clip(max=samples_y - 1)
+    counts_y = (y_max - y_min + 1).clip(0)
+    valid &= counts_y > 0
+
+    index = np.nonzero(valid)[0]
+    det = det[index]
+    tx, ty, tz = tx[index], ty[index], tz[index]
+    y_min, counts_y = y_min[index], counts_y[index]
+    coefficients = []
+    for i in range(3):
+        j, k = (i + 1) % 3, (i + 2) % 3
+        a = (ty[:, j] - ty[:, k]) / det
+        b = (tx[:, k] - tx[:, j]) / det
+        c = (tx[:, j] * ty[:, k] - tx[:, k] * ty[:, j]) / det
+        coefficients.append((a, b, c))
+    if shading == SHADING_FLAT:
+        intensity = intensity[index]
+    else:
+        intensity = intensity[triangles[index]]
+
+    # The spans of the triangles on each row of samples: w_i >= 0 is a half
+    # of the row, so the span is the intersection of the three halves
+    row_triangle = np.repeat(np.arange(len(index)), counts_y)
+    row_y = y_min[row_triangle] + (
+        np.arange(counts_y.sum())
+        - np.repeat(np.cumsum(counts_y) - counts_y, counts_y)
+    )
+    row_sy = row_y + 0.5
+    span_min = np.full(len(row_y), -np.inf)
+    span_max = np.full(len(row_y), np.inf)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        for a, b, c in coefficients:
+            rest = b[row_triangle] * row_sy + c[row_triangle]
+            a = a[row_triangle]
+            bound = -rest / a
+            span_min = np.where(a > 0, np.maximum(span_min, bound), span_min)
+            span_max = np.where(a < 0, np.minimum(span_max, bound), span_max)
+            # Parallel to the row, entirely inside or outside
+            span_max = np.where((a == 0) & (rest < 0), -np.inf, span_max)
+    span_min = np.ceil(np.maximum(span_min, 0.0) - 0.5)
+    span_max = np.floor(np.minimum(span_max, samples_x) - 0.5)
+    span_max = np.minimum(span_max, samples_x - 1)
+    lengths = np.maximum(span_max - span_min + 1, 0).astype(np.int64)
+    span_min = np.where(lengths > 0, span_min, 0).astype(np.int64)
+
+    depth = np.full(samples_x * samples_y, np.inf)
+    shade = np.zeros(samples_x * samples_y)
+    for start, end in _get_chunks(lengths):
+        chunk_lengths = lengths[start:end]
+        if chunk_lengths.sum() == 0:
+            continue
+        row = np.repeat(np.arange(start, end), chunk_lengths)
+        px = span_min[row] + (
+            np.arange(chunk_lengths.sum())
+            - np.repeat(np.cumsum(chunk_lengths) - chunk_lengths, chunk_lengths)
+        )
+        py = row_y[row]
+        triangle = row_triangle[row]
+        sx = px + 0.5
+        sy = py + 0.5
+
+        weights = [
+            a[triangle] * sx + b[triangle] * sy + c[triangle]
+            for a, b, c in coefficients
+        ]
+        pixel = py * samples_x + px
+
+        z = sum(weights[i] * tz[triangle, i] for i in range(3))
+        if shading == SHADING_FLAT:
+            value = intensity[triangle]
+        else:
+            value = sum(weights[i] * intensity[triangle, i] for i in range(3))
+
+        # The z-buffer test, the fragments of the same depth are equivalent
+        np.minimum.at(depth, pixel, z)
+        nearest = z == depth[pixel]
+        shade[pixel[nearest]] = value[nearest]
+
+    # Average the samples of each pixel, the background is not counted
+    shape = (height, supersample, width, supersample)
+    covered = np.isfinite(depth).reshape(shape)
+    count = covered.sum(axis=(1, 3))
+    shade = np.where(covered, shade.reshape(shape), 0.0).sum(axis=(1, 3))
+    shade /= np.maximum(count, 1)
+    coverage = count / float(supersample * supersample)
+
+    for channel in range(3):
+        image[:, :, channel] = np.round(
+            np.clip(shade * color[channel], 0, 255)
+        )
+    image[:, :, 3] = np.round(coverage * 255.0)
+    return image
@@ -0,0 +1,236 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-14
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+# Trusted packages can have their CadQuery and build123d scripts executed by
+# the interpreter PartCAD is running in. It skips starting (or reusing) a
+# sandboxed process and serializing the shapes: the wrappers return the
+# TopoDS objects directly.
+#
+# The scripts are executed one at a time in a dedicated thread, as they
+# change the global state of the interpreter (the current directory,
+# 'sys.path' and 'sys.modules'), which is restored after each run.
+# The limits (see 'runtime_limits.py') can not be enforced in this mode.
+# Nothing is installed into the host interpreter either, so the shapes which
+# requirements are not satisfied by it are sandboxed.
+
+import asyncio
+import concurrent.futures
+import contextlib
+import importlib
+import importlib.metadata
+import io
+import os
+import sys
+import threading
+import traceback
+
+from packaging.requirements import InvalidRequirement, Requirement
+
+from . import logging as pc_logging
+from .user_config import user_config
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
+
+EXECUTION_SUBPROCESS = "subprocess"
+EXECUTION_INPROCESS = "inprocess"
+EXECUTION_MODES = [EXECUTION_SUBPROCESS, EXECUTION_INPROCESS]
+
+_lock = threading.Lock()
+_executor = None
+_wrappers = {}
+# The result of the check of each requirement, see is_satisfied()
+_satisfied = {}
+
+
+def get_host_version() -> str:
+    return "%d.%d" % (sys.version_info.major, sys.version_info.minor)
+
+
+def get_execution_mode(project, config) -> str:
+    """
+    Returns the execution mode of the shape: the 'execution' property of the
+    shape config, the package config or the user config, in this order.
+    """
+    execution = config.get("execution", None)
+    if execution is None:
+        execution = project.config_obj.get("execution", None)
+    if execution is None:
+        execution = user_config.python_execution
+    if execution not in EXECUTION_MODES:
+        pc_logging.error(
+            "Unknown execution mode: %s (expected: %s)"
+            % (execution, ", ".join(EXECUTION_MODES))
+        )
+        return EXECUTION_SUBPROCESS
+    return execution
+
+
+def get_requirements(project, config) -> list[str]:
+    """
+    Returns the Python requirements of the shape: 'pythonRequirements' of
+    the shape and the package, and 'requirements.txt' of the package.
+    """
+    requirements = list(config.get("pythonRequirements", []))
+    requirements.extend(project.config_obj.get("pythonRequirements", []))
+
+    requirements_path = os.path.join(project.path, "requirements.txt")
+    if os.path.exists(requirements_path):
+        with open(requirements_path) as f:
+            for line in f:
+                line = line.split("#", 1)[0].strip()
+                if line:
+                    requirements.append(line)
+    return requirements
+
+
+def is_satisfied(requirement: str) -> bool:
+    """Checks whether the requirement is installed in this interpreter."""
+    with _lock:
+        if requirement in _satisfied:
+            return _satisfied[requirement]
+
+    try:
+        parsed = Requirement(requirement)
+        if parsed.marker is not None and not parsed.marker.evaluate():
+            satisfied = True
+        else:
+            version = importlib.metadata.version(parsed.name)
+            satisfied = parsed.specifier.contains(version, prereleases=True)
+    except InvalidRequirement:
+        # The pip options (e.g. '-r' or '-e') can not be verified
+        satisfied = False
+    except importlib.metadata.PackageNotFoundError:
+        satisfied = False
+
+    with _lock:
+        _satisfied[requirement] = satisfied
+    return satisfied
+
+
+def is_inprocess(project, config) -> bool:
+    """
+    Checks whether the shape is to be executed in this interpreter.
+    The packages requiring a different Python version than the one PartCAD
+    is running on, or packages which are not installed in this interpreter,
+    are always sandboxed.
+    """
+    if get_execution_mode(project, config) != EXECUTION_INPROCESS:
+        return False
+    if (
+        project.python_version is not None
+        and str(project.python_version) != get_host_version()
+    ):
+        pc_logging.debug(
+            "%s requires Python %s, not executing in-process"
+            % (project.name, project.python_version)
+        )
+        return False
+
+    missing = list(
+        filter(
+            lambda r: not is_satisfied(r),
+            get_requirements(project, config),
+        )
+    )
+    if missing:
+        pc_logging.warning(
+            "%s: %s: not executing in-process, missing requirements: %s"
+            % (project.name, config.get("name", ""), ", ".join(missing))
+        )
+        return False
+    return True
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = concurrent.futures.ThreadPoolExecutor(
+                max_workers=1,
+                thread_name_prefix="partcad-inprocess",
+            )
+        return _executor
+
+
+def _get_wrapper(name):
+    with _lock:
+        if name not in _wrappers:
+            _wrappers[name] = importlib.import_module("wrapper_%s" % name)
+        return _wrappers[name]
+
+
+def _is_local_module(module, paths) -> bool:
+    """Checks whether the module was loaded from one of the given folders."""
+    filename = getattr(module, "__file__", None)
+    if filename is None:
+        return False
+    filename = os.path.abspath(filename)
+    for path in paths:
+        if filename.startswith(os.path.abspath(path) + os.sep):
+            return True
+    return False
+
+
+def _run(name, path, cwd, request, local_paths):
+    initial_cwd = os.getcwd()
+    initial_path = list(sys.path)
+    initial_modules = set(sys.modules.keys())
+    # The wrappers replace it with a stub (which is of no use here either)
+    initial_ocp_vscode = sys.modules.get("ocp_vscode", None)
+
+    # Whatever the script prints is reported the same way it is reported by
+    # the wrappers executed in a subprocess
+    errors = io.StringIO()
+    response = None
+    try:
+        with contextlib.redirect_stdout(errors), contextlib.redirect_stderr(
+            errors
+        ):
+            try:
+                process = _get_wrapper(name).process
+                os.chdir(cwd)
+                response = process(path, request)
+            except (Exception, SystemExit):
+                traceback.print_exc(file=errors)
+    finally:
+        os.chdir(initial_cwd)
+        sys.path[:] = initial_path
+        if initial_ocp_vscode is None:
+            sys.modules.pop("ocp_vscode", None)
+        else:
+            sys.modules["ocp_vscode"] = initial_ocp_vscode
+        # Forget the modules of the package so that the changes are picked
+        # up next time
+        for module_name in set(sys.modules.keys()) - initial_modules:
+            if _is_local_module(sys.modules[module_name], local_paths):
+                del sys.modules[module_name]
+
+    return response, errors.getvalue()
+
+
+async def run_wrapper(name, path, cwd, request, local_paths=[]):
+    """
+    Executes the 'process()' function of the wrapper script (e.g. "cadquery"
+    for 'wrapper_cadquery.py') in this interpreter. Returns the response
+    object (None in case of a failure) and the error output, the same way
+    'PythonRuntime.run_wrapper()' does.
+    """
+    path = os.path.abspath(path)
+    cwd = os.path.abspath(cwd)
+    local_paths = [cwd, os.path.dirname(path)] + list(local_paths)
+    pc_logging.debug("Running in-process: %s: %s" % (name, path))
+    return await asyncio.get_running_loop().run_in_executor(
+        _get_executor(),
+        _run,
+        name,
+        path,
+        cwd,
+        request,
+        local_paths,
+    )
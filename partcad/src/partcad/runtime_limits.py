@@ -0,0 +1,101 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-13
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import os
+import signal
+
+from .user_config import user_config
+
+
+class RuntimeLimits:
+    """
+    The limits of a single request to a runtime (e.g. instantiating a part).
+    'timeout' and 'cpu' are in seconds, 'memory' is in bytes (the address
+    space of the process). None means unlimited.
+    """
+
+    def __init__(self, timeout=None, memory=None, cpu=None):
+        self.timeout = timeout if timeout else None
+        self.memory = memory if memory else None
+        self.cpu = cpu if cpu else None
+
+    @staticmethod
+    def from_config(config=None):
+        """
+        Returns the limits configured for the shape (the 'limits' section of
+        its config) falling back to the user config.
+        """
+        limits = {}
+        if config is not None and config.get("limits", None) is not None:
+            limits = config["limits"]
+
+        timeout = limits.get("timeout", user_config.python_timeout)
+        memory = limits.get("memory", None)
+        if memory is not None:
+            memory = int(memory) * 1048576
+        else:
+            memory = user_config.python_memory_limit
+        cpu = limits.get("cpu", user_config.python_cpu_limit)
+        return RuntimeLimits(timeout, memory, cpu)
+
+    def to_request(self) -> dict:
+        """Returns the limits to be applied by the wrapper process itself."""
+        return {"memory": self.memory, "cpu": self.cpu}
+
+    def describe(self, returncode, timed_out=False):
+        """
+        Returns the description of the limit that made the process terminate
+        with the given code, or None if it's not caused by any limit.
+        """
+        if timed_out:
+            return "The time limit of %ss is exceeded" % self.timeout
+        if os.name != "posix" or returncode is None or returncode >= 0:
+            return None
+
+        signum = -returncode
+        if self.cpu is not None and signum == signal.SIGXCPU:
+            return "The CPU time limit of %ss is exceeded" % self.cpu
+        if self.memory is not None and signum in [
+            signal.SIGKILL,
+            signal.SIGSEGV,
+            signal.SIGBUS,
+            signal.SIGABRT,
+        ]:
+            return (
+                "The memory limit of %dMB is probably exceeded (terminated by signal %d)"
+                % (self.memory / 1048576, signum)
+            )
+        return None
+
+
+def get_subprocess_kwargs() -> dict:
+    """
+    Returns the arguments for starting a process in a separate process group
+    (so that its entire tree can be killed). The CPU and memory limits are
+    applied by the wrapper processes themselves (see 'to_request()'), as
+    'preexec_fn' is not safe in the presence of threads.
+    """
+    kwargs = {}
+    if os.name == "posix":
+        kwargs["start_new_session"] = True
+    return kwargs
+
+
+def kill_process_tree(process):
+    """Kills the process started with 'get_subprocess_kwargs()' and its children."""
+    if os.name == "posix":
+        try:
+            os.killpg(process.pid, signal.SIGKILL)
+            return
+        except (ProcessLookupError, PermissionError):
+            pass
+    try:
+        process.kill()
+    except ProcessLookupError:
+        pass
@@ -8,14 +8,39 @@
 
 import asyncio
 import hashlib
+import json
 import os
-import pathlib
 import subprocess
 import sys
 import threading
+import time
 
 from . import runtime
 from . import logging as pc_logging
+from .runtime_limits import (
+    RuntimeLimits,
+    get_subprocess_kwargs,
+    kill_process_tree,
+)
+from .runtime_python_worker import PythonWorkerPool
+from .user_config import user_config
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
+from wrapper_ipc import pack_message, unpack_message
+
+# The record of the requirements installed into the runtime
+MANIFEST_FILENAME = ".partcad.manifest.json"
+
+# The requirements of the wrapper scripts
+CADQUERY_REQUIREMENTS = [
+    "ocp-tessellate",
+    "cadquery",
+    "numpy==1.24.1",
+    "numpy-quaternion==2023.0.4",
+    "nptyping==2.0.1",
+    "typing_extensions>=4.6.0,<5",
+]
+BUILD123D_REQUIREMENTS = CADQUERY_REQUIREMENTS + ["build123d"]
 
 
 class PythonRuntime(runtime.Runtime):
@@ -30,6 +55,14 @@ class PythonRuntime(runtime.Runtime):
         self.lock = threading.RLock()
         self.tls = threading.local()
 
+        # Warm wrapper processes, created on demand
+        self.worker_pool = None
+        # Loaded on demand, see _get_manifest()
+        self.manifest = None
+        # The requirements which failed to install in this session, they
+        # are not retried until PartCAD is restarted
+        self.failed = set()
+
     def get_async_lock(self):
         if not hasattr(self.tls, "async_locks"):
             self.tls.async_locks = {}
@@ -41,7 +74,64 @@ class PythonRuntime(runtime.Runtime):
     def once(self):
         pass
 
-    async def run(self, cmd, stdin="", cwd=None):
+    def get_python_cmd(self):
+        """Returns the command prefix to execute Python in this runtime."""
+        raise NotImplementedError()
+
+    def get_python_env(self):
+        """
+        Returns the environment variables to execute Python in this runtime
+        with, or None to inherit the environment of PartCAD.
+        """
+        return None
+
+    def get_worker_pool(self):
+        with self.lock:
+            if self.worker_pool is None:
+                self.worker_pool = PythonWorkerPool(self)
+            return self.worker_pool
+
+    def reset_workers(self):
+        """Stops idle workers so that new packages are picked up."""
+        with self.lock:
+            if self.worker_pool is not None:
+                self.worker_pool.shutdown()
+
+    async def run_wrapper(self, cmd, request, cwd=None, limits=None):
+        """
+        Executes one of the wrapper scripts and returns the response object
+        (None in case of a failure) and the error output.
+        Unless disabled, the request is sent to a warm worker process instead
+        of starting a new interpreter.
+        If no limits are given, the limits from the user config are applied.
+        """
+        if limits is None:
+            limits = RuntimeLimits.from_config()
+
+        if not user_config.python_workers or cwd is not None:
+            # The wrapper applies the limits to itself, the same way workers do
+            message = {"request": request, "limits": limits.to_request()}
+            stdout, stderr = await self.run(
+                cmd, pack_message(message), cwd=cwd, limits=limits
+            )
+            try:
+                response = unpack_message(stdout)
+            except Exception as e:
+                response = None
+                stderr += "Failed to decode the response: %s\n" % e
+            return response, stderr
+
+        self.once()
+        pc_logging.debug("Running in a worker: %s", cmd)
+        return await self.get_worker_pool().run_async(cmd, request, limits)
+
+    async def run(
+        self, cmd, stdin="", cwd=None, limits=None, returncode=False
+    ):
+        """
+        Executes the command and returns its output and error output (and
+        the exit code if 'returncode' is True).
+        """
         pc_logging.debug("Running: %s", cmd)
         p = await asyncio.create_subprocess_exec(
             # cmd,
@@ -53,15 +143,37 @@ class PythonRuntime(runtime.Runtime):
             shell=False,
             # TODO(clairbee): creationflags=subprocess.CREATE_NO_WINDOW,
             cwd=cwd,
+            env=self.get_python_env(),
+            **get_subprocess_kwargs(),
         )
-        stdout, stderr = await p.communicate(
-            input=stdin.encode(),
-            # TODO(clairbee): add timeout
-        )
+        # Binary input (e.g. wrapper requests) yields binary output
+        binary = isinstance(stdin, bytes)
+        timed_out = False
+        try:
+            stdout, stderr = await asyncio.wait_for(
+                p.communicate(input=stdin if binary else stdin.encode()),
+                limits.timeout if limits is not None else None,
+            )
+        except asyncio.TimeoutError:
+            timed_out = True
+            kill_process_tree(p)
+            await p.wait()
+            stdout, stderr = b"", b""
+        except asyncio.CancelledError:
+            # Do not leave the process running if the job is cancelled
+            kill_process_tree(p)
+            raise
 
-        stdout = stdout.decode()
+        if not binary:
+            stdout = stdout.decode()
         stderr = stderr.decode()
 
+        if limits is not None:
+            reason = limits.describe(p.returncode, timed_out)
+            if reason is not None:
+                pc_logging.debug("%s: %s" % (reason, cmd))
+                stderr += "%s\n" % reason
+
         # if stdout:
         #     pc_logging.debug("Output of %s: %s" % (cmd, stdout))
         # if stderr:
@@ -75,69 +187,211 @@ class PythonRuntime(runtime.Runtime):
         # f.write(" stdout: %s\n" % stdout)
         # f.close()
 
+        if returncode:
+            return stdout, stderr, p.returncode
         return stdout, stderr
 
-    async def ensure(self, python_package):
-        self.once()
+    def _get_manifest(self):
+        """
+        Returns the record of the requirements installed into this runtime.
+        It is loaded once, so that later checks don't touch the file system.
+        """
+        with self.lock:
+            if self.manifest is None:
+                self.manifest = {"requirements": {}, "projects": {}}
+                manifest_path = os.path.join(self.path, MANIFEST_FILENAME)
+                if os.path.exists(manifest_path):
+                    try:
+                        with open(manifest_path, "r") as f:
+                            self.manifest.update(json.load(f))
+                    except Exception as e:
+                        pc_logging.warning(
+                            "Ignoring the broken runtime manifest %s: %s"
+                            % (manifest_path, e)
+                        )
+            return self.manifest
 
-        # TODO(clairbee): expire the guard file after a certain time
+    def _save_manifest(self):
+        manifest_path = os.path.join(self.path, MANIFEST_FILENAME)
+        with self.lock:
+            data = json.dumps(self.manifest, sort_keys=True, indent=1)
+        tmp_path = "%s.%d.tmp" % (manifest_path, threading.get_ident())
+        with open(tmp_path, "w") as f:
+            f.write(data)
+        os.replace(tmp_path, manifest_path)
 
+    def _is_installed(self, python_package):
+        if python_package in self._get_manifest()["requirements"]:
+            return True
+
+        # Honor the guard files created by the earlier versions of PartCAD
         python_package_hash = hashlib.sha256(
             python_package.encode()
         ).hexdigest()
         guard_path = os.path.join(
             self.path, ".partcad.installed." + python_package_hash
         )
+        if os.path.exists(guard_path):
+            mtime = os.path.getmtime(guard_path)
+            with self.lock:
+                self.manifest["requirements"][python_package] = mtime
+            return True
+        return False
+
+    def _get_prepared(self, project, requirements_path) -> float:
+        """
+        Returns when 'requirements.txt' of the package was installed into
+        this runtime (0 if never).
+        """
+        projects = self._get_manifest()["projects"]
+        if requirements_path in projects:
+            return projects[requirements_path]
+
+        # Honor the flag files created by the earlier versions of PartCAD
+        project_hash = hashlib.sha256(project.path.encode()).hexdigest()
+        flag_path = os.path.join(self.path, ".partcad.project." + project_hash)
+        if os.path.exists(flag_path):
+            mtime = os.path.getmtime(flag_path)
+            with self.lock:
+                projects[requirements_path] = mtime
+            return mtime
+        return 0
+
+    async def _pip_install(self, args, label):
+        """Runs a single 'pip install' transaction. Returns True on success."""
+        with pc_logging.Action("PipInst", self.version, label):
+            _, stderr, returncode = await self.run(
+                ["-m", "pip", "install", *args], returncode=True
+            )
+        # pip reports dependency conflicts as errors even if it succeeded,
+        # so only the exit code is reliable
+        if returncode != 0:
+            pc_logging.error(
+                "Failed to install %s: %s" % (label, stderr.strip())
+            )
+            return False
+        return True
+
+    async def _record_installed(self):
+        """Records the versions of all packages installed in this runtime."""
+        stdout, _ = await self.run(
+            [
+                "-m",
+                "pip",
+                "list",
+                "--format=json",
+                "--disable-pip-version-check",
+            ]
+        )
+        try:
+            packages = json.loads(stdout)
+        except Exception:
+            return
+        with self.lock:
+            self.manifest["installed"] = {
+                p["name"]: p["version"] for p in packages
+            }
+
+    async def ensure(self, python_package):
+        await self.ensure_many([python_package])
+
+    async def ensure_many(self, python_packages):
+        """
+        Makes sure all of the given requirements are installed. The missing
+        ones are installed in a single transaction.
+        """
+        self.once()
+
+        # TODO(clairbee): expire the manifest entries after a certain time
+
+        def is_done(python_package):
+            return (
+                python_package in self.failed
+                or self._is_installed(python_package)
+            )
+
+        # The fast path: everything is installed already (or failed to)
+        if all(map(is_done, python_packages)):
+            return
+
         with self.lock:
             async with self.get_async_lock():
-                if not os.path.exists(guard_path):
-                    with pc_logging.Action(
-                        "PipInst", self.version, python_package
-                    ):
-                        await self.run(["-m", "pip", "install", python_package])
-                    pathlib.Path(guard_path).touch()
+                missing = list(
+                    filter(
+                        lambda p: not is_done(p),
+                        dict.fromkeys(python_packages),
+                    )
+                )
+                if not missing:
+                    return
+
+                if await self._pip_install(missing, ", ".join(missing)):
+                    installed = missing
+                elif len(missing) == 1:
+                    installed = []
+                else:
+                    # Find out which of them failed, so that the rest are
+                    # installed and only the failed ones are not retried
+                    installed = []
+                    for python_package in missing:
+                        if await self._pip_install(
+                            [python_package], python_package
+                        ):
+                            installed.append(python_package)
+                self.failed.update(
+                    filter(lambda p: p not in installed, missing)
+                )
+                if not installed:
+                    return
+
+                now = time.time()
+                for python_package in installed:
+                    self.manifest["requirements"][python_package] = now
+                await self._record_installed()
+                self._save_manifest()
+                self.reset_workers()
 
     async def prepare_for_package(self, project):
         self.once()
 
-        # TODO(clairbee): expire the guard file after a certain time
+        # TODO(clairbee): expire the manifest entries after a certain time
 
         # Check if this project has python requirements
         requirements_path = os.path.join(project.path, "requirements.txt")
         if os.path.exists(requirements_path):
-            # See if it was already prepared once
-            project_hash = hashlib.sha256(project.path.encode()).hexdigest()
-            flag_filename = ".partcad.project." + project_hash
-            flag_path = os.path.join(self.path, flag_filename)
-            with self.lock:
-                async with self.get_async_lock():
-                    if not os.path.exists(flag_path) or os.path.getmtime(
-                        requirements_path
-                    ) > os.path.getmtime(flag_path):
-                        # Install requirements and remember when we did that
-                        with pc_logging.Action(
-                            "PipReqs", self.version, project.name
-                        ):
-                            await self.run(
-                                [
-                                    "-m",
-                                    "pip",
-                                    "install",
-                                    "-r",
-                                    requirements_path,
-                                ]
-                            )
-                        pathlib.Path(flag_path).touch()
+            # See if it was already prepared since the last change
+            mtime = os.path.getmtime(requirements_path)
+            failure = (requirements_path, mtime)
+
+            def is_done():
+                return (
+                    failure in self.failed
+                    or self._get_prepared(project, requirements_path) >= mtime
+                )
+
+            if not is_done():
+                with self.lock:
+                    async with self.get_async_lock():
+                        if not is_done():
+                            if await self._pip_install(
+                                ["-r", requirements_path], project.name
+                            ):
+                                projects = self.manifest["projects"]
+                                projects[requirements_path] = mtime
+                                await self._record_installed()
+                                self._save_manifest()
+                                self.reset_workers()
+                            else:
+                                # Retried once the file is changed
+                                self.failed.add(failure)
 
         # Install dependencies of the package
         if "pythonRequirements" in project.config_obj:
-            for req in project.config_obj["pythonRequirements"]:
-                await self.ensure(req)
+            await self.ensure_many(project.config_obj["pythonRequirements"])
 
     async def prepare_for_shape(self, config):
         self.once()
 
         # Install dependencies of this part
         if "pythonRequirements" in config:
-            for req in config["pythonRequirements"]:
-                await self.ensure(req)
+            await self.ensure_many(config["pythonRequirements"])
@@ -11,14 +11,74 @@ import os
 import shutil
 import subprocess
 import json
+import threading
+import time
 
 from . import runtime_python
 from . import logging as pc_logging
+from .user_config import user_config
+
+# Bump it whenever the content of the templates changes
+TEMPLATE_VERSION = 2
+# The requirements preinstalled into the templates. They satisfy the
+# requirements of the wrappers, but are pinned so that all templates of the
+# same version are the same.
+TEMPLATE_REQUIREMENTS = [
+    "ocp-tessellate==3.0.8",
+    "cadquery==2.4.0",
+    "numpy==1.24.1",
+    "numpy-quaternion==2023.0.4",
+    "nptyping==2.0.1",
+    "typing_extensions>=4.6.0,<5",
+    "build123d==0.7.0",
+]
+# Created once the template is fully provisioned
+TEMPLATE_MARKER = ".partcad.template"
+
+# Templates are shared by all contexts
+_template_lock = threading.Lock()
+
+
+def get_clone_manifest(template_manifest: dict, installed: dict) -> dict:
+    """
+    Returns the manifest of a runtime cloned from the template, given the
+    packages installed in the clone. The requirements recorded by the
+    template are trusted only if everything it installed made it into the
+    clone.
+    """
+    requirements = {}
+    if all(
+        map(
+            lambda name: name in installed,
+            template_manifest.get("installed", {}),
+        )
+    ):
+        requirements = dict(template_manifest.get("requirements", {}))
+    return {
+        "requirements": requirements,
+        "projects": {},
+        "installed": installed,
+    }
 
 
 class CondaPythonRuntime(runtime_python.PythonRuntime):
-    def __init__(self, ctx, version=None):
-        super().__init__(ctx, "conda", version)
+    def __init__(self, ctx, version=None, template=False):
+        if template:
+            super().__init__(
+                ctx, "conda-template-%d" % TEMPLATE_VERSION, version
+            )
+        else:
+            super().__init__(ctx, "conda", version)
+        # Templates are the environments new runtimes are cloned from
+        self.is_template = template
+
+        # The interpreter of the environment and the variables to execute it
+        # with, resolved in once(). The interpreter is executed directly
+        # instead of going through "conda run" unless activation scripts
+        # have to be sourced.
+        self.python_exec = None
+        self.python_env = None
+        self.resolved = False
 
         self.conda_path = shutil.which("conda")
         if self.conda_path is None:
@@ -49,76 +109,298 @@ class CondaPythonRuntime(runtime_python.PythonRuntime):
     def once(self):
         with self.lock:
             if not self.initialized:
-                with pc_logging.Action("Conda", "create", self.version):
-                    if self.conda_path is None:
-                        raise Exception(
-                            "ERROR: PartCAD is configured to use conda, but conda is missing"
-                        )
-
-                    try:
-                        os.makedirs(self.path)
-
-                        # Install new conda environment with the preferred Python version
-                        p = subprocess.Popen(
-                            [
-                                self.conda_path,
-                                "create",
-                                "-y",
-                                "-q",
-                                "--json",
-                                "-p",
-                                self.path,
-                                "python=%s" % self.version,
-                            ],
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                        )
-                        _, stderr = p.communicate()
-                        if not stderr is None and stderr != b"":
-                            pc_logging.error(
-                                "conda env install error: %s" % stderr
-                            )
-
-                        # Install pip into the newly created conda environment
-                        p = subprocess.Popen(
-                            [
-                                self.conda_path,
-                                "install",
-                                "-y",
-                                "-q",
-                                "--json",
-                                "-p",
-                                self.path,
-                                "pip",
-                            ],
-                            stdout=subprocess.PIPE,
-                            stderr=subprocess.PIPE,
-                        )
-                        _, stderr = p.communicate()
-                        if not stderr is None and stderr != b"":
-                            pc_logging.error(
-                                "conda pip install error: %s" % stderr
-                            )
-
-                        self.initialized = True
-                    except Exception as e:
-                        shutil.rmtree(self.path)
-                        raise e
-
-    async def run(self, cmd, stdin="", cwd=None):
-        self.once()
+                if self.conda_path is None:
+                    raise Exception(
+                        "ERROR: PartCAD is configured to use conda, but conda is missing"
+                    )
 
-        return await super().run(
+                template = self._get_template()
+                if template is None or not self._clone(template):
+                    self._create()
+                self.initialized = True
+
+            if self.is_template and not self.is_complete():
+                self._provision_template()
+
+            if not self.resolved:
+                self._resolve_interpreter()
+                self.resolved = True
+
+    def _create(self):
+        with pc_logging.Action("Conda", "create", self.version):
+            try:
+                os.makedirs(self.path)
+
+                # Install new conda environment with the preferred Python version
+                p = subprocess.Popen(
+                    [
+                        self.conda_path,
+                        "create",
+                        "-y",
+                        "-q",
+                        "--json",
+                        "-p",
+                        self.path,
+                        "python=%s" % self.version,
+                    ],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                )
+                _, stderr = p.communicate()
+                if not stderr is None and stderr != b"":
+                    pc_logging.error("conda env install error: %s" % stderr)
+
+                # Install pip into the newly created conda environment
+                p = subprocess.Popen(
+                    [
+                        self.conda_path,
+                        "install",
+                        "-y",
+                        "-q",
+                        "--json",
+                        "-p",
+                        self.path,
+                        "pip",
+                    ],
+                    stdout=subprocess.PIPE,
+                    stderr=subprocess.PIPE,
+                )
+                _, stderr = p.communicate()
+                if not stderr is None and stderr != b"":
+                    pc_logging.error("conda pip install error: %s" % stderr)
+            except Exception as e:
+                shutil.rmtree(self.path)
+                raise e
+
+    def _get_template(self):
+        """
+        Returns the template environment to clone this runtime from, creating
+        it if necessary. None if templates are disabled or not available.
+        """
+        if self.is_template or not user_config.python_templates:
+            return None
+
+        with _template_lock:
+            template = CondaPythonRuntime(self.ctx, self.version, template=True)
+            try:
+                template.once()
+            except Exception as e:
+                pc_logging.warning(
+                    "Failed to create the runtime template: %s" % e
+                )
+                return None
+        if not template.is_complete():
+            return None
+        return template
+
+    def is_complete(self) -> bool:
+        """Checks whether the template is fully provisioned."""
+        return os.path.exists(os.path.join(self.path, TEMPLATE_MARKER))
+
+    def _run_sync(self, args):
+        """
+        Runs the interpreter of the environment. Used before 'run()' is.
+        Returns the output, the error output and the exit code.
+        """
+        self._resolve_interpreter()
+        p = subprocess.run(
+            self.get_python_cmd() + args,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            env=self.get_python_env(),
+        )
+        return p.stdout.decode(), p.stderr.decode(), p.returncode
+
+    def _get_installed_sync(self) -> dict:
+        stdout, _, _ = self._run_sync(
             [
-                self.conda_path,
-                "run",
-                "--no-capture-output",
-                "-p",
+                "-m",
+                "pip",
+                "list",
+                "--format=json",
+                "--disable-pip-version-check",
+            ]
+        )
+        try:
+            return {p["name"]: p["version"] for p in json.loads(stdout)}
+        except Exception:
+            return {}
+
+    def _provision_template(self):
+        """Installs the requirements of the wrappers into the template."""
+        with pc_logging.Action(
+            "PipInst", self.version, ", ".join(TEMPLATE_REQUIREMENTS)
+        ):
+            _, stderr, returncode = self._run_sync(
+                ["-m", "pip", "install", *TEMPLATE_REQUIREMENTS]
+            )
+        if returncode != 0:
+            pc_logging.warning(
+                "Failed to provision the runtime template: %s" % stderr.strip()
+            )
+            return
+
+        now = time.time()
+        # The pinned requirements satisfy the ones of the wrappers, so both
+        # are recorded to avoid installing anything into the clones
+        requirements = (
+            TEMPLATE_REQUIREMENTS + runtime_python.BUILD123D_REQUIREMENTS
+        )
+        self.manifest = {
+            "requirements": {r: now for r in requirements},
+            "projects": {},
+            "installed": self._get_installed_sync(),
+            "template": TEMPLATE_VERSION,
+        }
+        self._save_manifest()
+        with open(os.path.join(self.path, TEMPLATE_MARKER), "w") as f:
+            f.write(str(TEMPLATE_VERSION))
+
+    def _clone(self, template) -> bool:
+        """
+        Creates this environment as a clone of the template. Conda hardlinks
+        the package files where possible, so it takes seconds instead of
+        minutes. Returns False if cloning failed.
+        """
+        with pc_logging.Action("Conda", "clone", self.version):
+            p = subprocess.run(
+                [
+                    self.conda_path,
+                    "create",
+                    "-y",
+                    "-q",
+                    "--json",
+                    "-p",
+                    self.path,
+                    "--clone",
+                    template.path,
+                ],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.PIPE,
+            )
+            if p.returncode != 0 or self._get_interpreter_path() is None:
+                pc_logging.warning(
+                    "Failed to clone the runtime template: %s"
+                    % p.stderr.decode().strip()
+                )
+                shutil.rmtree(self.path, ignore_errors=True)
+                return False
+
+            self.manifest = get_clone_manifest(
+                template._get_manifest(), self._get_installed_sync()
+            )
+            self._save_manifest()
+            return True
+
+    def _get_interpreter_path(self):
+        if os.name == "nt":
+            candidates = [
+                os.path.join(self.path, "pythonw.exe"),
+                os.path.join(self.path, "python.exe"),
+            ]
+        else:
+            candidates = [
+                os.path.join(self.path, "bin", "python"),
+                os.path.join(self.path, "bin", "python3"),
+            ]
+        for candidate in candidates:
+            if os.path.isfile(candidate):
+                return candidate
+        return None
+
+    def _has_activation_scripts(self):
+        activate_d = os.path.join(self.path, "etc", "conda", "activate.d")
+        return os.path.isdir(activate_d) and len(os.listdir(activate_d)) > 0
+
+    def _get_env_vars(self):
+        """Returns the variables set with "conda env config vars set"."""
+        state_path = os.path.join(self.path, "conda-meta", "state")
+        if not os.path.exists(state_path):
+            return {}
+        try:
+            with open(state_path, "r") as f:
+                return json.load(f).get("env_vars", {})
+        except Exception as e:
+            pc_logging.debug("Failed to read %s: %s" % (state_path, e))
+            return {}
+
+    def _get_bin_paths(self):
+        if os.name == "nt":
+            return [
                 self.path,
-                "python" if os.name != "nt" else "pythonw",
-                # "python%s" % self.version,  # This doesn't work on Windows
+                os.path.join(self.path, "Library", "mingw-w64", "bin"),
+                os.path.join(self.path, "Library", "usr", "bin"),
+                os.path.join(self.path, "Library", "bin"),
+                os.path.join(self.path, "Scripts"),
+                os.path.join(self.path, "bin"),
             ]
-            + cmd,
+        return [os.path.join(self.path, "bin")]
+
+    def _resolve_interpreter(self):
+        """
+        Resolves the interpreter of the environment and reproduces the
+        variables "conda activate" would set, so that "conda run" (and its
+        startup time) can be avoided in each call.
+        """
+        self.python_exec = None
+        self.python_env = None
+
+        python_exec = self._get_interpreter_path()
+        if python_exec is None:
+            pc_logging.debug(
+                "No interpreter found in %s, using 'conda run'" % self.path
+            )
+            return
+        if self._has_activation_scripts():
+            # Packages like compilers or CUDA toolkits need their activation
+            # scripts to be sourced, which only conda can do.
+            pc_logging.debug(
+                "Activation scripts found in %s, using 'conda run'" % self.path
+            )
+            return
+
+        env = dict(os.environ)
+        env["PATH"] = os.pathsep.join(
+            self._get_bin_paths()
+            + ([env["PATH"]] if env.get("PATH", "") else [])
+        )
+        env["CONDA_PREFIX"] = self.path
+        env["CONDA_DEFAULT_ENV"] = self.path
+        env["CONDA_SHLVL"] = "1"
+        if self.conda_path is not None:
+            env["CONDA_EXE"] = self.conda_path
+        env.update(self._get_env_vars())
+
+        self.python_exec = python_exec
+        self.python_env = env
+        pc_logging.debug("Using the conda interpreter %s" % python_exec)
+
+    def get_python_env(self):
+        return self.python_env
+
+    def get_python_cmd(self):
+        if self.python_exec is not None:
+            return [self.python_exec]
+
+        return [
+            self.conda_path,
+            "run",
+            "--no-capture-output",
+            "-p",
+            self.path,
+            "python" if os.name != "nt" else "pythonw",
+            # "python%s" % self.version,  # This doesn't work on Windows
+        ]
+
+    async def run(
+        self, cmd, stdin="", cwd=None, limits=None, returncode=False
+    ):
+        self.once()
+
+        return await super().run(
+            self.get_python_cmd() + cmd,
             stdin,
             cwd=cwd,
+            limits=limits,
+            returncode=returncode,
         )
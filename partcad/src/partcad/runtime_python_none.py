@@ -29,9 +29,16 @@ class NonePythonRuntime(runtime_python.PythonRuntime):
             os.makedirs(self.path)
             self.initialized = True
 
-    async def run(self, cmd, stdin="", cwd=None):
+    def get_python_cmd(self):
+        return [self.exec_name]
+
+    async def run(
+        self, cmd, stdin="", cwd=None, limits=None, returncode=False
+    ):
         return await super().run(
-            [self.exec_name] + cmd,
+            self.get_python_cmd() + cmd,
             stdin,
             cwd=cwd,
+            limits=limits,
+            returncode=returncode,
         )
@@ -40,10 +40,16 @@ class PyPyPythonRuntime(runtime_python.PythonRuntime):
                 shutil.rmtree(self.path)
                 raise e
 
-    async def run(self, cmd, stdin="", cwd=None):
+    def get_python_cmd(self):
+        return ["conda", "run", "--no-capture-output", "-p", self.path, "pypy"]
+
+    async def run(
+        self, cmd, stdin="", cwd=None, limits=None, returncode=False
+    ):
         return await super().run(
-            ["conda", "run", "--no-capture-output", "-p", self.path, "pypy"]
-            + cmd,
+            self.get_python_cmd() + cmd,
             stdin,
             cwd=cwd,
+            limits=limits,
+            returncode=returncode,
         )
@@ -0,0 +1,246 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-06
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import asyncio
+import atexit
+import os
+import subprocess
+import sys
+import threading
+import weakref
+
+from .runtime_limits import get_subprocess_kwargs, kill_process_tree
+from .user_config import user_config
+from . import logging as pc_logging
+from . import tracing as pc_tracing
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
+from wrapper_ipc import read_message, write_message
+
+
+class PythonWorker:
+    """
+    A long-lived wrapper process started with "--serve".
+    It keeps the heavy modules (CadQuery, build123d, OCP) imported between
+    the requests.
+    """
+
+    def __init__(self, python_cmd, wrapper_path, env=None):
+        self.wrapper_path = wrapper_path
+        self.jobs = 0
+        self.rss = 0
+        self.peak_rss = 0
+        self.timed_out = False
+        self.killed = False
+
+        cmd = python_cmd + [wrapper_path, "--serve"]
+        pc_logging.debug("Starting a worker: %s" % cmd)
+        self.process = subprocess.Popen(
+            cmd,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            # The errors are reported per request over the protocol.
+            # The rest is discarded to avoid blocking on a full pipe.
+            stderr=subprocess.DEVNULL,
+            shell=False,
+            env=env,
+            # The per-request limits are applied by the worker itself
+            **get_subprocess_kwargs(),
+        )
+
+    def is_alive(self) -> bool:
+        return not self.killed and self.process.poll() is None
+
+    def expire(self):
+        self.timed_out = True
+        self.kill()
+
+    def request(self, argv, request, limits=None):
+        message = {"argv": argv, "request": request}
+        timer = None
+        if limits is not None:
+            message["limits"] = limits.to_request()
+            if limits.timeout is not None:
+                timer = threading.Timer(limits.timeout, self.expire)
+                timer.daemon = True
+                timer.start()
+
+        try:
+            write_message(self.process.stdin, message)
+            reply = read_message(self.process.stdout)
+        except OSError:
+            # The worker is killed while the request is being sent
+            reply = None
+        finally:
+            if timer is not None:
+                timer.cancel()
+
+        if reply is None:
+            returncode = self.process.wait()
+            reason = None
+            if limits is not None:
+                reason = limits.describe(returncode, self.timed_out)
+            if reason is None:
+                reason = (
+                    "the worker process terminated unexpectedly (exit code: %s)"
+                    % returncode
+                )
+            raise Exception(reason)
+
+        self.jobs += 1
+        self.rss = reply["rss"]
+        self.peak_rss = max(self.peak_rss, reply.get("peak_rss", 0))
+        return reply["response"], reply["stderr"]
+
+    def kill(self):
+        """Kills the worker and all processes started by it."""
+        self.killed = True
+        kill_process_tree(self.process)
+
+    def stop(self):
+        try:
+            # Closing stdin makes the worker exit gracefully
+            self.process.stdin.close()
+            self.process.wait(timeout=5)
+        except Exception:
+            self.kill()
+            self.process.wait()
+
+
+class PythonWorkerPool:
+    """
+    Warm wrapper processes of a single Python runtime, grouped by the wrapper
+    script. Workers are recycled once they processed too many requests or
+    grew too large.
+    """
+
+    def __init__(self, runtime):
+        self.runtime = runtime
+        self.lock = threading.Lock()
+        self.idle: dict[str, list[PythonWorker]] = {}
+        self.max_idle = os.cpu_count()
+
+        self.stats_started = 0
+        self.stats_reused = 0
+        self.stats_recycled = 0
+        # The peak memory of the workers, see reset_peak_rss()
+        self.stats_peak_rss = 0
+
+        _pools.add(self)
+
+    def acquire(self, wrapper_path: str) -> PythonWorker:
+        with self.lock:
+            workers = self.idle.get(wrapper_path, [])
+            while workers:
+                worker = workers.pop()
+                if worker.is_alive():
+                    self.stats_reused += 1
+                    return worker
+            self.stats_started += 1
+
+        return PythonWorker(
+            self.runtime.get_python_cmd(),
+            wrapper_path,
+            env=self.runtime.get_python_env(),
+        )
+
+    def release(self, worker: PythonWorker):
+        with self.lock:
+            self.stats_peak_rss = max(self.stats_peak_rss, worker.peak_rss)
+        if (
+            not worker.is_alive()
+            or worker.jobs >= user_config.python_worker_max_jobs
+            or worker.rss > user_config.python_worker_max_memory
+        ):
+            pc_logging.debug(
+                "Recycling a worker after %d jobs (%.2fMB)"
+                % (worker.jobs, worker.rss / 1048576.0)
+            )
+            with self.lock:
+                self.stats_recycled += 1
+            worker.stop()
+            return
+
+        with self.lock:
+            workers = self.idle.setdefault(worker.wrapper_path, [])
+            if len(workers) < self.max_idle:
+                workers.append(worker)
+                return
+        worker.stop()
+
+    def _request(self, worker, cmd, request, limits):
+        if worker.killed:
+            # Cancelled before the request was sent
+            return None, "Worker failure: cancelled\n"
+        try:
+            with pc_tracing.span(
+                "Worker", self.runtime.name, os.path.basename(cmd[0])
+            ):
+                return worker.request(cmd[1:], request, limits)
+        except Exception as e:
+            worker.stop()
+            return None, "Worker failure: %s\n" % e
+
+    def _run(self, worker, cmd, request, limits):
+        # The worker is released by the thread using it, once it is done
+        try:
+            return self._request(worker, cmd, request, limits)
+        finally:
+            self.release(worker)
+
+    def run(self, cmd, request, limits=None):
+        """
+        Blocking equivalent of PythonRuntime.run_wrapper().
+        The first element of 'cmd' is the wrapper script, the rest is passed
+        to it as command line arguments.
+        """
+        worker = self.acquire(cmd[0])
+        return self._run(worker, cmd, request, limits)
+
+    async def run_async(self, cmd, request, limits=None):
+        """
+        Same as run() but doesn't block the event loop. If cancelled, the
+        worker is killed, which wakes up the thread waiting for it.
+        """
+        worker = self.acquire(cmd[0])
+        future = asyncio.get_running_loop().run_in_executor(
+            None, self._run, worker, cmd, request, limits
+        )
+        try:
+            # The thread is not cancelled, so that it always releases the
+            # worker
+            return await asyncio.shield(future)
+        except asyncio.CancelledError:
+            worker.kill()
+            raise
+
+    def reset_peak_rss(self):
+        """
+        Stops the idle workers and forgets their peak memory, so that only
+        the workers used from now on are accounted for.
+        """
+        self.shutdown()
+        with self.lock:
+            self.stats_peak_rss = 0
+
+    def shutdown(self):
+        with self.lock:
+            workers = [w for ws in self.idle.values() for w in ws]
+            self.idle = {}
+        for worker in workers:
+            worker.stop()
+
+
+_pools = weakref.WeakSet()
+
+
+@atexit.register
+def _shutdown_all():
+    for pool in list(_pools):
+        pool.shutdown()
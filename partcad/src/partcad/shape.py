@@ -10,24 +10,30 @@ import cadquery as cq
 import build123d as b3d
 
 import asyncio
-import base64
 import copy
 import os
-import pickle
 import shutil
 import sys
 import tempfile
+import threading
 
+from .build_graph import get_fingerprint
+from .cache import Cache, cache
 from .render import *
 from .plugins import *
 from .shape_config import ShapeConfiguration
-from .utils import total_size
+from . import gltf_exporter
 from . import logging as pc_logging
+from . import memory as pc_memory
+from . import mesh as pc_mesh
+from . import properties as pc_properties
+from . import render_shaded as pc_render_shaded
 from . import sync_threads as pc_thread
 from . import wrapper
 
 sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
 from cq_serialize import register as register_cq_helper
+import svg_edges
 
 
 class Shape(ShapeConfiguration):
@@ -39,11 +45,23 @@ class Shape(ShapeConfiguration):
 
     errors: list[str]
 
+    # Whether to store the shape in the cache when it is evicted from memory,
+    # instead of instantiating it again
+    persist_evicted = True
+
     def __init__(self, config):
         super().__init__(config)
         self.errors = []
         self.lock = asyncio.Lock()
         self.shape = None
+        # 'self.shape' with 'offset' and 'scale' applied, see get_wrapped()
+        self.transformed_lock = asyncio.Lock()
+        self.transformed = None
+        self.transformed_source = None
+        # Cache.hash_shape() of 'shape_hash_source', see get_shape_hash()
+        self.shape_hash_lock = threading.Lock()
+        self.shape_hash = None
+        self.shape_hash_source = None
         self.components = []
         self.compound = None
         self.with_ports = None
@@ -52,6 +70,27 @@ class Shape(ShapeConfiguration):
         self.svg_lock = asyncio.Lock()
         self.svg_path = None
         self.svg_url = None
+        # The files of the additional views rendered so far
+        self.svg_views = set()
+
+        # Triangulations shared by all mesh exporters, keyed by tolerances.
+        # They are computed in worker threads, hence the threading lock.
+        self.mesh_lock = threading.Lock()
+        self.meshes = {}
+
+        # Geometric properties, see get_properties()
+        self.properties = None
+
+        # The estimated OCCT memory usage, see get_memory_usage()
+        self.memory_source = None
+        self.memory_native = 0
+        # The cache key of the evicted shape, see evict()
+        self.evicted_key = None
+        # The instantiated shapes of the context, set by the factories
+        self.memory_stats = None
+
+        # The hash of all inputs of this shape, see build_graph.py
+        self.fingerprint = None
 
         self.desc = config.get("desc", None)
         self.desc = self.desc.strip() if self.desc is not None else None
@@ -75,36 +114,304 @@ class Shape(ShapeConfiguration):
     async def get_wrapped(self):
         shape = await self.get_shape()
 
-        # TODO(clairbee): apply 'offset' and 'scale' during instantiation and
-        #                 apply to both 'wrapped' and 'components'
-        if "offset" in self.config:
-            b3d_solid = b3d.Solid.make_box(1, 1, 1)
-            b3d_solid.wrapped = shape
-            b3d_solid.relocate(b3d.Location(*self.config["offset"]))
-            shape = b3d_solid.wrapped
-        if "scale" in self.config:
-            b3d_solid = b3d.Solid.make_box(1, 1, 1)
-            b3d_solid.wrapped = shape
-            b3d_solid = b3d_solid.scale(self.config["scale"])
-            shape = b3d_solid.wrapped
-        return shape
+        # The transformed shape is computed once per instantiated shape
+        def is_cached():
+            return (
+                self.transformed is not None
+                and self.transformed_source is shape
+            )
+
+        if is_cached():
+            return self.transformed
+
+        async with self.transformed_lock:
+            if is_cached():
+                return self.transformed
+
+            wrapped = shape
+            # TODO(clairbee): apply 'offset' and 'scale' during instantiation
+            #                 and apply to both 'wrapped' and 'components'
+            if wrapped is not None and "offset" in self.config:
+                b3d_solid = b3d.Solid(wrapped)
+                b3d_solid.relocate(b3d.Location(*self.config["offset"]))
+                wrapped = b3d_solid.wrapped
+            if wrapped is not None and "scale" in self.config:
+                b3d_solid = b3d.Solid(wrapped).scale(self.config["scale"])
+                wrapped = b3d_solid.wrapped
+
+            self.transformed = wrapped
+            self.transformed_source = shape
+            return wrapped
+
+    def get_shape_hash(self, wrapped) -> str:
+        """
+        Returns the hash of the geometry of the wrapped shape (see
+        Cache.hash_shape()). It is computed once per instantiated shape.
+        """
+        with self.shape_hash_lock:
+            if self.shape_hash is None or self.shape_hash_source is not wrapped:
+                self.shape_hash = Cache.hash_shape(wrapped)
+                self.shape_hash_source = wrapped
+            return self.shape_hash
 
     async def get_cadquery(self) -> cq.Shape:
-        cq_solid = cq.Solid.makeBox(1, 1, 1)
-        cq_solid.wrapped = await self.get_wrapped()
-        return cq_solid
+        # The wrapper object is cheap, no OCCT shapes are created here
+        return cq.Solid(await self.get_wrapped())
 
     async def get_build123d(self) -> b3d.Solid:
-        b3d_solid = b3d.Solid.make_box(1, 1, 1)
-        b3d_solid.wrapped = await self.get_wrapped()
-        return b3d_solid
+        return b3d.Solid(await self.get_wrapped())
+
+    async def get_mesh(
+        self, tolerance=0.1, angularTolerance=0.1, decimate=None
+    ):
+        """
+        Returns the triangulation of the shape. It is computed once per
+        tolerance pair and persisted in the cache. If 'decimate' is given,
+        the triangulation is reduced to approximately this share of the
+        vertices (see mesh.decimate()).
+        """
+        key = (tolerance, angularTolerance)
+        if decimate is not None:
+            key = (tolerance, angularTolerance, decimate)
+        mesh = self.meshes.get(key, None)
+        if mesh is not None:
+            return mesh
+
+        wrapped = await self.get_wrapped()
+        source = None
+        if decimate is not None:
+            # The decimated mesh is derived from the full one
+            source = await self.get_mesh(tolerance, angularTolerance)
+
+        def do_tessellate():
+            shape_hash = None
+            if cache.enabled:
+                # Not under the lock, the hash is shared with other users
+                shape_hash = self.get_shape_hash(wrapped)
+
+            with self.mesh_lock:
+                mesh = self.meshes.get(key, None)
+                if mesh is not None:
+                    return mesh
+
+                cache_key = None
+                if cache.enabled:
+                    cache_key = Cache.hash("mesh", shape_hash, *key)
+                    data = cache.get("mesh", cache_key)
+                    if data is not None:
+                        try:
+                            mesh = pc_mesh.Mesh.from_bytes(data)
+                        except Exception as e:
+                            pc_logging.debug("Failed to load the mesh: %s" % e)
+
+                if mesh is None and source is not None:
+                    mesh = pc_mesh.decimate(source, decimate)
+                    cache.put("mesh", cache_key, mesh.to_bytes())
+                elif mesh is None:
+                    mesh = pc_mesh.tessellate(
+                        wrapped, tolerance, angularTolerance
+                    )
+                    cache.put("mesh", cache_key, mesh.to_bytes())
+
+                self.meshes[key] = mesh
+                return mesh
+
+        return await pc_thread.run(do_tessellate)
+
+    async def get_properties(self, ctx=None):
+        """
+        Returns the geometric properties of the shape (see properties.py).
+        They are computed once and persisted in the cache keyed by the hash
+        of the shape. If the context is given, they are also keyed by the
+        fingerprint of the shape, so that they can be retrieved without
+        instantiating the shape next time.
+        """
+        if self.properties is not None:
+            return self.properties
+
+        fingerprint_key = None
+        if ctx is not None and cache.enabled:
+            try:
+                fingerprint_key = Cache.hash(
+                    "properties",
+                    pc_properties.PROPERTIES_VERSION,
+                    await get_fingerprint(ctx, self),
+                )
+            except Exception as e:
+                pc_logging.debug(
+                    "Failed to fingerprint %s: %s" % (self.name, e)
+                )
+            properties = self._get_cached_properties(fingerprint_key)
+            if properties is not None:
+                self.properties = properties
+                return properties
+
+        wrapped = await self.get_wrapped()
+        if wrapped is None:
+            # Do not persist the failures
+            return pc_properties.compute(None)
+
+        def do_compute():
+            shape_key = None
+            if cache.enabled:
+                shape_key = Cache.hash(
+                    "properties",
+                    pc_properties.PROPERTIES_VERSION,
+                    self.get_shape_hash(wrapped),
+                )
+            properties = self._get_cached_properties(shape_key)
+            if properties is None:
+                properties = pc_properties.compute(wrapped)
+                cache.put(
+                    "properties", shape_key, pc_properties.to_bytes(properties)
+                )
+            cache.put(
+                "properties",
+                fingerprint_key,
+                pc_properties.to_bytes(properties),
+            )
+            return properties
+
+        self.properties = await pc_thread.run(do_compute)
+        return self.properties
+
+    def _get_cached_properties(self, key):
+        data = cache.get("properties", key)
+        if data is None:
+            return None
+        try:
+            return pc_properties.from_bytes(data)
+        except Exception as e:
+            pc_logging.debug("Failed to load the properties: %s" % e)
+            return None
+
+    def get_native_memory_usage(self) -> int:
+        """Returns the estimated memory allocated by OCCT for this shape."""
+        size = pc_memory.get_native_size(self.shape)
+        transformed = self.transformed
+        if (
+            transformed is not None
+            and self.shape is not None
+            and not transformed.IsPartner(self.shape)
+        ):
+            # Scaling creates a copy of the geometry
+            size += pc_memory.get_native_size(transformed)
+        return size
+
+    def get_memory_usage(self):
+        """
+        Returns the estimated memory usage of the shape (Python, OCCT) in
+        bytes. The OCCT part is computed once per instantiated shape.
+        """
+        source = (self.shape, self.transformed)
+        if (
+            self.memory_source is None
+            or self.memory_source[0] is not source[0]
+            or self.memory_source[1] is not source[1]
+        ):
+            self.memory_native = self.get_native_memory_usage()
+            self.memory_source = source
+        return pc_memory.get_python_size(self), self.memory_native
+
+    async def instantiated(self, shape):
+        """
+        Accounts for the newly instantiated shape in the memory statistics
+        and in the memory budget, which may evict other shapes.
+        """
+        if shape is None:
+            return
+        # The memory usage is only estimated on demand
+        if self.memory_stats is not None:
+            self.memory_stats.add_shape(self)
+        if pc_memory.budget.enabled:
+            await asyncio.get_running_loop().run_in_executor(
+                None, pc_memory.budget.add, self
+            )
+
+    async def restore_evicted(self):
+        """Returns the evicted shape if it is still in the cache."""
+        key = self.evicted_key
+        if key is None:
+            return None
+        self.evicted_key = None
+
+        def restore():
+            shape = cache.get_shape(key)
+            if shape is None:
+                return None
+            components = cache.get_components(key)
+            if components is not None:
+                self.components = components
+            # The entry is only needed until the shape is restored
+            cache.delete("shape", key)
+            cache.delete("components", key)
+            return shape
+
+        shape = await asyncio.get_running_loop().run_in_executor(None, restore)
+        if shape is not None:
+            pc_logging.debug(
+                "Restored %s:%s from the cache" % (self.project_name, self.name)
+            )
+        return shape
+
+    def evict(self):
+        """
+        Drops the instantiated shape and everything derived from it to free
+        memory. It is restored from the cache (or instantiated again) on the
+        next access.
+        """
+        shape = self.shape
+        if shape is None:
+            return
+
+        if self.persist_evicted and cache.enabled:
+            # The same shape evicted again reuses the entry
+            if self.fingerprint is not None:
+                shape_hash = self.fingerprint
+            elif self.transformed_source is shape:
+                # Reuse the hash of the wrapped shape if known
+                shape_hash = self.get_shape_hash(self.transformed)
+            else:
+                shape_hash = self.get_shape_hash(shape)
+            key = Cache.hash(
+                "evicted", self.project_name, self.name, shape_hash
+            )
+            cache.put_shape(key, shape)
+            # The components produced by the factory (if any) can not be
+            # derived from the shape, while the ports are collected again
+            if len(self.components) != 0 and self.with_ports is None:
+                cache.put_components(key, self.components)
+            self.evicted_key = key
+
+        pc_memory.budget.remove(self)
+        if self.memory_stats is not None:
+            self.memory_stats.remove_shape(self)
+        self.shape = None
+        self.transformed = None
+        self.transformed_source = None
+        self.shape_hash = None
+        self.shape_hash_source = None
+        self.components = []
+        with self.mesh_lock:
+            self.meshes = {}
+        self.memory_source = None
+        self.memory_native = 0
 
     def regenerate(self):
         """Regenerates the shape generated by AI. Config remains the same."""
         if hasattr(self, "generate"):
             # Invalidate the shape
             # async with self.lock:
+            if self.memory_stats is not None:
+                self.memory_stats.remove_shape(self)
             self.shape = None
+            self.transformed = None
+            self.transformed_source = None
+            self.shape_hash = None
+            self.shape_hash_source = None
+            self.meshes = {}
+            self.properties = None
+            self.fingerprint = None
 
             # # Truncate the source code file
             # # This will trigger the regeneration of the file on instantiation
@@ -176,13 +483,31 @@ class Shape(ShapeConfiguration):
     def test(self):
         _ = asyncio.run(self.get_wrapped())
 
+    def get_fingerprint_inputs(self) -> list:
+        """Returns the inputs besides the config and the source file."""
+        return []
+
+    def get_dependencies(self) -> list:
+        """Returns the shapes this shape is made of."""
+        return []
+
+    async def prepare_runtime(self):
+        """Installs what this shape needs to be instantiated, if anything."""
+        pass
+
     def show(self, show_object=None):
         asyncio.run(self.show_async(show_object))
 
     def shape_info(self):
         asyncio.run(self.get_wrapped())
         info = {}
-        info["Memory"] = "%.02f KB" % ((total_size(self) + 1023.0) / 1024.0)
+        python_size, native_size = self.get_memory_usage()
+        info["Memory"] = "%s (Python: %s, OCCT: %s)" % (
+            pc_memory.format_size(python_size + native_size),
+            pc_memory.format_size(python_size),
+            pc_memory.format_size(native_size),
+        )
+        info["Properties"] = asyncio.run(self.get_properties())
 
         if self.with_ports is not None:
             info["Ports"] = self.with_ports.info()
@@ -196,68 +521,110 @@ class Shape(ShapeConfiguration):
         else:
             pc_logging.error(msg)
 
-    async def render_svg_somewhere(
+    def _get_svg_opts(self, project=None, line_weight=None):
+        svg_opts, _ = self.render_getopts("svg", ".svg", project, ".")
+        if line_weight is None:
+            if "lineWeight" in svg_opts and not svg_opts["lineWeight"] is None:
+                line_weight = svg_opts["lineWeight"]
+            else:
+                line_weight = 1.0
+        return svg_opts, line_weight
+
+    async def render_svg_views(
         self,
         ctx,
+        views,
         project=None,
-        filepath=None,
         line_weight=None,
-        viewport_origin=None,
     ):
-        """Renders an SVG file somewhere and ignore the project settings"""
-        if filepath is None:
-            filepath = tempfile.mktemp(".svg")
-
+        """
+        Renders the shape from several viewpoints in one session of the SVG
+        wrapper. 'views' is a list of (viewport origin, viewport up, file
+        path[, with edges]). The visible edges are also written next to the
+        SVG files if requested (see 'wrappers/svg_edges.py'). The results
+        are cached by the hash of the shape, the view and the line weight.
+        Returns the list of the views rendered successfully.
+        """
+        views = list(
+            map(lambda v: tuple(v) + (False,) * (4 - len(v)), views)
+        )
         obj = await self.get_wrapped()
         if obj is None:
             # pc_logging.error("The shape failed to instantiate")
-            self.svg_path = None
-            return
-
-        svg_opts, _ = self.render_getopts("svg", ".svg", project, filepath)
-
-        if line_weight is None:
-            if "lineWeight" in svg_opts and not svg_opts["lineWeight"] is None:
-                line_weight = svg_opts["lineWeight"]
-            else:
-                line_weight = 1.0
-
-        if viewport_origin is None:
-            if (
-                "viewportOrigin" in svg_opts
-                and not svg_opts["viewportOrigin"] is None
-            ):
-                viewport_origin = svg_opts["viewportOrigin"]
-            else:
-                viewport_origin = [100, -100, 100]
+            return [False] * len(views)
+
+        _, line_weight = self._get_svg_opts(project, line_weight)
+
+        def from_cache():
+            keys = [None] * len(views)
+            done = [False] * len(views)
+            if not cache.enabled:
+                return keys, done
+            shape_hash = self.get_shape_hash(obj)
+            for i, (origin, up, filepath, with_edges) in enumerate(views):
+                keys[i] = Cache.hash(
+                    "svg",
+                    shape_hash,
+                    list(map(float, origin)),
+                    list(map(float, up)),
+                    float(line_weight),
+                )
+                data = cache.get("svg", keys[i])
+                edges = None
+                if with_edges:
+                    edges = cache.get("svg-edges", keys[i])
+                if data is None or (with_edges and edges is None):
+                    continue
+                with open(filepath, "wb") as f:
+                    f.write(data)
+                if with_edges:
+                    with open(svg_edges.get_path(filepath), "wb") as f:
+                        f.write(edges)
+                done[i] = True
+            return keys, done
+
+        keys, done = await pc_thread.run(from_cache)
+        missing = [i for i in range(len(views)) if not done[i]]
+        if len(missing) == 0:
+            return done
+
+        def get_view_request(view):
+            origin, up, filepath, with_edges = view
+            request = {
+                "viewport_origin": origin,
+                "viewport_up": up,
+                "path": os.path.abspath(filepath),
+            }
+            if with_edges:
+                request["edges_path"] = svg_edges.get_path(request["path"])
+            return request
 
         wrapper_path = wrapper.get("render_svg.py")
         request = {
             "wrapped": obj,
             "line_weight": line_weight,
-            "viewport_origin": viewport_origin,
+            "views": [get_view_request(views[i]) for i in missing],
         }
         register_cq_helper()
-        picklestring = pickle.dumps(request)
-        request_serialized = base64.b64encode(picklestring).decode()
 
         # We don't care about customer preferences much here
         # as this is expected to be hermetic.
         # Stick to the version where CadQuery and build123d are known to work.
         runtime = ctx.get_python_runtime(version="3.10")
-        await runtime.ensure("cadquery")  # SVG wrapper requires cq-serialize
-        await runtime.ensure("build123d")
-        response_serialized, errors = await runtime.run(
+        # SVG wrapper requires cq-serialize
+        await runtime.ensure_many(["cadquery", "build123d"])
+        result, errors = await runtime.run_wrapper(
             [
                 wrapper_path,
-                os.path.abspath(filepath),
+                os.path.abspath(views[missing[0]][2]),
             ],
-            request_serialized,
+            request,
         )
         sys.stderr.write(errors)
 
-        response = base64.b64decode(response_serialized)
-        result = pickle.loads(response)
+        if result is None:
+            pc_logging.error("RenderSVG failed: %s" % self.name)
+            return done
         if not result["success"]:
             pc_logging.error(
                 "RenderSVG failed: %s: %s" % (self.name, result["exception"])
@@ -267,12 +634,103 @@ class Shape(ShapeConfiguration):
                 "RenderSVG exception: %s" % result["exception"]
             )
 
-        self.svg_path = filepath
+        def to_cache():
+            for i in missing:
+                _, _, filepath, with_edges = views[i]
+                if not os.path.exists(filepath):
+                    continue
+                done[i] = True
+                if not result["success"]:
+                    continue
+                with open(filepath, "rb") as f:
+                    cache.put("svg", keys[i], f.read())
+                edges_path = svg_edges.get_path(filepath)
+                if with_edges and os.path.exists(edges_path):
+                    with open(edges_path, "rb") as f:
+                        cache.put("svg-edges", keys[i], f.read())
+
+        await pc_thread.run(to_cache)
+        return done
+
+    async def render_svg_somewhere(
+        self,
+        ctx,
+        project=None,
+        filepath=None,
+        line_weight=None,
+        viewport_origin=None,
+    ):
+        """Renders an SVG file somewhere and ignore the project settings"""
+        # The edges are used to produce the raster images
+        with_edges = filepath is None
+        if filepath is None:
+            filepath = tempfile.mktemp(".svg")
+
+        svg_opts, line_weight = self._get_svg_opts(project, line_weight)
+        if viewport_origin is None:
+            if (
+                "viewportOrigin" in svg_opts
+                and not svg_opts["viewportOrigin"] is None
+            ):
+                viewport_origin = svg_opts["viewportOrigin"]
+            else:
+                viewport_origin = DEFAULT_SVG_VIEWPORT_ORIGIN
+        _, origin, up = get_svg_view(viewport_origin)
+
+        done = await self.render_svg_views(
+            ctx, [(origin, up, filepath, with_edges)], project, line_weight
+        )
+        self.svg_path = filepath if done[0] else None
+
+    async def _get_svg_path(self, ctx, project, filepath=None, views=None):
+        """
+        Returns the path of the SVG file of the default view, rendering it
+        if needed. The additional views ('views' of the render options by
+        default) are rendered to '<filepath>-<view>.svg' in the same session
+        of the SVG wrapper.
+        """
+        svg_opts, filepath = self.render_getopts(
+            "svg", ".svg", project, filepath
+        )
+        if views is None:
+            views = svg_opts.get("views", None) or []
+
+        targets = []
+        base, extension = os.path.splitext(filepath)
+        for view in views:
+            try:
+                name, origin, up = get_svg_view(view)
+            except ValueError as e:
+                pc_logging.error("%s: %s" % (self.name, e))
+                continue
+            targets.append((origin, up, "%s-%s%s" % (base, name, extension)))
 
-    async def _get_svg_path(self, ctx, project):
         async with self.svg_lock:
+            targets = list(
+                filter(lambda t: t[2] not in self.svg_views, targets)
+            )
+            if len(targets) > 0 and not project is None:
+                project.ctx.ensure_dirs_for_file(filepath)
+
+            default_path = None
             if self.svg_path is None:
-                await self.render_svg_somewhere(ctx=ctx, project=project)
+                viewport_origin = svg_opts.get("viewportOrigin", None)
+                if viewport_origin is None:
+                    viewport_origin = DEFAULT_SVG_VIEWPORT_ORIGIN
+                _, origin, up = get_svg_view(viewport_origin)
+                default_path = tempfile.mktemp(".svg")
+                # The edges are used to produce the raster images
+                targets.append((origin, up, default_path, True))
+
+            if len(targets) > 0:
+                done = await self.render_svg_views(ctx, targets, project)
+                for target, success in zip(targets, done):
+                    if not success:
+                        continue
+                    if target[2] == default_path:
+                        self.svg_path = default_path
+                    else:
+                        self.svg_views.add(target[2])
             return self.svg_path
 
     def render_getopts(
@@ -335,18 +793,104 @@ class Shape(ShapeConfiguration):
 
         return opts, filepath
 
+    def render_getopts_tolerance(
+        self, opts, tolerance=None, angularTolerance=None
+    ):
+        """Returns the tessellation tolerances for the mesh formats."""
+        if tolerance is None:
+            if "tolerance" in opts and not opts["tolerance"] is None:
+                tolerance = opts["tolerance"]
+            else:
+                tolerance = 0.1
+
+        if angularTolerance is None:
+            if (
+                "angularTolerance" in opts
+                and not opts["angularTolerance"] is None
+            ):
+                angularTolerance = opts["angularTolerance"]
+            else:
+                angularTolerance = 0.1
+
+        return tolerance, angularTolerance
+
+    def render_getopts_lods(self, opts, tolerance, angularTolerance):
+        """
+        Returns the additional levels of detail of the mesh formats as
+        (tolerance, angularTolerance, decimate) tuples, in the order of the
+        config (the finest first).
+        """
+        lods = []
+        if not "lods" in opts or opts["lods"] is None:
+            return lods
+
+        for lod in opts["lods"]:
+            if not isinstance(lod, dict):
+                lod = {"tolerance": lod}
+            if "tolerance" in lod and not lod["tolerance"] is None:
+                lod_tolerance = lod["tolerance"]
+            else:
+                lod_tolerance = tolerance
+            if (
+                "angularTolerance" in lod
+                and not lod["angularTolerance"] is None
+            ):
+                lod_angular_tolerance = lod["angularTolerance"]
+            else:
+                # Coarser triangulations tolerate larger angles too
+                lod_angular_tolerance = min(
+                    1.0, angularTolerance * lod_tolerance / tolerance
+                )
+            lods.append(
+                (lod_tolerance, lod_angular_tolerance, lod.get("decimate"))
+            )
+        return lods
+
+    async def _render_lods(
+        self, opts, filepath, tolerance, angularTolerance, write
+    ):
+        """Writes the additional levels of detail next to the file."""
+        lods = self.render_getopts_lods(opts, tolerance, angularTolerance)
+        for level, lod in enumerate(lods):
+            mesh = await self.get_mesh(*lod)
+            lod_path = pc_mesh.get_lod_path(filepath, level + 1)
+            await pc_thread.run(write, mesh, lod_path)
+
+    def render_getopts_png_mode(self, opts, mode=None):
+        """Returns the mode of the PNG renders (see PNG_MODES)."""
+        if mode is None:
+            if "mode" in opts and not opts["mode"] is None:
+                mode = opts["mode"]
+            else:
+                mode = PNG_MODE_WIREFRAME
+
+        if mode not in PNG_MODES:
+            pc_logging.error(
+                "Unknown PNG mode: %s (expected: %s)"
+                % (mode, ", ".join(PNG_MODES))
+            )
+            mode = PNG_MODE_WIREFRAME
+        return mode
+
     async def render_svg_async(
         self,
         ctx,
         project=None,
         filepath=None,
+        views=None,
     ):
+        """
+        Renders the SVG file. The additional views ('views' of the render
+        options by default) are rendered to '<filepath>-<view>.svg'.
+        """
         with pc_logging.Action("RenderSVG", self.project_name, self.name):
             _, filepath = self.render_getopts("svg", ".svg", project, filepath)
 
             # This creates a temporary file, but it allows to reuse the file
             # with other consumers of self._get_svg_path()
-            svg_path = await self._get_svg_path(ctx=ctx, project=project)
+            svg_path = await self._get_svg_path(
+                ctx=ctx, project=project, filepath=filepath, views=views
+            )
             if not svg_path is None and svg_path != filepath:
                 if os.path.exists(svg_path):
                     shutil.copyfile(svg_path, filepath)
@@ -358,8 +902,9 @@ class Shape(ShapeConfiguration):
         ctx,
         project=None,
         filepath=None,
+        views=None,
     ):
-        asyncio.run(self.render_svg_async(ctx, project, filepath))
+        asyncio.run(self.render_svg_async(ctx, project, filepath, views))
 
     async def render_png_async(
         self,
@@ -368,15 +913,26 @@ class Shape(ShapeConfiguration):
         filepath=None,
         width=None,
         height=None,
+        mode=None,
     ):
+        """
+        Renders the PNG file. By default, it is the wireframe converted from
+        the SVG projection. In the "shaded" mode, the triangulation of the
+        shape is rendered instead (see render_shaded.py), which is faster
+        and does not need the SVG projection.
+        """
         with pc_logging.Action("RenderPNG", self.project_name, self.name):
-            if not plugins.export_png.is_supported():
-                pc_logging.error("Export to PNG is not supported")
-                return
-
             png_opts, filepath = self.render_getopts(
                 "png", ".png", project, filepath
             )
+            mode = self.render_getopts_png_mode(png_opts, mode)
+
+            if (
+                mode == PNG_MODE_WIREFRAME
+                and not plugins.export_png.is_supported()
+            ):
+                pc_logging.error("Export to PNG is not supported")
+                return
 
             if width is None:
                 if "width" in png_opts and not png_opts["width"] is None:
@@ -389,6 +945,12 @@ class Shape(ShapeConfiguration):
                 else:
                     height = DEFAULT_RENDER_HEIGHT
 
+            if mode == PNG_MODE_SHADED:
+                await self._render_png_shaded(
+                    project, png_opts, width, height, filepath
+                )
+                return
+
             # Render the vector image
             svg_path = await self._get_svg_path(ctx=ctx, project=project)
 
@@ -400,6 +962,35 @@ class Shape(ShapeConfiguration):
 
             await pc_thread.run(do_render_png)
 
+    async def _render_png_shaded(self, project, opts, width, height, filepath):
+        tolerance, angularTolerance = self.render_getopts_tolerance(opts)
+        mesh = await self.get_mesh(tolerance, angularTolerance)
+
+        if "view" in opts and not opts["view"] is None:
+            _, origin, up = get_svg_view(opts["view"])
+        else:
+            _, origin, up = get_svg_view(DEFAULT_SVG_VIEWPORT_ORIGIN)
+        if "shading" in opts and not opts["shading"] is None:
+            shading = opts["shading"]
+        else:
+            shading = pc_render_shaded.SHADING_FLAT
+
+        def do_render_png():
+            try:
+                from PIL import Image
+            except ImportError:
+                pc_logging.error("Pillow is required for the shaded PNG")
+                return
+
+            image = pc_render_shaded.render(
+                mesh, int(width), int(height), origin, up, shading
+            )
+            if not project is None:
+                project.ctx.ensure_dirs_for_file(filepath)
+            Image.fromarray(image, "RGBA").save(filepath, format="PNG")
+
+        await pc_thread.run(do_render_png)
+
     def render_png(
         self,
         ctx,
@@ -407,9 +998,10 @@ class Shape(ShapeConfiguration):
         filepath=None,
         width=None,
         height=None,
+        mode=None,
     ):
         asyncio.run(
-            self.render_png_async(ctx, project, filepath, width, height)
+            self.render_png_async(ctx, project, filepath, width, height, mode)
         )
 
     async def render_step_async(
@@ -454,36 +1046,17 @@ class Shape(ShapeConfiguration):
                 "stl", ".stl", project, filepath
             )
 
-            if tolerance is None:
-                if (
-                    "tolerance" in stl_opts
-                    and not stl_opts["tolerance"] is None
-                ):
-                    tolerance = stl_opts["tolerance"]
-                else:
-                    tolerance = 0.1
-
-            if angularTolerance is None:
-                if (
-                    "angularTolerance" in stl_opts
-                    and not stl_opts["angularTolerance"] is None
-                ):
-                    angularTolerance = stl_opts["angularTolerance"]
-                else:
-                    angularTolerance = 0.1
+            tolerance, angularTolerance = self.render_getopts_tolerance(
+                stl_opts, tolerance, angularTolerance
+            )
 
-            cq_obj = await self.get_cadquery()
+            mesh = await self.get_mesh(tolerance, angularTolerance)
 
             def do_render_stl():
-                nonlocal cq_obj, project, filepath, tolerance, angularTolerance
+                nonlocal mesh, project, filepath
                 if not project is None:
                     project.ctx.ensure_dirs_for_file(filepath)
-                cq.exporters.export(
-                    cq_obj,
-                    filepath,
-                    tolerance=tolerance,
-                    angularTolerance=angularTolerance,
-                )
+                pc_mesh.write_stl(mesh, filepath)
 
             await pc_thread.run(do_render_stl)
 
@@ -514,36 +1087,17 @@ class Shape(ShapeConfiguration):
                 "3mf", ".3mf", project, filepath
             )
 
-            if tolerance is None:
-                if (
-                    "tolerance" in threemf_opts
-                    and not threemf_opts["tolerance"] is None
-                ):
-                    tolerance = threemf_opts["tolerance"]
-                else:
-                    tolerance = 0.1
-
-            if angularTolerance is None:
-                if (
-                    "angularTolerance" in threemf_opts
-                    and not threemf_opts["angularTolerance"] is None
-                ):
-                    angularTolerance = threemf_opts["angularTolerance"]
-                else:
-                    angularTolerance = 0.1
+            tolerance, angularTolerance = self.render_getopts_tolerance(
+                threemf_opts, tolerance, angularTolerance
+            )
 
-            cq_obj = await self.get_cadquery()
+            mesh = await self.get_mesh(tolerance, angularTolerance)
 
             def do_render_3mf():
-                nonlocal cq_obj, project, filepath, tolerance, angularTolerance
+                nonlocal mesh, project, filepath
                 if not project is None:
                     project.ctx.ensure_dirs_for_file(filepath)
-                cq.exporters.export(
-                    cq_obj,
-                    filepath,
-                    tolerance=tolerance,
-                    angularTolerance=angularTolerance,
-                )
+                pc_mesh.write_3mf(mesh, filepath, self.name)
 
             await pc_thread.run(do_render_3mf)
 
@@ -574,39 +1128,26 @@ class Shape(ShapeConfiguration):
                 "threejs", ".json", project, filepath
             )
 
-            if tolerance is None:
-                if (
-                    "tolerance" in threejs_opts
-                    and not threejs_opts["tolerance"] is None
-                ):
-                    tolerance = threejs_opts["tolerance"]
-                else:
-                    tolerance = 0.1
-
-            if angularTolerance is None:
-                if (
-                    "angularTolerance" in threejs_opts
-                    and not threejs_opts["angularTolerance"] is None
-                ):
-                    angularTolerance = threejs_opts["angularTolerance"]
-                else:
-                    angularTolerance = 0.1
+            tolerance, angularTolerance = self.render_getopts_tolerance(
+                threejs_opts, tolerance, angularTolerance
+            )
 
-            cq_obj = await self.get_cadquery()
+            mesh = await self.get_mesh(tolerance, angularTolerance)
 
             def do_render_threejs():
-                nonlocal cq_obj, project, filepath, tolerance, angularTolerance
+                nonlocal mesh, project, filepath
                 if not project is None:
                     project.ctx.ensure_dirs_for_file(filepath)
-                cq.exporters.export(
-                    cq_obj,
-                    filepath,
-                    tolerance=tolerance,
-                    angularTolerance=angularTolerance,
-                    exportType=cq.exporters.ExportTypes.TJS,
-                )
+                pc_mesh.write_threejs(mesh, filepath)
 
             await pc_thread.run(do_render_threejs)
+            await self._render_lods(
+                threejs_opts,
+                filepath,
+                tolerance,
+                angularTolerance,
+                pc_mesh.write_threejs,
+            )
 
     def render_threejs(
         self,
@@ -635,58 +1176,26 @@ class Shape(ShapeConfiguration):
                 "obj", ".obj", project, filepath
             )
 
-            if tolerance is None:
-                if (
-                    "tolerance" in obj_opts
-                    and not obj_opts["tolerance"] is None
-                ):
-                    tolerance = obj_opts["tolerance"]
-                else:
-                    tolerance = 0.1
-
-            if angularTolerance is None:
-                if (
-                    "angularTolerance" in obj_opts
-                    and not obj_opts["angularTolerance"] is None
-                ):
-                    angularTolerance = obj_opts["angularTolerance"]
-                else:
-                    angularTolerance = 0.1
+            tolerance, angularTolerance = self.render_getopts_tolerance(
+                obj_opts, tolerance, angularTolerance
+            )
 
-            obj = await self.get_wrapped()
-            wrapper_path = wrapper.get("render_obj.py")
-            request = {
-                "wrapped": obj,
-                "tolerance": tolerance,
-                "angularTolerance": angularTolerance,
-            }
-            register_cq_helper()
-            picklestring = pickle.dumps(request)
-            request_serialized = base64.b64encode(picklestring).decode()
-
-            # We don't care about customer preferences much here
-            # as this is expected to be hermetic.
-            # Stick to the version where CadQuery and build123d are known to work.
-            runtime = ctx.get_python_runtime(version="3.10")
-            await runtime.ensure("cadquery")
-            response_serialized, errors = await runtime.run(
-                [
-                    wrapper_path,
-                    os.path.abspath(filepath),
-                ],
-                request_serialized,
-            )
-            sys.stderr.write(errors)
-
-            response = base64.b64decode(response_serialized)
-            result = pickle.loads(response)
-
-            if not result["success"]:
-                pc_logging.error(
-                    "RenderOBJ faled: %s: %s" % (self.name, result["exception"])
-                )
-            if "exception" in result and not result["exception"] is None:
-                pc_logging.exception(result["exception"])
+            mesh = await self.get_mesh(tolerance, angularTolerance)
+
+            def do_render_obj():
+                nonlocal mesh, project, filepath
+                if not project is None:
+                    project.ctx.ensure_dirs_for_file(filepath)
+                pc_mesh.write_obj(mesh, filepath)
+
+            await pc_thread.run(do_render_obj)
+            await self._render_lods(
+                obj_opts,
+                filepath,
+                tolerance,
+                angularTolerance,
+                pc_mesh.write_obj,
+            )
 
     def render_obj(
         self,
@@ -716,23 +1225,9 @@ class Shape(ShapeConfiguration):
                 "gltf", ".json", project, filepath
             )
 
-            if tolerance is None:
-                if (
-                    "tolerance" in gltf_opts
-                    and not gltf_opts["tolerance"] is None
-                ):
-                    tolerance = gltf_opts["tolerance"]
-                else:
-                    tolerance = 0.1
-
-            if angularTolerance is None:
-                if (
-                    "angularTolerance" in gltf_opts
-                    and not gltf_opts["angularTolerance"] is None
-                ):
-                    angularTolerance = gltf_opts["angularTolerance"]
-                else:
-                    angularTolerance = 0.1
+            tolerance, angularTolerance = self.render_getopts_tolerance(
+                gltf_opts, tolerance, angularTolerance
+            )
 
             if binary is None:
                 if "binary" in gltf_opts and not gltf_opts["binary"] is None:
@@ -740,17 +1235,18 @@ class Shape(ShapeConfiguration):
                 else:
                     binary = False
 
-            b3d_obj = await self.get_build123d()
+            # The coarser levels of detail are written using MSFT_lod
+            levels = [(tolerance, angularTolerance, None)]
+            levels += self.render_getopts_lods(
+                gltf_opts, tolerance, angularTolerance
+            )
+            part = await gltf_exporter.get_part(self, levels)
 
             def do_render_gltf():
-                nonlocal b3d_obj, project, filepath, tolerance, angularTolerance
-                b3d.export_gltf(
-                    b3d_obj,
-                    filepath,
-                    binary=binary,
-                    linear_deflection=tolerance,
-                    angular_deflection=angularTolerance,
-                )
+                nonlocal part, project, filepath, binary
+                if not project is None:
+                    project.ctx.ensure_dirs_for_file(filepath)
+                gltf_exporter.write_gltf(part, filepath, binary=binary)
 
             await pc_thread.run(do_render_gltf)
 
@@ -764,7 +1260,11 @@ class Shape(ShapeConfiguration):
     ):
         asyncio.run(
             self.render_gltf_async(
-                ctx, project, filepath, tolerance, angularTolerance
+                ctx,
+                project,
+                filepath,
+                tolerance=tolerance,
+                angularTolerance=angularTolerance,
             )
         )
 
@@ -32,6 +32,18 @@ class ShapeFactory(factory.Factory):
 
         self.with_ports = WithPorts(config["name"], project, config)
 
+    def get_fingerprint_inputs(self, shape) -> list:
+        """Returns the inputs besides the config and the source file."""
+        return []
+
+    def get_dependencies(self, shape) -> list:
+        """Returns the shapes referenced by the shape."""
+        return []
+
+    async def prepare_runtime(self, shape):
+        """Installs what the shape needs to be instantiated, if anything."""
+        pass
+
     def info(self, shape):
         """This is the default implementation of the get_info method for factories."""
         return shape.shape_info()
@@ -0,0 +1,150 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-18
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import os
+import sys
+
+from .cache import Cache
+from .runtime_limits import RuntimeLimits
+from .runtime_python import PythonRuntime
+from . import runtime_inprocess
+from . import wrapper
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
+from cq_serialize import register as register_cq_helper
+
+
+class ShapeFactoryPython:
+    """
+    The part of the factories of the shapes defined by Python scripts which
+    is common for parts and sketches. It precedes the file factory (e.g.
+    'PartFactoryFile') in the list of the base classes.
+    """
+
+    runtime: PythonRuntime
+    cwd: str
+    # The requirements of the wrapper script
+    requirements: list[str] = []
+
+    def __init__(
+        self,
+        ctx,
+        source_project,
+        target_project,
+        config,
+        can_create=False,
+        python_version=None,
+    ):
+        super().__init__(
+            ctx,
+            source_project,
+            target_project,
+            config,
+            extension=".py",
+            can_create=can_create,
+        )
+        self.cwd = config.get("cwd", None)
+
+        if python_version is None:
+            # TODO(clairbee): stick to a default constant or configured version
+            python_version = self.project.python_version
+        self.runtime = self.ctx.get_python_runtime(python_version)
+        # Trusted packages can be executed without sandboxing
+        self.inprocess = runtime_inprocess.is_inprocess(self.project, config)
+
+    def get_cwd(self) -> str:
+        if self.cwd is not None:
+            return os.path.join(self.project.config_dir, self.cwd)
+        return self.project.config_dir
+
+    async def prepare_python(self):
+        """
+        This method is called by child classes
+        to prepare the Python environment
+        before instantiating the shape.
+        """
+
+        # Install dependencies of this package
+        await self.runtime.prepare_for_package(self.project)
+        await self.runtime.prepare_for_shape(self.config)
+
+    async def prepare_runtime(self, shape):
+        """
+        Installs everything the shape needs into the Python runtime,
+        unless it is executed in-process.
+        """
+        if self.inprocess:
+            return
+
+        # Finish initialization of PythonRuntime
+        # which was too expensive to do in the constructor
+        await self.prepare_python()
+        await self.runtime.ensure_many(self.requirements)
+
+    async def run_wrapper(self, name, shape, request):
+        """
+        Executes the wrapper script (e.g. "cadquery") for the shape either
+        in-process or in the Python runtime which is prepared first.
+        Returns the response object and the error output.
+        """
+        cwd = self.get_cwd()
+
+        if self.inprocess:
+            return await runtime_inprocess.run_wrapper(
+                name, shape.path, cwd, request
+            )
+
+        await self.prepare_runtime(shape)
+
+        # Make sure the request can be serialized
+        register_cq_helper()
+
+        return await self.runtime.run_wrapper(
+            [
+                wrapper.get("%s.py" % name),
+                os.path.abspath(shape.path),
+                os.path.abspath(cwd),
+            ],
+            request,
+            limits=RuntimeLimits.from_config(self.config),
+        )
+
+    def get_python_inputs(self, shape) -> list:
+        """
+        Returns the inputs of the script besides its source code and config:
+        the local modules, the requirements and the runtime.
+        """
+        requirements = None
+        requirements_path = os.path.join(self.project.path, "requirements.txt")
+        if os.path.exists(requirements_path):
+            with open(requirements_path, "rb") as f:
+                requirements = Cache.hash(f.read())
+
+        return [
+            # The script may import the local modules of the package
+            Cache.hash_sources(self.get_cwd(), os.path.dirname(shape.path)),
+            shape.config.get("pythonRequirements", []),
+            self.project.config_obj.get("pythonRequirements", []),
+            requirements,
+            (
+                "inprocess-" + runtime_inprocess.get_host_version()
+                if self.inprocess
+                else self.runtime.name
+            ),
+        ]
+
+    def info(self, shape):
+        info: dict[str, object] = shape.shape_info()
+        info.update(
+            {
+                "runtime_version": self.runtime.version,
+                "runtime_path": self.runtime.path,
+            }
+        )
+        return info
@@ -10,6 +10,7 @@
 import typing
 
 from .shape_ai import ShapeWithAi
+from . import memory as pc_memory
 from . import sync_threads as pc_thread
 
 
@@ -23,9 +24,17 @@ class Sketch(ShapeWithAi):
 
     async def get_shape(self):
         async with self.lock:
-            if self.shape is None:
-                self.shape = await pc_thread.run_async(self.instantiate, self)
-            return self.shape
+            # The shape may be evicted concurrently, see memory.py
+            shape = self.shape
+            if shape is None:
+                shape = await self.restore_evicted()
+                if shape is None:
+                    shape = await pc_thread.run_async(self.instantiate, self)
+                self.shape = shape
+                await self.instantiated(shape)
+            else:
+                pc_memory.budget.touch(self)
+            return shape
 
     def ref_inc(self):
         # Not applicable to sketches
@@ -40,7 +40,13 @@ class SketchFactory(ShapeFactory):
         # TODO(clairbee): Make the next line work for sketch_factory_file only
         sketch.instantiate = lambda sketch_self: self.instantiate(sketch_self)
         sketch.info = lambda: self.info(sketch)
+        sketch.get_fingerprint_inputs = lambda: self.get_fingerprint_inputs(
+            sketch
+        )
+        sketch.get_dependencies = lambda: self.get_dependencies(sketch)
+        sketch.prepare_runtime = lambda: self.prepare_runtime(sketch)
         sketch.with_ports = self.with_ports
+        sketch.memory_stats = self.ctx.memory_stats
         return sketch
 
     def _create(self, config: object):
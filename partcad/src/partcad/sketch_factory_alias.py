@@ -67,6 +67,9 @@ class SketchFactoryAlias(SketchFactory):
 
             pc_logging.debug("Initializing an alias to %s" % self.source)
 
+    def get_dependencies(self, sketch):
+        return [self.ctx._get_sketch(self.source)]
+
     async def instantiate(self, sketch):
         with pc_logging.Action("Alias", sketch.project_name, sketch.name):
 
@@ -7,10 +7,7 @@
 # Licensed under Apache License, Version 2.0.
 #
 
-import base64
 import os
-import pickle
-import sys
 
 from OCP.gp import gp_Ax1
 from OCP.TopoDS import (
@@ -23,14 +20,13 @@ from OCP.TopoDS import (
 from OCP.TopLoc import TopLoc_Location
 
 from .sketch_factory_python import SketchFactoryPython
-from . import wrapper
+from .runtime_python import CADQUERY_REQUIREMENTS
 from . import logging as pc_logging
 
-sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
-from cq_serialize import register as register_cq_helper
-
 
 class SketchFactoryCadquery(SketchFactoryPython):
+    requirements = CADQUERY_REQUIREMENTS
+
     def __init__(
         self, ctx, source_project, target_project, config, can_create=False
     ):
@@ -71,14 +67,6 @@ class SketchFactoryCadquery(SketchFactoryPython):
                 )
                 return None
 
-            # Finish initialization of PythonRuntime
-            # which was too expensive to do in the constructor
-            await self.prepare_python()
-
-            # Get the path to the wrapper script
-            # which needs to be executed
-            wrapper_path = wrapper.get("cadquery.py")
-
             # Build the request
             request = {"build_parameters": {}}
             if "parameters" in self.config:
@@ -89,42 +77,18 @@ class SketchFactoryCadquery(SketchFactoryPython):
                 patch.update(self.config["patch"])
             request["patch"] = patch
 
-            # Serialize the request
-            register_cq_helper()
-            picklestring = pickle.dumps(request)
-            request_serialized = base64.b64encode(picklestring).decode()
-
-            await self.runtime.ensure("ocp-tessellate")
-            await self.runtime.ensure("cadquery")
-            await self.runtime.ensure("numpy==1.24.1")
-            await self.runtime.ensure("numpy-quaternion==2023.0.4")
-            await self.runtime.ensure("nptyping==1.24.1")
-            await self.runtime.ensure("typing_extensions>=4.6.0,<5")
-            cwd = self.project.config_dir
-            if self.cwd is not None:
-                cwd = os.path.join(self.project.config_dir, self.cwd)
-            response_serialized, errors = await self.runtime.run(
-                [
-                    wrapper_path,
-                    os.path.abspath(sketch.path),
-                    os.path.abspath(cwd),
-                ],
-                request_serialized,
+            result, errors = await self.run_wrapper(
+                "cadquery",
+                sketch,
+                request,
             )
             if len(errors) > 0:
                 error_lines = errors.split("\n")
                 for error_line in error_lines:
                     sketch.error("%s: %s" % (sketch.name, error_line))
 
-            try:
-                # pc_logging.error("Response: %s" % response_serialized)
-                response = base64.b64decode(response_serialized)
-                register_cq_helper()
-                result = pickle.loads(response)
-            except Exception as e:
-                sketch.error(
-                    "Exception while deserializing %s: %s" % (sketch.name, e)
-                )
+            if result is None:
+                sketch.error("Failed to get the result of %s" % sketch.name)
                 return None
 
             if not result["success"]:
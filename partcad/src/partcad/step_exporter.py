@@ -0,0 +1,132 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-16
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+# Assemblies are exported to STEP using the assembly structure of XCAF:
+# each part and each sub-assembly is written once and is referenced by
+# its instances with their locations. So the size of the file depends on the
+# number of unique parts rather than on the number of instances.
+
+from OCP.IFSelect import IFSelect_ReturnStatus
+from OCP.STEPCAFControl import STEPCAFControl_Writer
+from OCP.STEPControl import STEPControl_StepModelType
+from OCP.TCollection import TCollection_ExtendedString
+from OCP.TDataStd import TDataStd_Name
+from OCP.TDocStd import TDocStd_Document
+from OCP.TopLoc import TopLoc_Location
+from OCP.XCAFApp import XCAFApp_Application
+from OCP.XCAFDoc import XCAFDoc_DocumentTool
+
+
+class StepAssemblyNode:
+    """
+    A snapshot of an assembly taken in the event loop, so that the document
+    can be built in a different thread.
+    'children' is a list of (node or shape, name, location), where the
+    location (if any) replaces the location of the node or the shape.
+    """
+
+    def __init__(self, key, name, location):
+        self.key = key
+        self.name = name
+        self.location = location
+        self.children = []
+
+
+async def get_assembly_node(assembly, nodes=None):
+    """
+    Collects the tree of the assembly with all of the shapes instantiated.
+    Repeated sub-assemblies are collected once.
+    """
+    if nodes is None:
+        nodes = {}
+    if id(assembly) in nodes:
+        return nodes[id(assembly)]
+
+    location = None
+    if assembly.location is not None:
+        location = assembly.location.wrapped
+    node = StepAssemblyNode(id(assembly), assembly.name, location)
+    nodes[id(assembly)] = node
+
+    await assembly.do_instantiate()
+    for child in assembly.children:
+        item = child.item
+        if hasattr(item, "children"):
+            child_node = await get_assembly_node(item, nodes)
+        else:
+            child_node = (id(item), item.name, await item.get_wrapped())
+        # The location of the child replaces the one of the item (if any)
+        child_location = (
+            child.location.wrapped if child.location is not None else None
+        )
+        node.children.append((child_node, child.name, child_location))
+    return node
+
+
+def _set_name(label, name):
+    if name is not None:
+        TDataStd_Name.Set_s(label, TCollection_ExtendedString(str(name)))
+
+
+def build_document(node):
+    """Creates the XCAF document of the assembly tree."""
+    doc = TDocStd_Document(TCollection_ExtendedString("XmlXCAF"))
+    XCAFApp_Application.GetApplication_s().InitDocument(doc)
+    shape_tool = XCAFDoc_DocumentTool.ShapeTool_s(doc.Main())
+
+    labels = {}
+
+    def add_part(key, name, shape):
+        if key in labels:
+            return labels[key]
+        # The location of the shape itself goes to the instances
+        label = shape_tool.AddShape(shape.Located(TopLoc_Location()), False)
+        _set_name(label, name)
+        labels[key] = (label, shape.Location())
+        return labels[key]
+
+    def add_assembly(node):
+        if node.key in labels:
+            return labels[node.key]
+        label = shape_tool.NewShape()
+        _set_name(label, node.name)
+        for child, name, location in node.children:
+            if isinstance(child, StepAssemblyNode):
+                child_label, child_location = add_assembly(child)
+            else:
+                if child[2] is None:
+                    continue
+                child_label, child_location = add_part(*child)
+            if location is None:
+                location = child_location
+            component = shape_tool.AddComponent(label, child_label, location)
+            _set_name(component, name)
+        location = node.location
+        if location is None:
+            location = TopLoc_Location()
+        labels[node.key] = (label, location)
+        return labels[node.key]
+
+    root, location = add_assembly(node)
+    if not location.IsIdentity():
+        top = shape_tool.NewShape()
+        _set_name(top, node.name)
+        shape_tool.AddComponent(top, root, location)
+    shape_tool.UpdateAssemblies()
+    return doc
+
+
+def write_step(doc, filepath):
+    writer = STEPCAFControl_Writer()
+    writer.SetNameMode(True)
+    if not writer.Transfer(doc, STEPControl_StepModelType.STEPControl_AsIs):
+        raise Exception("Failed to transfer the assembly to STEP")
+    status = writer.Write(filepath)
+    if status != IFSelect_ReturnStatus.IFSelect_RetDone:
+        raise Exception("Failed to write %s: %s" % (filepath, status))
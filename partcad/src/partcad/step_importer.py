@@ -0,0 +1,142 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-09
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import cadquery as cq
+
+import asyncio
+import hashlib
+import os
+import sys
+import tempfile
+import threading
+
+from .cache import Cache, cache
+from . import logging as pc_logging
+from . import sync_threads as pc_thread
+from . import wrapper
+
+sys.path.append(os.path.join(os.path.dirname(__file__), "wrappers"))
+from cq_serialize import register as register_cq_helper
+
+# Files below both of these limits are imported in this process as starting
+# a request to another process costs more than importing them.
+MAX_INPROCESS_FILE_SIZE = 64 * 1024
+MAX_INPROCESS_ENTITIES = 2000
+
+# The number of STEP files imported by other processes simultaneously
+MAX_WORKERS = pc_thread.cpu_count + 1
+_workers = threading.BoundedSemaphore(MAX_WORKERS)
+
+
+class StepFileInfo:
+    """The content hash and the complexity estimate of a STEP file."""
+
+    def __init__(self, path):
+        self.size = os.path.getsize(path)
+
+        hasher = hashlib.sha256()
+        # Each STEP entity is terminated with a semicolon
+        self.entities = 0
+        with open(path, "rb") as f:
+            while True:
+                chunk = f.read(1048576)
+                if not chunk:
+                    break
+                hasher.update(chunk)
+                self.entities += chunk.count(b";")
+        self.hash = hasher.hexdigest()
+
+    def is_simple(self) -> bool:
+        return (
+            self.size < MAX_INPROCESS_FILE_SIZE
+            and self.entities < MAX_INPROCESS_ENTITIES
+        )
+
+
+def _import_inprocess(path):
+    # OCP does not release the GIL while importing, so all other Python
+    # threads are frozen until this is completed.
+    # This is why only small files are imported this way.
+    return cq.importers.importStep(path).val().wrapped
+
+
+async def _import_worker(ctx, path, cache_key):
+    # We don't care about customer preferences much here
+    # as this is expected to be hermetic.
+    # Stick to the version where CadQuery is known to work.
+    runtime = ctx.get_python_runtime("3.10")
+    await runtime.ensure("cadquery")
+
+    # The worker writes the BREP directly to a file that is then moved to
+    # the cache, so the shape is not serialized twice
+    fd, brep_path = tempfile.mkstemp(suffix=".brep")
+    os.close(fd)
+    try:
+        request = {"build_parameters": {}, "brep_path": brep_path}
+        register_cq_helper()
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, _workers.acquire)
+        try:
+            result, errors = await runtime.run_wrapper(
+                [
+                    wrapper.get("step.py"),
+                    os.path.abspath(path),
+                ],
+                request,
+            )
+        finally:
+            _workers.release()
+        sys.stderr.write(errors)
+
+        if result is None:
+            raise Exception("Failed to import %s" % path)
+        if not result["success"]:
+            raise Exception(result["exception"])
+
+        shape = None
+        if cache_key is not None:
+            cache.put_file("shape", cache_key, brep_path)
+            shape = cache.get_shape(cache_key)
+        if shape is None:
+            shape = Cache.read_shape(brep_path)
+        return shape
+    finally:
+        if os.path.exists(brep_path):
+            os.unlink(brep_path)
+
+
+async def import_step(ctx, path):
+    """
+    Imports the STEP file. Must be called from a dedicated thread (e.g. from
+    'instantiate()'). Small files are imported in this process, the rest
+    are sent to warm worker processes. The result is cached by the content
+    hash of the file.
+    """
+    # This is called from a dedicated thread, so blocking is fine here
+    info = StepFileInfo(path)
+
+    cache_key = None
+    if cache.enabled:
+        cache_key = Cache.hash("step", info.hash)
+        shape = cache.get_shape(cache_key)
+        if shape is not None:
+            return shape
+
+    if not info.is_simple():
+        try:
+            return await _import_worker(ctx, path, cache_key)
+        except Exception as e:
+            pc_logging.warning(
+                "Falling back to importing %s in this process: %s" % (path, e)
+            )
+
+    shape = _import_inprocess(path)
+    cache.put_shape(cache_key, shape)
+    return shape
@@ -7,6 +7,7 @@
 # Licensed under Apache License, Version 2.0.
 
 import asyncio
+import contextvars
 from concurrent.futures import ThreadPoolExecutor
 import os
 import sys
@@ -25,8 +26,11 @@ async def run(method, *args):
     if (
         sys.version_info[0] == 3 and sys.version_info[1] >= 10
     ) or sys.version_info[0] > 3:
+        # The context is not copied by '.run_in_executor()', but it is needed
+        # to nest the spans opened in the thread under the current one
+        context = contextvars.copy_context()
         return await asyncio.get_running_loop().run_in_executor(
-            executor, method, *args
+            executor, context.run, method, *args
         )
     else:
         # Python 3.9 and lower has a buggy '.run_in_executor()'.
@@ -40,8 +44,11 @@ async def run(method, *args):
 async def run_async(coroutine, *args):
     global executor
 
+    # See run()
+    context = contextvars.copy_context()
+
     def method():
-        return asyncio.run(coroutine(*args))
+        return context.run(asyncio.run, coroutine(*args))
 
     if (
         sys.version_info[0] == 3 and sys.version_info[1] >= 10
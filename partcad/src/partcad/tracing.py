@@ -0,0 +1,246 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-12
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+# Spans are recorded by 'pc_logging.Process' and 'pc_logging.Action' (and by
+# anything else using 'span()') once the tracer is enabled. They can be
+# exported as a Chrome trace (chrome://tracing, https://ui.perfetto.dev) or
+# as OpenTelemetry (OTLP) JSON.
+#
+# This module is imported by 'logging.py', so it must not import anything
+# from PartCAD.
+
+import contextvars
+import json
+import os
+import threading
+import time
+
+FORMAT_CHROME = "chrome"
+FORMAT_OTLP = "otlp"
+
+# The span that is active in the current thread or asyncio task
+_current = contextvars.ContextVar("partcad_span", default=None)
+
+
+class Span:
+    def __init__(self, id, parent, kind, op, package, item, attributes):
+        self.id = id
+        self.parent = parent
+        self.kind = kind
+        self.op = op
+        self.package = package
+        self.item = item
+        self.attributes = attributes
+
+        thread = threading.current_thread()
+        self.thread_id = thread.ident
+        self.thread_name = thread.name
+
+        self.start = time.time_ns()
+        self.end = None
+        self.error = None
+
+    @property
+    def name(self) -> str:
+        if self.item is None:
+            return "%s: %s" % (self.op, self.package)
+        return "%s: %s: %s" % (self.op, self.package, self.item)
+
+    def get_attributes(self) -> dict:
+        attributes = {"kind": self.kind, "op": self.op, "package": self.package}
+        if self.item is not None:
+            attributes["item"] = self.item
+        if self.error is not None:
+            attributes["error"] = self.error
+        attributes.update(self.attributes)
+        return attributes
+
+
+class Tracer:
+    def __init__(self):
+        self.enabled = False
+        self.lock = threading.Lock()
+        self.spans: list[Span] = []
+        self.next_id = 1
+        self.trace_id = os.urandom(16).hex()
+
+    def enable(self):
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def clear(self):
+        with self.lock:
+            self.spans = []
+
+    def start(self, kind, op, package, item=None, **attributes):
+        """Returns the started span and the token to restore the parent."""
+        if not self.enabled:
+            return None, None
+
+        with self.lock:
+            id = self.next_id
+            self.next_id += 1
+        parent = _current.get()
+        span = Span(
+            id,
+            None if parent is None else parent.id,
+            kind,
+            op,
+            package,
+            item,
+            attributes,
+        )
+        token = _current.set(span)
+        return span, token
+
+    def end(self, span, token, error=None):
+        if span is None:
+            return
+        span.end = time.time_ns()
+        if error is not None:
+            span.error = str(error)
+        try:
+            _current.reset(token)
+        except ValueError:
+            # The span is ended in a different context (e.g. another task)
+            pass
+        with self.lock:
+            self.spans.append(span)
+
+    def to_chrome(self) -> dict:
+        with self.lock:
+            spans = list(self.spans)
+
+        pid = os.getpid()
+        events = []
+        threads = {}
+        for span in spans:
+            threads[span.thread_id] = span.thread_name
+            args = span.get_attributes()
+            args["id"] = span.id
+            if span.parent is not None:
+                args["parent"] = span.parent
+            events.append(
+                {
+                    "name": span.name,
+                    "cat": span.kind,
+                    "ph": "X",
+                    "ts": span.start / 1000.0,
+                    "dur": (span.end - span.start) / 1000.0,
+                    "pid": pid,
+                    "tid": span.thread_id,
+                    "args": args,
+                }
+            )
+        for thread_id, thread_name in threads.items():
+            events.append(
+                {
+                    "name": "thread_name",
+                    "ph": "M",
+                    "pid": pid,
+                    "tid": thread_id,
+                    "args": {"name": thread_name},
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def to_otlp(self, version=None) -> dict:
+        with self.lock:
+            spans = list(self.spans)
+
+        def attribute(key, value):
+            if isinstance(value, bool):
+                return {"key": key, "value": {"boolValue": value}}
+            if isinstance(value, int):
+                return {"key": key, "value": {"intValue": str(value)}}
+            if isinstance(value, float):
+                return {"key": key, "value": {"doubleValue": value}}
+            return {"key": key, "value": {"stringValue": str(value)}}
+
+        def span_id(id):
+            return "%016x" % id
+
+        otlp_spans = []
+        for span in spans:
+            attributes = span.get_attributes()
+            attributes["thread.id"] = span.thread_id
+            attributes["thread.name"] = span.thread_name
+            otlp_span = {
+                "traceId": self.trace_id,
+                "spanId": span_id(span.id),
+                "name": span.name,
+                # SPAN_KIND_INTERNAL
+                "kind": 1,
+                "startTimeUnixNano": str(span.start),
+                "endTimeUnixNano": str(span.end),
+                "attributes": list(
+                    map(lambda i: attribute(*i), attributes.items())
+                ),
+                # STATUS_CODE_ERROR or STATUS_CODE_UNSET
+                "status": {"code": 2 if span.error is not None else 0},
+            }
+            if span.parent is not None:
+                otlp_span["parentSpanId"] = span_id(span.parent)
+            otlp_spans.append(otlp_span)
+
+        resource = [attribute("service.name", "partcad")]
+        if version is not None:
+            resource.append(attribute("service.version", version))
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": resource},
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "partcad"},
+                            "spans": otlp_spans,
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def save(self, path, format=FORMAT_CHROME, version=None):
+        if format == FORMAT_OTLP:
+            data = self.to_otlp(version)
+        else:
+            data = self.to_chrome()
+        with open(path, "w") as f:
+            json.dump(data, f)
+
+
+tracer = Tracer()
+
+
+class span(object):
+    """Records a span around the block if tracing is enabled."""
+
+    def __init__(self, op: str, package: str, item: str = None, **attributes):
+        self.op = op
+        self.package = package
+        self.item = item
+        self.attributes = attributes
+        self.span = None
+        self.token = None
+
+    async def __aenter__(self):
+        self.__enter__()
+
+    def __enter__(self):
+        self.span, self.token = tracer.start(
+            "span", self.op, self.package, self.item, **self.attributes
+        )
+
+    async def __aexit__(self, *args):
+        self.__exit__(*args)
+
+    def __exit__(self, _type, value, _traceback):
+        tracer.end(self.span, self.token, value)
@@ -59,6 +59,154 @@ class UserConfig:
         else:
             self.internal_state_dir = UserConfig.get_config_dir()
 
+        # option: cache
+        # description: persist build artifacts (e.g. instantiated shapes)
+        #              in the internal state directory to reuse them later
+        # values: [True | False]
+        # default: True
+        if "cache" in self.config_obj:
+            self.cache = bool(self.config_obj["cache"])
+        else:
+            self.cache = True
+
+        # option: cacheMaxSize
+        # description: the size limit of the persistent cache in megabytes,
+        #              least recently used artifacts are evicted first
+        # values: <integer>
+        # default: 1024
+        if "cacheMaxSize" in self.config_obj:
+            self.cache_max_size = int(self.config_obj["cacheMaxSize"]) * 1048576
+        else:
+            self.cache_max_size = 1024 * 1048576
+
+        # option: shapeMemoryLimit
+        # description: the limit of the memory used by the instantiated
+        #              shapes in megabytes, least recently used shapes are
+        #              evicted and restored from the cache when needed
+        #              (0 means no limit)
+        # values: <integer>
+        # default: 0
+        if "shapeMemoryLimit" in self.config_obj:
+            self.shape_memory_limit = (
+                int(self.config_obj["shapeMemoryLimit"]) * 1048576
+            )
+        else:
+            self.shape_memory_limit = 0
+
+        # option: pngExporter
+        # description: the way to produce PNG images: convert the SVG files
+        #              using reportlab, or rasterize the projected edges
+        #              using NumPy (faster)
+        # values: [reportlab | numpy]
+        # default: reportlab
+        if "pngExporter" in self.config_obj:
+            self.png_exporter = self.config_obj["pngExporter"]
+        else:
+            self.png_exporter = "reportlab"
+
+        # option: cacheCompression
+        # description: the compression of the cached shapes ("auto" picks
+        #              zstd or lz4 if installed, zlib otherwise)
+        # values: [auto | none | zlib | zstd | lz4]
+        # default: auto
+        if "cacheCompression" in self.config_obj:
+            self.cache_compression = self.config_obj["cacheCompression"]
+        else:
+            self.cache_compression = "auto"
+
+        # option: pythonWorkers
+        # description: keep the Python wrapper processes running between
+        #              the requests to avoid paying the start-up cost
+        #              (importing CadQuery, build123d, OCP) every time
+        # values: [True | False]
+        # default: True
+        if "pythonWorkers" in self.config_obj:
+            self.python_workers = self.config_obj["pythonWorkers"]
+        else:
+            self.python_workers = True
+
+        # option: pythonWorkerMaxJobs
+        # description: the number of requests after which a Python wrapper
+        #              process is recycled
+        # values: <integer>
+        # default: 50
+        if "pythonWorkerMaxJobs" in self.config_obj:
+            self.python_worker_max_jobs = int(
+                self.config_obj["pythonWorkerMaxJobs"]
+            )
+        else:
+            self.python_worker_max_jobs = 50
+
+        # option: pythonWorkerMaxMemory
+        # description: the memory usage in megabytes after which a Python
+        #              wrapper process is recycled
+        # values: <integer>
+        # default: 2048
+        if "pythonWorkerMaxMemory" in self.config_obj:
+            self.python_worker_max_memory = (
+                int(self.config_obj["pythonWorkerMaxMemory"]) * 1048576
+            )
+        else:
+            self.python_worker_max_memory = 2048 * 1048576
+
+        # option: pythonTimeout
+        # description: the time in seconds after which a Python script (e.g.
+        #              a CadQuery part) is killed, 0 for no limit.
+        #              Shapes can override it in 'limits: { timeout: ... }'
+        # values: <integer>
+        # default: 600
+        if "pythonTimeout" in self.config_obj:
+            self.python_timeout = int(self.config_obj["pythonTimeout"])
+        else:
+            self.python_timeout = 600
+
+        # option: pythonMemoryLimit
+        # description: the address space in megabytes a Python script may use,
+        #              0 for no limit.
+        #              Shapes can override it in 'limits: { memory: ... }'
+        # values: <integer>
+        # default: 0
+        if "pythonMemoryLimit" in self.config_obj:
+            self.python_memory_limit = (
+                int(self.config_obj["pythonMemoryLimit"]) * 1048576
+            )
+        else:
+            self.python_memory_limit = 0
+
+        # option: pythonCpuLimit
+        # description: the CPU time in seconds a Python script may use,
+        #              0 for no limit.
+        #              Shapes can override it in 'limits: { cpu: ... }'
+        # values: <integer>
+        # default: 0
+        if "pythonCpuLimit" in self.config_obj:
+            self.python_cpu_limit = int(self.config_obj["pythonCpuLimit"])
+        else:
+            self.python_cpu_limit = 0
+
+        # option: pythonTemplates
+        # description: create new conda environments by cloning a template
+        #              with CadQuery and build123d preinstalled instead of
+        #              installing everything from scratch
+        # values: [True | False]
+        # default: True
+        if "pythonTemplates" in self.config_obj:
+            self.python_templates = self.config_obj["pythonTemplates"]
+        else:
+            self.python_templates = True
+
+        # option: pythonExecution
+        # description: where CadQuery and build123d scripts are executed:
+        #              in a sandboxed Python runtime or in the interpreter
+        #              PartCAD is running in (for trusted packages only).
+        #              Packages and shapes can override it in 'execution'
+        # values: [subprocess | inprocess]
+        # default: subprocess
+        if "pythonExecution" in self.config_obj:
+            self.python_execution = self.config_obj["pythonExecution"]
+        else:
+            self.python_execution = "subprocess"
+
         # option: forceUpdate
         # description: update all repositories even if they are fresh
         # values: [True | False]
@@ -0,0 +1,219 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-15
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+# This script contains the binary encoding of OCCT shapes used to pass them
+# between PartCAD and the wrapper scripts and to store them in the cache.
+# It is shared by PartCAD and the wrapper scripts, so it must not depend on
+# anything but the standard library and OCP. 'zstandard' and 'lz4' are used
+# for compression if they are installed.
+#
+# The encoded shape is a fixed-size header followed by the payload (the
+# shape in the binary BREP format of BinTools, optionally compressed).
+# The header carries the shape type, the bounding box and the hash of the
+# payload, so that they can be retrieved without decoding the shape.
+#
+# The text BREP format used by the earlier versions of PartCAD is still
+# accepted by 'decode()'.
+
+import hashlib
+from io import BytesIO
+import struct
+import zlib
+
+from OCP.BinTools import BinTools, BinTools_FormatVersion
+from OCP.Bnd import Bnd_Box
+from OCP.BRep import BRep_Builder
+from OCP.BRepBndLib import BRepBndLib
+from OCP.BRepTools import BRepTools
+from OCP.TopoDS import TopoDS_Shape
+
+MAGIC = b"PCBR"
+VERSION = 1
+
+# magic, version, compression, shape type, flags, bounding box (xmin, ymin,
+# zmin, xmax, ymax, zmax), payload hash (sha256), uncompressed payload size
+HEADER = struct.Struct("<4sBBBB6d32sQ")
+
+FLAG_TRIANGLES = 1
+FLAG_BBOX = 2
+
+COMPRESSION_NONE = "none"
+COMPRESSION_ZLIB = "zlib"
+COMPRESSION_ZSTD = "zstd"
+COMPRESSION_LZ4 = "lz4"
+# The best one available
+COMPRESSION_AUTO = "auto"
+
+_COMPRESSION_IDS = {
+    COMPRESSION_NONE: 0,
+    COMPRESSION_ZLIB: 1,
+    COMPRESSION_ZSTD: 2,
+    COMPRESSION_LZ4: 3,
+}
+_COMPRESSION_NAMES = {v: k for k, v in _COMPRESSION_IDS.items()}
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:
+    lz4_frame = None
+
+
+def get_compressions() -> list:
+    """Returns the compression methods available in this environment."""
+    compressions = [COMPRESSION_NONE, COMPRESSION_ZLIB]
+    if zstandard is not None:
+        compressions.append(COMPRESSION_ZSTD)
+    if lz4_frame is not None:
+        compressions.append(COMPRESSION_LZ4)
+    return compressions
+
+
+def _resolve_compression(compression):
+    if compression is None:
+        return COMPRESSION_NONE
+    if compression == COMPRESSION_AUTO:
+        if zstandard is not None:
+            return COMPRESSION_ZSTD
+        if lz4_frame is not None:
+            return COMPRESSION_LZ4
+        return COMPRESSION_ZLIB
+    if compression not in get_compressions():
+        raise ValueError("Compression is not available: %s" % compression)
+    return compression
+
+
+def _compress(compression, data):
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(data, 1)
+    if compression == COMPRESSION_ZSTD:
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    if compression == COMPRESSION_LZ4:
+        return lz4_frame.compress(data)
+    return data
+
+
+def _decompress(compression, data, size):
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    if compression == COMPRESSION_ZSTD:
+        if zstandard is None:
+            raise ValueError("'zstandard' is required to decode the shape")
+        return zstandard.ZstdDecompressor().decompress(
+            data, max_output_size=size
+        )
+    if compression == COMPRESSION_LZ4:
+        if lz4_frame is None:
+            raise ValueError("'lz4' is required to decode the shape")
+        return lz4_frame.decompress(data)
+    return data
+
+
+def write_payload(shape, with_triangles=True) -> bytes:
+    """Returns the shape in the binary BREP format."""
+    with BytesIO() as bio:
+        BinTools.Write_s(
+            shape,
+            bio,
+            with_triangles,
+            False,
+            BinTools_FormatVersion.BinTools_FormatVersion_CURRENT,
+        )
+        return bio.getvalue()
+
+
+def get_bbox(shape):
+    """Returns (xmin, ymin, zmin, xmax, ymax, zmax) or None if empty."""
+    box = Bnd_Box()
+    BRepBndLib.Add_s(shape, box, True)
+    if box.IsVoid():
+        return None
+    lo = box.CornerMin()
+    hi = box.CornerMax()
+    return (lo.X(), lo.Y(), lo.Z(), hi.X(), hi.Y(), hi.Z())
+
+
+def encode(shape, compression=COMPRESSION_NONE, with_triangles=True) -> bytes:
+    """Encodes the OCCT shape."""
+    compression = _resolve_compression(compression)
+    payload = write_payload(shape, with_triangles)
+    digest = hashlib.sha256(payload).digest()
+
+    flags = FLAG_TRIANGLES if with_triangles else 0
+    bbox = None
+    if not shape.IsNull():
+        bbox = get_bbox(shape)
+    if bbox is not None:
+        flags |= FLAG_BBOX
+    else:
+        bbox = (0.0,) * 6
+    shape_type = 0xFF if shape.IsNull() else int(shape.ShapeType())
+
+    header = HEADER.pack(
+        MAGIC,
+        VERSION,
+        _COMPRESSION_IDS[compression],
+        shape_type,
+        flags,
+        *bbox,
+        digest,
+        len(payload),
+    )
+    return header + _compress(compression, payload)
+
+
+def is_encoded(data) -> bool:
+    return len(data) >= HEADER.size and bytes(data[: len(MAGIC)]) == MAGIC
+
+
+def read_header(data) -> dict:
+    """
+    Returns the properties of the encoded shape without decoding it, or None
+    if the data is not produced by 'encode()'.
+    """
+    if not is_encoded(data):
+        return None
+    values = HEADER.unpack_from(data)
+    _, version, compression, shape_type, flags = values[:5]
+    if version > VERSION:
+        raise ValueError("Unsupported encoding version: %d" % version)
+    return {
+        "version": version,
+        "compression": _COMPRESSION_NAMES[compression],
+        "shape_type": None if shape_type == 0xFF else shape_type,
+        "triangles": bool(flags & FLAG_TRIANGLES),
+        "bbox": values[5:11] if flags & FLAG_BBOX else None,
+        "hash": values[11].hex(),
+        "size": values[12],
+    }
+
+
+def decode(data) -> TopoDS_Shape:
+    """
+    Decodes the shape produced by 'encode()' or stored in the text BREP
+    format. The result is not downcast.
+    """
+    shape = TopoDS_Shape()
+    header = read_header(data)
+    if header is None:
+        # The legacy text format
+        with BytesIO(data) as bio:
+            BRepTools.Read_s(shape, bio, BRep_Builder())
+        return shape
+
+    payload = _decompress(
+        header["compression"], memoryview(data)[HEADER.size :], header["size"]
+    )
+    with BytesIO(payload) as bio:
+        BinTools.Read_s(shape, bio)
+    return shape
@@ -52,6 +52,7 @@ license:
 
 import copyreg
 from io import BytesIO
+import pickle
 from typing import Any
 
 import cadquery as cq
@@ -75,6 +76,8 @@ from OCP.TopoDS import (
 
 import OCP.TopAbs as ta
 
+import brep_codec
+
 downcast_LUT = {
     ta.TopAbs_VERTEX: TopoDS.Vertex_s,
     ta.TopAbs_EDGE: TopoDS.Edge_s,
@@ -111,29 +114,44 @@ def downcast(obj: TopoDS_Shape) -> TopoDS_Shape:
     return return_value
 
 
+class BrepData:
+    """
+    BREP bytes that are pickled out-of-band when protocol 5 is used
+    with a buffer callback, so that large shapes are not copied into the
+    pickle stream.
+    """
+
+    def __init__(self, data):
+        self.data = data
+
+    def __reduce_ex__(self, protocol):
+        if protocol >= 5:
+            return BrepData, (pickle.PickleBuffer(self.data),)
+        return BrepData, (bytes(self.data),)
+
+
+def _get_data(data):
+    if isinstance(data, BrepData):
+        return data.data
+    return data
+
+
+# Shapes are sent in the binary BREP format (see brep_codec.py) without
+# compression as the pipes are local
 def _inflate_shape(data: bytes):
-    with BytesIO(data) as bio:
-        return cq.Shape.importBrep(bio)
+    return cq.Shape.cast(brep_codec.decode(_get_data(data)))
 
 
 def _reduce_shape(shape: cq.Shape):
-    with BytesIO() as stream:
-        shape.exportBrep(stream)
-        return _inflate_shape, (stream.getvalue(),)
+    return _inflate_shape, (BrepData(brep_codec.encode(shape.wrapped)),)
 
 
 def _inflate_topods(data: bytes):
-    with BytesIO(data) as bio:
-        shape = TopoDS_Shape()
-        builder = OCP.BRep.BRep_Builder()
-        OCP.BRepTools.BRepTools.Read_s(shape, bio, builder)
-        return downcast(shape)
+    return downcast(brep_codec.decode(_get_data(data)))
 
 
 def _reduce_topods(shape):
-    with BytesIO() as bio:
-        OCP.BRepTools.BRepTools.Write_s(shape, bio)
-        return _inflate_topods, (bio.getvalue(),)
+    return _inflate_topods, (BrepData(brep_codec.encode(shape)),)
 
 
 def _inflate_transform(*values: float):
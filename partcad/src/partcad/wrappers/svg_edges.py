@@ -0,0 +1,80 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-17
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+# This script contains the format of the "edges" files written next to the
+# SVG files by 'wrapper_render_svg.py'. They contain the visible edges of the
+# projection as 2D line segments, so that the raster images can be produced
+# without parsing the SVG files (see 'plugin_export_png_numpy.py').
+# It is shared by PartCAD and the wrapper scripts, so it must not depend on
+# anything but the standard library and OCP.
+#
+# The file is a header (magic, the number of segments) followed by the
+# segments as float32 (x0, y0, x1, y1), Y pointing up.
+
+from array import array
+import struct
+import sys
+
+from OCP.BRepAdaptor import BRepAdaptor_Curve
+from OCP.GCPnts import GCPnts_TangentialDeflection
+
+MAGIC = b"PCEDGES1"
+HEADER = struct.Struct("<8sI")
+
+EXTENSION = ".edges"
+
+
+def get_path(svg_path: str) -> str:
+    return svg_path + EXTENSION
+
+
+def discretize(edges, deflection: float, angular_deflection=0.1) -> array:
+    """
+    Returns the segments approximating the projected edges (TopoDS_Edge
+    objects) with the given deflection.
+    """
+    segments = array("f")
+    for edge in edges:
+        try:
+            curve = BRepAdaptor_Curve(edge)
+            points = GCPnts_TangentialDeflection(
+                curve, angular_deflection, deflection
+            )
+        except Exception:
+            continue
+        previous = None
+        for i in range(1, points.NbPoints() + 1):
+            point = points.Value(i)
+            current = (point.X(), point.Y())
+            if previous is not None:
+                segments.extend(previous + current)
+            previous = current
+    return segments
+
+
+def write(path: str, segments: array):
+    with open(path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, len(segments) // 4))
+        if sys.byteorder != "little":
+            segments = array("f", segments)
+            segments.byteswap()
+        segments.tofile(f)
+
+
+def read(path: str) -> bytes:
+    """Returns the raw float32 (little-endian) data of the segments."""
+    with open(path, "rb") as f:
+        data = f.read()
+    magic, count = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not an edges file: %s" % path)
+    payload = data[HEADER.size :]
+    if len(payload) != count * 16:
+        raise ValueError("Truncated edges file: %s" % path)
+    return payload
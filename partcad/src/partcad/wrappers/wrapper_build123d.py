@@ -180,9 +180,6 @@ def process(path, request):
     }
 
 
-path, request = wrapper_common.handle_input()
-
-# Call build123d through CQGI
-model = process(path, request)
-
-wrapper_common.handle_output(model)
+if __name__ == "__main__":
+    # Call build123d through CQGI
+    wrapper_common.main(process)
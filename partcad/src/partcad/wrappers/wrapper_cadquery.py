@@ -82,9 +82,6 @@ def process(path, request):
     }
 
 
-path, request = wrapper_common.handle_input()
-
-# Call CadQuery
-model = process(path, request)
-
-wrapper_common.handle_output(model)
+if __name__ == "__main__":
+    # Call CadQuery
+    wrapper_common.main(process)
@@ -9,14 +9,25 @@
 
 # This script contains code shared by all wrapper scripts.
 
-import base64
-
 # import fcntl  # TODO(clairbee): replace it with whatever works on Windows if needed
+import io
 import os
-import pickle
 import sys
+import traceback
 
 from cq_serialize import register as register_cq_helper
+import wrapper_ipc
+
+
+def reserve_stdout():
+    """
+    Reserves stdout for the binary protocol and sends any output of the
+    scripts (e.g. "print()") to stderr instead. Returns the protocol stream.
+    """
+    sys.stdout.flush()
+    proto_out = os.fdopen(os.dup(sys.stdout.fileno()), "wb")
+    os.dup2(sys.stderr.fileno(), sys.stdout.fileno())
+    return proto_out
 
 
 def handle_input():
@@ -33,25 +44,176 @@ def handle_input():
     # #   - Make stdin blocking so that we can read until EOF
     # flag = fcntl.fcntl(sys.stdin, fcntl.F_GETFL)
     # fcntl.fcntl(sys.stdin, fcntl.F_SETFL, flag & ~os.O_NONBLOCK)
-    #   - Read until EOF
-    input_str = sys.stdin.read()
-    #   - Unpack the content received via stdin
+    #   - Read the binary message
+    register_cq_helper()
+    message = wrapper_ipc.read_message(sys.stdin.buffer)
+    # The limits are applied here rather than when the process is started
+    set_limits(message.get("limits", None) or {})
+    return path, message["request"]
 
-    # TODO(clairbee): is .encode() needed here?
-    request_bytes = base64.b64decode(input_str)
 
+def handle_output(model, proto_out):
+    # Serialize the output
     register_cq_helper()
-    request = pickle.loads(request_bytes)
-    return path, request
+    wrapper_ipc.write_message(proto_out, model)
 
 
-def handle_output(model):
-    # Serialize the output
+def get_rss():
+    """Returns the memory used by this process in bytes (0 if unknown)."""
+    try:
+        with open("/proc/self/statm", "r") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except Exception:
+        pass
+    try:
+        import resource
+
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux reports kilobytes while macOS reports bytes
+        return rss if sys.platform == "darwin" else rss * 1024
+    except Exception:
+        return 0
+
+
+def get_peak_rss():
+    """Returns the peak memory used by this process in bytes (0 if unknown)."""
+    try:
+        # Unlike 'ru_maxrss', it does not include the memory of the parent
+        # process at the time this process was started
+        with open("/proc/self/status", "r") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) * 1024
+    except Exception:
+        pass
+    return 0
+
+
+def set_limits(limits):
+    """
+    Applies the CPU time and memory limits of a single request to this
+    process. Returns the previous limits to be restored by 'reset_limits()'.
+    """
+    try:
+        import resource
+    except ImportError:
+        # Not supported on this platform
+        return {}
+
+    saved = {}
+    if limits.get("cpu", None):
+        # The limit is cumulative for the process, so count from now
+        usage = resource.getrusage(resource.RUSAGE_SELF)
+        used = int(usage.ru_utime + usage.ru_stime) + 1
+        saved[resource.RLIMIT_CPU] = resource.getrlimit(resource.RLIMIT_CPU)
+        soft, hard = saved[resource.RLIMIT_CPU]
+        soft = used + limits["cpu"]
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_CPU, (soft, hard))
+    if limits.get("memory", None):
+        saved[resource.RLIMIT_AS] = resource.getrlimit(resource.RLIMIT_AS)
+        soft, hard = saved[resource.RLIMIT_AS]
+        soft = limits["memory"]
+        if hard != resource.RLIM_INFINITY:
+            soft = min(soft, hard)
+        resource.setrlimit(resource.RLIMIT_AS, (soft, hard))
+    return saved
+
+
+def reset_limits(saved):
+    if saved:
+        import resource
+
+        for limit, value in saved.items():
+            resource.setrlimit(limit, value)
+
+
+def is_environment_module(module):
+    """
+    Checks whether the module is installed in the Python environment (as
+    opposed to being loaded from a package that is being processed).
+    """
+    filename = getattr(module, "__file__", None)
+    if filename is None:
+        return True
+    filename = os.path.abspath(filename)
+    for prefix in set([sys.prefix, sys.base_prefix, sys.exec_prefix]):
+        if filename.startswith(os.path.abspath(prefix) + os.sep):
+            return True
+    return filename.startswith(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve(process):
+    """
+    Keeps processing requests received over stdin until it is closed.
+    This allows PartCAD to reuse the process (with all of the heavy modules
+    already imported) for many requests.
+    """
+    proto_in = sys.stdin.buffer
+    proto_out = reserve_stdout()
     register_cq_helper()
-    picklestring = pickle.dumps(model)
-    response = base64.b64encode(picklestring)
-    sys.stdout.write(response.decode())
-    sys.stdout.flush()
+
+    initial_cwd = os.getcwd()
+    initial_path = list(sys.path)
+    initial_modules = set(sys.modules.keys())
+    initial_stderr = sys.stderr
+
+    while True:
+        message = wrapper_ipc.read_message(proto_in)
+        if message is None:
+            # PartCAD closed the pipe
+            break
+        argv = message["argv"]
+
+        errors = io.StringIO()
+        sys.stderr = errors
+        response = None
+        saved_limits = {}
+        try:
+            saved_limits = set_limits(message.get("limits", None) or {})
+            path = os.path.normpath(argv[0])
+            if len(argv) > 1:
+                os.chdir(os.path.normpath(argv[1]))
+            response = process(path, message["request"])
+        except (Exception, SystemExit):
+            traceback.print_exc(file=errors)
+        finally:
+            reset_limits(saved_limits)
+            sys.stderr = initial_stderr
+
+            # Make sure the next request starts with a clean slate
+            os.chdir(initial_cwd)
+            sys.path[:] = initial_path
+            for module_name in set(sys.modules.keys()) - initial_modules:
+                if not is_environment_module(sys.modules[module_name]):
+                    del sys.modules[module_name]
+
+        reply = {
+            "response": response,
+            "stderr": errors.getvalue(),
+            "rss": get_rss(),
+            "peak_rss": get_peak_rss(),
+        }
+        try:
+            chunks = wrapper_ipc.encode(reply)
+        except Exception:
+            traceback.print_exc(file=errors)
+            reply["response"] = None
+            reply["stderr"] = errors.getvalue()
+            chunks = wrapper_ipc.encode(reply)
+        wrapper_ipc.write_encoded(proto_out, chunks)
+
+
+def main(process):
+    if len(sys.argv) > 1 and sys.argv[1] == "--serve":
+        serve(process)
+        return
+
+    proto_out = reserve_stdout()
+    path, request = handle_input()
+    model = process(path, request)
+    handle_output(model, proto_out)
 
 
 def handle_exception(exc, cqscript=None):
@@ -0,0 +1,157 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-06
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+# This script contains the binary protocol used to exchange messages
+# with the wrapper processes over pipes. It is shared by PartCAD and
+# the wrapper scripts, so it must not depend on anything but the standard
+# library.
+#
+# Messages are pickled using protocol 5. Out-of-band buffers (e.g. numpy
+# arrays) are sent as separate chunks right after the pickle so that they are
+# never copied into it. Large messages are not pushed through the pipe at all:
+# they are written to a temporary file (in memory where possible) and only
+# the path is sent.
+
+import io
+import os
+import pickle
+import struct
+import tempfile
+
+# Each frame is prefixed with its length (unsigned 64-bit, little-endian)
+FRAME_HEADER = struct.Struct("<Q")
+# Each message starts with the number of chunks followed by their sizes
+CHUNK_COUNT = struct.Struct("<I")
+CHUNK_SIZE = struct.Struct("<Q")
+
+MESSAGE_INLINE = b"M"
+MESSAGE_FILE = b"F"
+
+# Messages above this size are handed off via a temporary file
+FILE_HANDOFF_THRESHOLD = 64 * 1048576
+
+
+def write_frame(stream, *chunks):
+    size = sum(map(lambda c: memoryview(c).nbytes, chunks))
+    stream.write(FRAME_HEADER.pack(size))
+    for chunk in chunks:
+        stream.write(chunk)
+    stream.flush()
+
+
+def _read_exactly(stream, size):
+    chunks = []
+    remaining = size
+    while remaining > 0:
+        chunk = stream.read(remaining)
+        if not chunk:
+            return None
+        chunks.append(chunk)
+        remaining -= len(chunk)
+    if len(chunks) == 1:
+        return chunks[0]
+    return b"".join(chunks)
+
+
+def read_frame(stream):
+    """Returns the payload of the next frame or None if the stream is closed."""
+    header = _read_exactly(stream, FRAME_HEADER.size)
+    if header is None:
+        return None
+    (size,) = FRAME_HEADER.unpack(header)
+    if size == 0:
+        return b""
+    return _read_exactly(stream, size)
+
+
+def encode(obj):
+    """Returns the list of chunks representing the object."""
+    buffers = []
+    main = pickle.dumps(obj, protocol=5, buffer_callback=buffers.append)
+    chunks = [main] + [b.raw() for b in buffers]
+
+    header = CHUNK_COUNT.pack(len(chunks)) + b"".join(
+        map(lambda c: CHUNK_SIZE.pack(memoryview(c).nbytes), chunks)
+    )
+    return [header] + chunks
+
+
+def decode(data):
+    """Restores the object from the concatenated chunks."""
+    data = memoryview(data)
+    (count,) = CHUNK_COUNT.unpack_from(data, 0)
+    offset = CHUNK_COUNT.size + count * CHUNK_SIZE.size
+
+    chunks = []
+    for i in range(count):
+        (size,) = CHUNK_SIZE.unpack_from(
+            data, CHUNK_COUNT.size + i * CHUNK_SIZE.size
+        )
+        chunks.append(data[offset : offset + size])
+        offset += size
+    return pickle.loads(chunks[0], buffers=chunks[1:])
+
+
+def _get_handoff_dir():
+    # Prefer a memory-backed file system where it is available
+    if os.path.isdir("/dev/shm") and os.access("/dev/shm", os.W_OK):
+        return "/dev/shm"
+    return None
+
+
+def write_encoded(stream, chunks, threshold=None):
+    if threshold is None:
+        threshold = FILE_HANDOFF_THRESHOLD
+    size = sum(map(lambda c: memoryview(c).nbytes, chunks))
+
+    if size <= threshold:
+        write_frame(stream, MESSAGE_INLINE, *chunks)
+        return
+
+    # The receiving side is responsible for removing the file
+    fd, path = tempfile.mkstemp(prefix="partcad-ipc-", dir=_get_handoff_dir())
+    with os.fdopen(fd, "wb") as f:
+        for chunk in chunks:
+            f.write(chunk)
+    write_frame(stream, MESSAGE_FILE, path.encode())
+
+
+def write_message(stream, obj, threshold=None):
+    write_encoded(stream, encode(obj), threshold)
+
+
+def read_message(stream):
+    """Returns the next object or None if the stream is closed."""
+    frame = read_frame(stream)
+    if frame is None or len(frame) == 0:
+        return None
+
+    kind = frame[:1]
+    if kind == MESSAGE_FILE:
+        path = frame[1:].decode()
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+        finally:
+            os.unlink(path)
+        return decode(data)
+    return decode(memoryview(frame)[1:])
+
+
+def pack_message(obj, threshold=None) -> bytes:
+    """Returns the message as bytes to be written to a pipe at once."""
+    with io.BytesIO() as stream:
+        write_message(stream, obj, threshold)
+        return stream.getvalue()
+
+
+def unpack_message(data: bytes):
+    """Restores the object from the bytes read from a pipe at once."""
+    with io.BytesIO(data) as stream:
+        return read_message(stream)
@@ -42,9 +42,6 @@ def process(path, request):
     return output
 
 
-path, request = wrapper_common.handle_input()
-
-# Call the API endpoint
-result = process(path, request)
-
-wrapper_common.handle_output(result)
+if __name__ == "__main__":
+    # Call the API endpoint
+    wrapper_common.main(process)
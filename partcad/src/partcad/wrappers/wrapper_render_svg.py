@@ -16,51 +16,87 @@ import sys
 import build123d as b3d
 
 sys.path.append(os.path.dirname(__file__))
+import svg_edges
 import wrapper_common
 
 
-def process(path, request):
+def render_view(
+    b3d_obj,
+    path,
+    viewport_origin,
+    viewport_up,
+    line_weight,
+    edges_path=None,
+):
+    visible, hidden = b3d_obj.project_to_viewport(
+        viewport_origin=tuple(viewport_origin),
+        viewport_up=tuple(viewport_up),
+    )
+    # visible = b3d_obj.project_to_viewport(
+    #     viewport_origin=viewport_origin,
+    #     ignore_hidden=True,
+    # )[0]
+    max_dimension = max(
+        # *b3d.Compound(children=visible + hidden)
+        *b3d.Compound(children=visible)
+        .bounding_box()
+        .size
+    )
+    if max_dimension == 0:
+        max_dimension = 4
+    scale = 512.0 / max_dimension
+    exporter = b3d.ExportSVG(
+        scale=scale,
+        precision=10,
+    )
+    exporter.add_layer(
+        "Visible",
+        line_color=(64, 192, 64),
+        line_weight=line_weight,
+    )
+    # exporter.add_layer(
+    #     "Hidden",
+    #     line_color=(32, 64, 32),
+    #     line_type=b3d.LineType.ISO_DOT,
+    # )
     try:
-        b3d_obj = b3d.Solid.make_box(1, 1, 1)
-        b3d_obj.wrapped = request["wrapped"]
+        exporter.add_shape(visible, layer="Visible")
+        # exporter.add_shape(hidden, layer="Hidden")
+    except:
+        pass
+    exporter.write(path)
 
-        viewport_origin = tuple(request["viewport_origin"])
-        visible, hidden = b3d_obj.project_to_viewport(
-            viewport_origin=viewport_origin
-        )
-        # visible = b3d_obj.project_to_viewport(
-        #     viewport_origin=viewport_origin,
-        #     ignore_hidden=True,
-        # )[0]
-        max_dimension = max(
-            # *b3d.Compound(children=visible + hidden)
-            *b3d.Compound(children=visible)
-            .bounding_box()
-            .size
-        )
-        if max_dimension == 0:
-            max_dimension = 4
-        scale = 512.0 / max_dimension
-        exporter = b3d.ExportSVG(
-            scale=scale,
-            precision=10,
+    if edges_path is not None:
+        segments = svg_edges.discretize(
+            map(lambda e: e.wrapped, visible), max_dimension / 2000.0
         )
-        exporter.add_layer(
-            "Visible",
-            line_color=(64, 192, 64),
-            line_weight=request["line_weight"],
-        )
-        # exporter.add_layer(
-        #     "Hidden",
-        #     line_color=(32, 64, 32),
-        #     line_type=b3d.LineType.ISO_DOT,
-        # )
-        try:
-            exporter.add_shape(visible, layer="Visible")
-            # exporter.add_shape(hidden, layer="Hidden")
-        except:
-            pass
-        exporter.write(path)
+        svg_edges.write(edges_path, segments)
+
+
+def process(path, request):
+    try:
+        # The shape is deserialized once for all views
+        b3d_obj = b3d.Solid(request["wrapped"])
+
+        views = request.get("views", None)
+        if views is None:
+            views = [
+                {
+                    "path": path,
+                    "viewport_origin": request["viewport_origin"],
+                }
+            ]
+
+        # OCP does not release the GIL, so the views are rendered one by one
+        for view in views:
+            render_view(
+                b3d_obj,
+                view["path"],
+                view["viewport_origin"],
+                view.get("viewport_up", (0, 0, 1)),
+                request["line_weight"],
+                view.get("edges_path", None),
+            )
 
         return {
             "success": True,
@@ -74,9 +110,6 @@ def process(path, request):
         }
 
 
-path, request = wrapper_common.handle_input()
-
-# Perform rendering
-response = process(path, request)
-
-wrapper_common.handle_output(response)
+if __name__ == "__main__":
+    # Perform rendering
+    wrapper_common.main(process)
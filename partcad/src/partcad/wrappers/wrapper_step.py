@@ -16,12 +16,20 @@ import sys
 import cadquery as cq
 
 sys.path.append(os.path.dirname(__file__))
+import brep_codec
 import wrapper_common
 
 
 def process(path, request):
     shape = cq.importers.importStep(path).val().wrapped
 
+    if "brep_path" in request:
+        # Write the shape directly to the file provided by PartCAD
+        # instead of sending it back over the pipe
+        with open(request["brep_path"], "wb") as f:
+            f.write(brep_codec.encode(shape))
+        shape = None
+
     return {
         "success": True,
         "exception": None,
@@ -29,9 +37,6 @@ def process(path, request):
     }
 
 
-path, request = wrapper_common.handle_input()
-
-# Call CadQuery
-model = process(path, request)
-
-wrapper_common.handle_output(model)
+if __name__ == "__main__":
+    # Call CadQuery
+    wrapper_common.main(process)
@@ -9,6 +9,15 @@
 #
 
 import asyncio
+import json
+import os
+import pytest
+import tempfile
+
+from OCP.Bnd import Bnd_Box
+from OCP.BRepBndLib import BRepBndLib
+from OCP.BRepPrimAPI import BRepPrimAPI_MakeBox
+from OCP.TopoDS import TopoDS_Iterator
 
 import partcad as pc
 
@@ -63,3 +72,71 @@ def test_assembly_example_assy_logo_bom():
     assert bom is not None
     assert len(bom.keys()) == 3
     assert sum(bom.values()) == 5
+
+
+def test_assembly_instancing():
+    ctx = pc.init("examples")
+    part = ctx.get_part("/produce_part_cadquery_primitive:cube")
+    assert part is not None
+
+    model = pc.Assembly({"name": "instancing"})
+    for i in range(3):
+        model.add(part, loc=pc.Location((i * 2, 0, 0), (0, 0, 1), 0))
+    shape = asyncio.run(model.get_shape())
+    assert shape is not None
+
+    # The instances are located references to the same geometry
+    children = []
+    iterator = TopoDS_Iterator(shape)
+    while iterator.More():
+        children.append(iterator.Value())
+        iterator.Next()
+    assert len(children) == 3
+    assert children[0].IsPartner(children[1])
+    assert children[0].IsPartner(children[2])
+    assert not children[0].IsSame(children[1])
+
+
+def test_assembly_located_part():
+    """The location of the child replaces the location of the part"""
+    box = BRepPrimAPI_MakeBox(1, 1, 1).Shape()
+    part = pc.Part({"name": "box"}, box.Moved(pc.Location((5, 0, 0)).wrapped))
+
+    model = pc.Assembly({"name": "located"})
+    model.add(part, name="box1", loc=pc.Location((0, 10, 0)))
+    shape = asyncio.run(model.get_shape())
+    bbox = Bnd_Box()
+    BRepBndLib.Add_s(shape, bbox)
+    assert bbox.CornerMin().X() == pytest.approx(0, abs=1e-6)
+    assert bbox.CornerMin().Y() == pytest.approx(10, abs=1e-6)
+
+    compound = asyncio.run(model.get_build123d())
+    assert compound.label == "located"
+    assert [child.label for child in compound.children] == ["box1"]
+
+
+def test_assembly_gltf_instancing():
+    ctx = pc.init("examples")
+    part = ctx.get_part("/produce_part_cadquery_primitive:cube")
+    assert part is not None
+
+    model = pc.Assembly({"name": "instancing"})
+    for i in range(3):
+        model.add(part, loc=pc.Location((i * 2, 0, 0), (0, 0, 1), 0))
+
+    output_dir = tempfile.mkdtemp()
+    filepath = os.path.join(output_dir, "instancing.json")
+    model.render_gltf(ctx, filepath=filepath)
+    with open(filepath) as f:
+        gltf = json.load(f)
+
+    # One mesh shared by all instances
+    assert len(gltf["meshes"]) == 1
+    # The assembly is the only child of the node converting the axes
+    axes = gltf["nodes"][gltf["scenes"][0]["nodes"][0]]
+    root = gltf["nodes"][axes["children"][0]]
+    assert len(root["children"]) == 3
+    for index in root["children"]:
+        assert gltf["nodes"][index]["mesh"] == 0
+    bin_path = os.path.join(output_dir, gltf["buffers"][0]["uri"])
+    assert os.path.getsize(bin_path) == gltf["buffers"][0]["byteLength"]
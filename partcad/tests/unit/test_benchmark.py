@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-11
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import json
+
+import partcad as pc
+from partcad.benchmark import create_suite
+
+
+def test_benchmark_serialize():
+    ctx = pc.init("examples")
+    suite = create_suite(
+        ctx, rounds=2, filters=["serialize/message:/produce_part_stl:cube"]
+    )
+    assert len(suite.cases) == 1
+    try:
+        suite.run()
+    finally:
+        suite.cleanup()
+
+    result = suite.results[0]
+    assert result.error is None
+    assert result.cold is not None
+    assert len(result.warm) == 2
+    assert result.size > 0
+
+    data = json.loads(json.dumps(suite.to_dict()))
+    assert data["results"][0]["throughput_unit"] == "MB/s"
+    comparison = suite.compare(data)
+    assert len(comparison) == 1
+    assert comparison[0][3] == 1.0
+
+
+def test_benchmark_memory():
+    ctx = pc.init("examples")
+    suite = create_suite(ctx, rounds=1, filters=["runtime/subprocess"])
+    try:
+        suite.run()
+    finally:
+        suite.cleanup()
+
+    result = suite.results[0]
+    assert result.error is None
+    assert result.peak_rss > 0
+    data = suite.to_dict()["results"][0]
+    assert data["peak_traced"] == result.peak_traced
+    assert "workers_peak_rss" in data
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-15
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+from io import BytesIO
+import os
+import sys
+
+from OCP.BRepPrimAPI import BRepPrimAPI_MakeBox
+from OCP.BRepTools import BRepTools
+from OCP.TopAbs import TopAbs_ShapeEnum
+
+import partcad as pc
+
+sys.path.append(os.path.join(os.path.dirname(pc.__file__), "wrappers"))
+import brep_codec
+
+
+def test_brep_codec_round_trip():
+    box = BRepPrimAPI_MakeBox(10, 20, 30).Shape()
+    for compression in brep_codec.get_compressions():
+        data = brep_codec.encode(box, compression)
+        header = brep_codec.read_header(data)
+        assert header["compression"] == compression
+        assert header["shape_type"] == int(TopAbs_ShapeEnum.TopAbs_SOLID)
+        assert tuple(map(round, header["bbox"])) == (0, 0, 0, 10, 20, 30)
+
+        shape = brep_codec.decode(data)
+        assert shape.ShapeType() == TopAbs_ShapeEnum.TopAbs_SOLID
+        assert brep_codec.write_payload(shape) == brep_codec.write_payload(
+            box
+        )
+
+
+def test_brep_codec_legacy():
+    box = BRepPrimAPI_MakeBox(10, 20, 30).Shape()
+    with BytesIO() as bio:
+        BRepTools.Write_s(box, bio)
+        data = bio.getvalue()
+    assert brep_codec.read_header(data) is None
+    shape = brep_codec.decode(data)
+    assert shape.ShapeType() == TopAbs_ShapeEnum.TopAbs_SOLID
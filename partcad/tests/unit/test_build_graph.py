@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-10
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import asyncio
+import os
+import tempfile
+
+import partcad as pc
+from partcad.build_graph import get_fingerprint, BuildManifest
+
+
+def test_build_fingerprint_assembly():
+    ctx = pc.init("examples")
+    assembly = ctx._get_assembly("/produce_assembly_assy:primitive")
+    fingerprint = asyncio.run(get_fingerprint(ctx, assembly))
+    assert fingerprint is not None
+    assert asyncio.run(get_fingerprint(ctx, assembly)) == fingerprint
+
+    # A change in any child invalidates the assembly
+    child = assembly.children[0].item
+    child_fingerprint = child.fingerprint
+    assert child_fingerprint is not None
+    child.config["test_build_fingerprint"] = True
+    child.fingerprint = None
+    assembly.fingerprint = None
+    try:
+        assert asyncio.run(get_fingerprint(ctx, child)) != child_fingerprint
+        assert asyncio.run(get_fingerprint(ctx, assembly)) != fingerprint
+    finally:
+        del child.config["test_build_fingerprint"]
+        child.fingerprint = None
+        assembly.fingerprint = None
+
+
+def test_build_manifest():
+    path = tempfile.mkdtemp()
+    output = os.path.join(path, "output.stl")
+    manifest = BuildManifest("test", os.path.join(path, "manifest.json"))
+
+    # Nothing is recorded if the output was not produced
+    manifest.record(output, "a", output)
+    assert not manifest.is_up_to_date(output, "a", output)
+
+    with open(output, "w") as f:
+        f.write("solid")
+    manifest.record(output, "a", output)
+    manifest.save()
+
+    manifest = BuildManifest("test", os.path.join(path, "manifest.json"))
+    assert manifest.is_up_to_date(output, "a", output)
+    assert not manifest.is_up_to_date(output, "b", output)
+
+    # The output is rebuilt if it was modified or removed
+    os.unlink(output)
+    assert not manifest.is_up_to_date(output, "a", output)
+
+
+def test_build_fingerprint_local_modules():
+    ctx = pc.init("examples")
+    part = ctx._get_part("/produce_part_cadquery_primitive:cube")
+    fingerprint = asyncio.run(get_fingerprint(ctx, part))
+
+    # The scripts may import any Python module next to them
+    module_path = os.path.join(
+        os.path.dirname(part.path), "test_build_fingerprint.py"
+    )
+    with open(module_path, "w") as f:
+        f.write("SIZE = 1\n")
+    part.fingerprint = None
+    try:
+        assert asyncio.run(get_fingerprint(ctx, part)) != fingerprint
+    finally:
+        os.unlink(module_path)
+        part.fingerprint = None
+    assert asyncio.run(get_fingerprint(ctx, part)) == fingerprint
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-05
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import asyncio
+import os
+import tempfile
+import time
+
+import partcad as pc
+from partcad.cache import Cache
+
+
+def test_cache_put_get():
+    cache = Cache(path=tempfile.mkdtemp(), max_size=1048576, enabled=True)
+    key = Cache.hash("test", b"source", {"parameters": {"a": 1}})
+    assert cache.get("test", key) is None
+    cache.put("test", key, b"data")
+    assert cache.get("test", key) == b"data"
+    assert cache.stats()["test"]["count"] == 1
+
+
+def test_cache_hash():
+    assert Cache.hash("a", {"b": 1}) == Cache.hash("a", {"b": 1})
+    assert Cache.hash("a", {"b": 1}) != Cache.hash("a", {"b": 2})
+    assert Cache.hash("ab", "c") != Cache.hash("a", "bc")
+
+
+def test_cache_disabled():
+    cache = Cache(path=tempfile.mkdtemp(), max_size=1048576, enabled=False)
+    key = Cache.hash("test")
+    cache.put("test", key, b"data")
+    assert cache.get("test", key) is None
+
+
+def test_cache_delete():
+    cache = Cache(path=tempfile.mkdtemp(), max_size=1048576, enabled=True)
+    key = Cache.hash("test")
+    cache.put("test", key, b"data")
+    assert cache.size == 4
+    cache.delete("test", key)
+    assert cache.get("test", key) is None
+    assert cache.size == 0
+    # Deleting a missing entry is not an error
+    cache.delete("test", key)
+    assert cache.size == 0
+
+
+def test_cache_lru_eviction():
+    cache = Cache(path=tempfile.mkdtemp(), max_size=2500, enabled=True)
+    keys = [Cache.hash("test", i) for i in range(3)]
+    for key in keys:
+        cache.put("test", key, b"x" * 1000)
+        # Make sure the modification times are different
+        time.sleep(0.01)
+    # The first entry must have been evicted as the least recently used
+    assert cache.get("test", keys[0]) is None
+    assert cache.get("test", keys[2]) is not None
+
+
+def test_cache_prune():
+    cache = Cache(path=tempfile.mkdtemp(), max_size=1048576, enabled=True)
+    for i in range(4):
+        cache.put("test", Cache.hash("test", i), b"x" * 1000)
+    count, freed = cache.prune(0)
+    assert count == 4
+    assert freed == 4000
+    assert cache.entries() == []
+
+
+def test_cache_shape():
+    ctx = pc.init("examples")
+    cube = ctx._get_part("/produce_part_cadquery_primitive:cube")
+    shape = asyncio.run(cube.get_wrapped())
+
+    cache = Cache(path=tempfile.mkdtemp(), max_size=1048576, enabled=True)
+    key = Cache.hash("test", "cube")
+    cache.put_shape(key, shape)
+    assert os.path.exists(cache.get_entry_path("shape", key))
+    cached = cache.get_shape(key)
+    assert cached is not None
+    assert cached.ShapeType() == shape.ShapeType()
+
+
+def test_cache_components():
+    from OCP.BRepBuilderAPI import BRepBuilderAPI_MakeEdge
+    from OCP.gp import gp_Pnt
+
+    ctx = pc.init("examples")
+    cube = ctx._get_part("/produce_part_cadquery_primitive:cube")
+    shape = asyncio.run(cube.get_wrapped())
+    edge = BRepBuilderAPI_MakeEdge(gp_Pnt(0, 0, 0), gp_Pnt(1, 0, 0)).Edge()
+
+    cache = Cache(path=tempfile.mkdtemp(), max_size=1048576, enabled=True)
+    key = Cache.hash("test", "components")
+    assert cache.get_components(key) is None
+    cache.put_components(key, [shape, [edge, []]])
+    components = cache.get_components(key)
+    assert len(components) == 2
+    assert components[0].ShapeType() == shape.ShapeType()
+    assert components[1][0].ShapeType() == edge.ShapeType()
+    assert components[1][1] == []
+
+
+def test_cache_hash_sources():
+    path = tempfile.mkdtemp()
+    with open(os.path.join(path, "part.py"), "w") as f:
+        f.write("import helper\n")
+    os.makedirs(os.path.join(path, "lib"))
+    with open(os.path.join(path, "lib", "helper.py"), "w") as f:
+        f.write("SIZE = 1\n")
+    key = Cache.hash_sources(path)
+    assert Cache.hash_sources(path, path) == key
+
+    # A change in any local module changes the key
+    with open(os.path.join(path, "lib", "helper.py"), "w") as f:
+        f.write("SIZE = 2\n")
+    assert Cache.hash_sources(path) != key
+    key = Cache.hash_sources(path)
+
+    # Other packages and non-Python files are not covered
+    with open(os.path.join(path, "data.txt"), "w") as f:
+        f.write("data")
+    os.makedirs(os.path.join(path, "other"))
+    with open(os.path.join(path, "other", "partcad.yaml"), "w") as f:
+        f.write("")
+    with open(os.path.join(path, "other", "other.py"), "w") as f:
+        f.write("")
+    assert Cache.hash_sources(path) == key
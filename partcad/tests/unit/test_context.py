@@ -57,6 +57,11 @@ def test_ctx_stats2():
 
     assert new_memory > old_memory
 
+    # The geometry is accounted for in the package of the part
+    stats = ctx.stats_memory_packages["/produce_part_cadquery_primitive"]
+    assert stats["instantiated"] == 1
+    assert stats["native"] > 0
+
 
 def test_ctx_fini():
     ctx1 = pc.init()
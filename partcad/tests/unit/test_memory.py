@@ -0,0 +1,87 @@
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-17
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+from OCP.BRepPrimAPI import BRepPrimAPI_MakeBox
+from OCP.gp import gp_Trsf, gp_Vec
+from OCP.TopLoc import TopLoc_Location
+from OCP.TopoDS import TopoDS_Builder, TopoDS_Compound
+
+from partcad.memory import MemoryBudget, MemoryStats, get_native_size
+
+
+class FakeShape:
+    def __init__(self, name, size):
+        self.project_name = "/test"
+        self.name = name
+        self.size = size
+        self.evicted = False
+
+    def get_memory_usage(self):
+        return 0, self.size
+
+    def evict(self):
+        self.evicted = True
+
+
+def test_memory_native_size_instances():
+    box = BRepPrimAPI_MakeBox(1, 1, 1).Shape()
+    box_size = get_native_size(box)
+    assert box_size > 0
+
+    builder = TopoDS_Builder()
+    compound = TopoDS_Compound()
+    builder.MakeCompound(compound)
+    for i in range(10):
+        trsf = gp_Trsf()
+        trsf.SetTranslation(gp_Vec(i * 2, 0, 0))
+        builder.Add(compound, box.Moved(TopLoc_Location(trsf)))
+
+    # The geometry of the instances is counted once
+    assert get_native_size(compound) < 2 * box_size
+
+
+def test_memory_budget_lru():
+    budget = MemoryBudget(limit=250)
+    shapes = [FakeShape("shape%d" % i, 100) for i in range(3)]
+    budget.add(shapes[0])
+    budget.add(shapes[1])
+    budget.touch(shapes[0])
+    budget.add(shapes[2])
+
+    # The least recently used one is evicted
+    assert not shapes[0].evicted
+    assert shapes[1].evicted
+    assert not shapes[2].evicted
+    assert budget.size == 200
+    assert budget.stats_evicted == 1
+
+
+def test_memory_budget_disabled():
+    budget = MemoryBudget(limit=0)
+    shape = FakeShape("shape", 100)
+    budget.add(shape)
+    assert not shape.evicted
+    assert budget.size == 0
+
+
+def test_memory_stats_running_totals():
+    stats = MemoryStats()
+    shapes = [FakeShape("shape%d" % i, 100) for i in range(2)]
+    stats.add_shape(shapes[0])
+    stats.add_shape(shapes[1])
+    stats.add_shape(shapes[0])
+    stats.remove_shape(shapes[1])
+    stats.remove_shape(shapes[1])
+
+    # The memory usage is estimated when the totals are requested
+    shapes[0].size = 50
+    totals = MemoryStats()
+    totals.add_totals(stats)
+    assert totals.packages["/test"]["instantiated"] == 1
+    assert totals.native == 50
@@ -12,7 +12,11 @@ import asyncio
 import pytest
 import shutil
 
+from OCP.BRepPrimAPI import BRepPrimAPI_MakeBox
+
 import partcad as pc
+from partcad.cache import Cache
+from partcad.step_importer import StepFileInfo
 
 test_config_local = {
     "name": "/primitive_local",
@@ -50,6 +54,17 @@ def test_part_get_step_2():
     assert wrapped is not None
 
 
+def test_part_get_step_info():
+    """Estimate the complexity of a STEP file"""
+    info = StepFileInfo("examples/produce_part_step/bolt.step")
+    assert info.size == 701052
+    assert info.entities > 0
+    assert not info.is_simple()
+    assert (
+        info.hash == StepFileInfo("examples/produce_part_step/bolt.step").hash
+    )
+
+
 def test_part_get_stl():
     """Load a STL part"""
     ctx = pc.Context("examples/produce_part_stl")
@@ -165,3 +180,39 @@ def test_part_example_build123d_primitive():
 
     wrapped = ctx.get_part_shape("/produce_part_build123d_primitive:cube")
     assert wrapped is not None
+
+
+def test_part_get_wrapped_memoized():
+    """The transformed shape is computed once and reused"""
+    shape = BRepPrimAPI_MakeBox(1, 1, 1).Shape()
+    part = pc.Part({"name": "box", "offset": [[1, 2, 3]]}, shape)
+    wrapped = asyncio.run(part.get_wrapped())
+    assert wrapped is not shape
+    assert wrapped.IsPartner(shape)
+    assert asyncio.run(part.get_wrapped()) is wrapped
+    assert asyncio.run(part.get_cadquery()).wrapped.IsSame(wrapped)
+    assert asyncio.run(part.get_build123d()).wrapped.IsSame(wrapped)
+
+
+def test_part_get_shape_hash_memoized():
+    """The hash of the geometry is computed once per instantiated shape"""
+    shape = BRepPrimAPI_MakeBox(1, 1, 1).Shape()
+    part = pc.Part({"name": "box"}, shape)
+    wrapped = asyncio.run(part.get_wrapped())
+    shape_hash = part.get_shape_hash(wrapped)
+    assert shape_hash == Cache.hash_shape(wrapped)
+    assert part.shape_hash_source is wrapped
+    assert part.get_shape_hash(wrapped) is shape_hash
+
+
+def test_part_get_properties():
+    """The geometric properties are computed once and cached"""
+    shape = BRepPrimAPI_MakeBox(10, 20, 30).Shape()
+    part = pc.Part({"name": "box"}, shape)
+    properties = asyncio.run(part.get_properties())
+    assert properties["size"] == pytest.approx([10, 20, 30])
+    assert properties["volume"] == pytest.approx(6000)
+    assert properties["area"] == pytest.approx(2200)
+    assert properties["center_of_mass"] == pytest.approx([5, 10, 15])
+    assert properties["solids"] == 1
+    assert asyncio.run(part.get_properties()) is properties
@@ -8,9 +8,20 @@
 # Licensed under Apache License, Version 2.0.
 #
 
+import asyncio
+import json
+import os
 import tempfile
+import xml.etree.ElementTree as ET
+import zipfile
+
+import numpy as np
 
 import partcad as pc
+from partcad.mesh import Mesh, decimate, write_3mf
+from partcad.plugin_export_png_numpy import rasterize
+from partcad import render_shaded
+from partcad.render_planner import RenderPlanner
 
 
 def test_render_svg_part_1():
@@ -56,3 +67,193 @@ def test_render_project():
     assert prj is not None
     output_dir = tempfile.mkdtemp()
     prj.render(output_dir=output_dir)
+
+
+def test_render_mesh_shared():
+    """Render all mesh formats using a single triangulation"""
+    ctx = pc.init("examples")
+    prj = ctx.get_project("/produce_part_cadquery_primitive")
+    cube = prj.get_part("cube")
+    output_dir = tempfile.mkdtemp()
+    cube.render_stl(ctx, filepath=os.path.join(output_dir, "cube.stl"))
+    cube.render_obj(ctx, filepath=os.path.join(output_dir, "cube.obj"))
+    cube.render_3mf(ctx, filepath=os.path.join(output_dir, "cube.3mf"))
+    assert len(cube.meshes) == 1
+
+    mesh = asyncio.run(cube.get_mesh(0.1, 0.1))
+    # A cube has 6 faces, 2 triangles each
+    assert mesh.triangles.shape == (12, 3)
+    for filename in ["cube.stl", "cube.obj", "cube.3mf"]:
+        assert os.path.getsize(os.path.join(output_dir, filename)) > 0
+
+
+def test_render_planner_dedupe():
+    """Shared prerequisites are planned once"""
+    ctx = pc.init("examples")
+    prj = ctx.get_project("/produce_part_cadquery_primitive")
+    cube = prj.get_part("cube")
+    planner = RenderPlanner(ctx, prj)
+    for kind in ["svg", "png", "stl", "obj", "step"]:
+        planner.add(cube, kind)
+    # instantiate, svg-source, mesh and the 5 formats
+    assert len(planner.jobs) == 8
+
+
+def test_render_svg_views():
+    """Render several views of a shape in one go"""
+    ctx = pc.init("examples")
+    prj = ctx.get_project("/produce_part_cadquery_primitive")
+    cube = prj.get_part("cube")
+    output_dir = tempfile.mkdtemp()
+    filepath = os.path.join(output_dir, "cube.svg")
+    cube.render_svg(ctx, filepath=filepath, views=["front", "top", [1, 1, 1]])
+    for filename in [
+        "cube.svg",
+        "cube-front.svg",
+        "cube-top.svg",
+        "cube-1_1_1.svg",
+    ]:
+        assert os.path.getsize(os.path.join(output_dir, filename)) > 0
+
+
+def test_render_png_rasterize():
+    """Rasterize line segments without the SVG renderer"""
+    # A square
+    segments = [0, 0, 10, 0, 10, 0, 10, 10, 10, 10, 0, 10, 0, 10, 0, 0]
+    image = rasterize(segments, 100, 100)
+    assert image.shape == (100, 100, 4)
+    # The outline is drawn, the inside is transparent
+    assert image[:, :, 3].max() == 255
+    assert image[50, 50, 3] == 0
+    assert image[50, :10, 3].max() > 0
+
+
+def test_render_png_numpy():
+    """Render a PNG file using the numpy exporter"""
+    ctx = pc.init("examples")
+    prj = ctx.get_project("/produce_part_cadquery_primitive")
+    cube = prj.get_part("cube")
+    svg_path = asyncio.run(cube._get_svg_path(ctx, None))
+    output_dir = tempfile.mkdtemp()
+    filepath = os.path.join(output_dir, "cube.png")
+    pc.PluginExportPngNumpy().export(None, svg_path, 256, 256, filepath)
+    assert os.path.getsize(filepath) > 0
+
+
+def test_render_png_shaded_raster():
+    """Rasterize a triangulation with the z-buffer"""
+    # Two overlapping squares, the nearest one (z=1) is seen from above
+    vertices = [
+        [0, 0, 0],
+        [10, 0, 0],
+        [10, 10, 0],
+        [0, 10, 0],
+        [5, 5, 1],
+        [15, 5, 1],
+        [15, 15, 1],
+        [5, 15, 1],
+    ]
+    triangles = [[0, 1, 2], [0, 2, 3], [4, 5, 6], [4, 6, 7]]
+    mesh = Mesh(vertices, [[0, 0, 1]] * 8, triangles)
+    for shading in render_shaded.SHADINGS:
+        image = render_shaded.render(
+            mesh, 64, 64, origin=[0, 0, 100], up=[0, 1, 0], shading=shading
+        )
+        assert image.shape == (64, 64, 4)
+        # The corners are not covered, the center is
+        assert image[0, 63, 3] == 0
+        assert image[32, 32, 3] == 255
+        assert image[32, 32, 1] > 0
+
+
+def test_render_png_shaded():
+    """Render a shaded PNG file from the triangulation"""
+    ctx = pc.init("examples")
+    prj = ctx.get_project("/produce_part_cadquery_primitive")
+    cube = prj.get_part("cube")
+    output_dir = tempfile.mkdtemp()
+    filepath = os.path.join(output_dir, "cube.png")
+    cube.render_png(
+        ctx, filepath=filepath, width=128, height=128, mode="shaded"
+    )
+    assert os.path.getsize(filepath) > 0
+    # No SVG projection is needed
+    assert cube.svg_path is None
+
+
+def test_render_mesh_decimate():
+    """Decimate a triangulation"""
+    # A 20x20 grid on a plane
+    x, y = np.meshgrid(np.arange(21.0), np.arange(21.0))
+    vertices = np.stack([x.ravel(), y.ravel(), np.zeros(21 * 21)], axis=1)
+    quads = np.arange(20 * 21).reshape(20, 21)[:, :20].ravel()
+    triangles = np.concatenate(
+        [
+            np.stack([quads, quads + 1, quads + 22], axis=1),
+            np.stack([quads, quads + 22, quads + 21], axis=1),
+        ]
+    )
+    mesh = Mesh(vertices, [[0, 0, 1]] * len(vertices), triangles)
+
+    decimated = decimate(mesh, 0.25)
+    assert 0 < len(decimated.vertices) < len(mesh.vertices)
+    assert 0 < len(decimated.triangles) < len(mesh.triangles)
+    assert decimated.triangles.max() < len(decimated.vertices)
+    # The vertices stay on the plane
+    assert np.allclose(decimated.vertices[:, 2], 0, atol=1e-4)
+
+
+def test_render_3mf_name():
+    """Escape the name of the object in 3MF"""
+    mesh = Mesh([[0, 0, 0], [1, 0, 0], [0, 1, 0]], [[0, 0, 1]] * 3, [[0, 1, 2]])
+    filepath = os.path.join(tempfile.mkdtemp(), "part.3mf")
+    write_3mf(mesh, filepath, name='M3 <"bolt"> & nut')
+    with zipfile.ZipFile(filepath) as z:
+        model = ET.fromstring(z.read("3D/3dmodel.model"))
+    namespace = "{http://schemas.microsoft.com/3dmanufacturing/core/2015/02}"
+    obj = model.find("%sresources/%sobject" % (namespace, namespace))
+    assert obj.get("name") == 'M3 <"bolt"> & nut'
+
+
+def test_render_gltf_axes():
+    """Render glTF in metres with the Y axis up"""
+    ctx = pc.init("examples")
+    prj = ctx.get_project("/produce_part_cadquery_primitive")
+    cube = prj.get_part("cube")
+    output_dir = tempfile.mkdtemp()
+    filepath = os.path.join(output_dir, "cube.json")
+    cube.render_gltf(ctx, filepath=filepath)
+    with open(filepath) as f:
+        gltf = json.load(f)
+
+    root = gltf["nodes"][gltf["scenes"][0]["nodes"][0]]
+    matrix = np.array(root["matrix"]).reshape(4, 4).T
+    # Z-up millimetres are converted to Y-up metres
+    assert np.allclose(matrix @ [0, 0, 1000, 1], [0, 1, 0, 1])
+    assert np.allclose(matrix @ [0, 1000, 0, 1], [0, 0, -1, 1])
+    assert np.allclose(matrix @ [1000, 0, 0, 1], [1, 0, 0, 1])
+
+    # The meshes stay in millimetres
+    node = gltf["nodes"][root["children"][0]]
+    accessor = gltf["accessors"][
+        gltf["meshes"][node["mesh"]]["primitives"][0]["attributes"]["POSITION"]
+    ]
+    assert np.allclose(accessor["min"], [-5, -5, -5], atol=1e-3)
+    assert np.allclose(accessor["max"], [5, 5, 5], atol=1e-3)
+
+
+def test_render_gltf_lods():
+    """Render the levels of detail to glTF"""
+    ctx = pc.init("examples")
+    prj = ctx.get_project("/produce_part_cadquery_primitive")
+    cube = prj.get_part("cube")
+    cube.config["render"] = {"gltf": {"lods": [1.0, {"decimate": 0.5}]}}
+    output_dir = tempfile.mkdtemp()
+    filepath = os.path.join(output_dir, "cube.json")
+    cube.render_gltf(ctx, filepath=filepath)
+    with open(filepath) as f:
+        gltf = json.load(f)
+
+    assert gltf["extensionsUsed"] == ["MSFT_lod"]
+    assert len(gltf["meshes"]) == 3
+    assert gltf["nodes"][0]["extensions"]["MSFT_lod"]["ids"] == [1, 2]
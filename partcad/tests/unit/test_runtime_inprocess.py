@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-14
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import asyncio
+import os
+import sys
+
+from OCP.TopoDS import TopoDS_Shape
+
+from partcad import runtime_inprocess
+
+CUBE_PATH = "examples/produce_part_cadquery_primitive/cube.py"
+CUBE_DIR = "examples/produce_part_cadquery_primitive"
+
+
+def test_runtime_inprocess_cadquery():
+    cwd = os.getcwd()
+    ocp_vscode = sys.modules.get("ocp_vscode", None)
+    response, errors = asyncio.run(
+        runtime_inprocess.run_wrapper(
+            "cadquery",
+            CUBE_PATH,
+            CUBE_DIR,
+            {"build_parameters": {}, "patch": {}},
+        )
+    )
+    assert response is not None, errors
+    assert response["success"]
+    # The shapes are returned as they are, without serialization
+    assert len(response["shapes"]) == 1
+    assert isinstance(response["shapes"][0], TopoDS_Shape)
+    # The global state is restored
+    assert os.getcwd() == cwd
+    assert sys.modules.get("ocp_vscode", None) is ocp_vscode
+
+
+def test_runtime_inprocess_error():
+    response, errors = asyncio.run(
+        runtime_inprocess.run_wrapper(
+            "cadquery",
+            CUBE_PATH,
+            CUBE_DIR,
+            {"build_parameters": {}, "patch": {"\\Z": "\n1 / 0\n"}},
+        )
+    )
+    assert response is not None
+    assert not response["success"]
+    assert "division by zero" in errors
+
+
+def test_runtime_inprocess_requirements():
+    assert runtime_inprocess.is_satisfied("packaging")
+    assert runtime_inprocess.is_satisfied("packaging>=1.0")
+    assert not runtime_inprocess.is_satisfied("packaging<1.0")
+    assert not runtime_inprocess.is_satisfied("partcad-nonexistent-package")
+    # The requirements for the other platforms are ignored
+    assert runtime_inprocess.is_satisfied(
+        'partcad-nonexistent-package; python_version < "3.0"'
+    )
+    assert not runtime_inprocess.is_satisfied("-r requirements.txt")
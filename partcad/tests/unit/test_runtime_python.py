@@ -9,10 +9,16 @@
 #
 
 import asyncio
+import hashlib
+import os
 import pytest
 import sys
+import tempfile
 
 import partcad as pc
+from partcad.runtime_limits import RuntimeLimits
+from partcad.runtime_python import CADQUERY_REQUIREMENTS
+from partcad.runtime_python_conda import get_clone_manifest
 from partcad.user_config import user_config
 
 
@@ -80,3 +86,139 @@ def test_runtime_python_version_3_11_conda():
     version_string, errors = asyncio.run(runtime.run(["--version"]))
     assert errors == ""
     assert version_string.startswith("Python 3.11")
+
+
+def test_runtime_python_conda_direct():
+    user_config.python_runtime = "conda"
+    ctx = pc.Context("partcad/tests")
+    runtime = ctx.get_python_runtime("3.11")
+    runtime.once()
+    if runtime.python_exec is None:
+        pytest.skip("The environment requires activation scripts")
+    # The interpreter of the environment is executed without "conda run"
+    assert runtime.get_python_cmd() == [runtime.python_exec]
+    assert runtime.python_exec.startswith(runtime.path)
+    prefix, errors = asyncio.run(
+        runtime.run(["-c", "import os, sys; print(sys.prefix)"])
+    )
+    assert errors == ""
+    assert os.path.samefile(prefix.strip(), runtime.path)
+
+
+def test_runtime_python_timeout():
+    user_config.python_runtime = "none"
+    ctx = pc.Context("partcad/tests")
+    runtime = ctx.get_python_runtime()
+    _, errors = asyncio.run(
+        runtime.run(
+            ["-c", "import time; time.sleep(30)"],
+            limits=RuntimeLimits(timeout=1),
+        )
+    )
+    assert "time limit of 1s is exceeded" in errors
+
+
+def test_runtime_python_returncode():
+    user_config.python_runtime = "none"
+    ctx = pc.Context("partcad/tests")
+    runtime = ctx.get_python_runtime()
+    _, _, returncode = asyncio.run(
+        runtime.run(["-c", "import sys; sys.exit(3)"], returncode=True)
+    )
+    assert returncode == 3
+    assert not asyncio.run(
+        runtime._pip_install(["--no-index", "partcad-missing"], "missing")
+    )
+
+
+class FakeProject:
+    def __init__(self, path):
+        self.name = "/fake"
+        self.path = path
+        self.config_obj = {}
+
+
+def test_runtime_python_legacy_flags():
+    user_config.python_runtime = "none"
+    ctx = pc.Context("partcad/tests")
+    runtime = ctx.get_python_runtime()
+    project = FakeProject(tempfile.mkdtemp())
+    requirements_path = os.path.join(project.path, "requirements.txt")
+    with open(requirements_path, "w") as f:
+        f.write("partcad-missing\n")
+    os.utime(requirements_path, (1000000000, 1000000000))
+
+    # The flag file created by the earlier versions of PartCAD
+    os.makedirs(runtime.path, exist_ok=True)
+    flag_path = os.path.join(
+        runtime.path,
+        ".partcad.project."
+        + hashlib.sha256(project.path.encode()).hexdigest(),
+    )
+    open(flag_path, "w").close()
+    try:
+        asyncio.run(runtime.prepare_for_package(project))
+        # It is migrated to the manifest instead of installing again
+        projects = runtime._get_manifest()["projects"]
+        assert projects[requirements_path] == os.path.getmtime(flag_path)
+        assert not runtime.failed
+    finally:
+        os.unlink(flag_path)
+
+
+def test_runtime_python_failed_requirements():
+    user_config.python_runtime = "none"
+    ctx = pc.Context("partcad/tests")
+    runtime = ctx.get_python_runtime()
+    missing = os.path.join(tempfile.mkdtemp(), "partcad-missing")
+    asyncio.run(runtime.ensure_many([missing]))
+    # The failure is remembered for the session
+    assert missing in runtime.failed
+    assert not runtime._is_installed(missing)
+
+
+def test_runtime_python_limits_config():
+    limits = RuntimeLimits.from_config(
+        {"limits": {"timeout": 5, "memory": 100}}
+    )
+    assert limits.timeout == 5
+    assert limits.memory == 100 * 1048576
+    assert limits.cpu == (user_config.python_cpu_limit or None)
+
+
+def test_runtime_python_clone_manifest():
+    template_manifest = {
+        "requirements": {"cadquery==2.4.0": 1.0, "cadquery": 1.0},
+        "projects": {"/path/requirements.txt": 1.0},
+        "installed": {"cadquery": "2.4.0", "numpy": "1.24.1"},
+    }
+
+    # Everything made it into the clone
+    installed = {"cadquery": "2.4.0", "numpy": "1.24.1", "pip": "24.0"}
+    manifest = get_clone_manifest(template_manifest, installed)
+    assert manifest["requirements"] == template_manifest["requirements"]
+    assert manifest["requirements"] is not template_manifest["requirements"]
+    # The requirements of the packages are not inherited
+    assert manifest["projects"] == {}
+    assert manifest["installed"] == installed
+
+    # Something is missing, so nothing is trusted
+    manifest = get_clone_manifest(template_manifest, {"cadquery": "2.4.0"})
+    assert manifest["requirements"] == {}
+    assert manifest["installed"] == {"cadquery": "2.4.0"}
+
+
+def test_runtime_python_prepare():
+    ctx = pc.init("examples")
+    # Unknown packages are reported but don't stop the others
+    asyncio.run(
+        ctx.prepare_runtimes_async(
+            ["/produce_part_cadquery_primitive", "/missing"]
+        )
+    )
+    runtimes = list(ctx.runtimes_python.values())
+    assert len(runtimes) > 0
+    assert any(
+        all(map(runtime._is_installed, CADQUERY_REQUIREMENTS))
+        for runtime in runtimes
+    )
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-06
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import asyncio
+from io import BytesIO
+import sys
+
+import partcad as pc
+from partcad.runtime_python_worker import read_frame, write_frame
+from cq_serialize import register as register_cq_helper
+from wrapper_ipc import pack_message, unpack_message
+
+
+def test_worker_framing():
+    stream = BytesIO()
+    write_frame(stream, b"first")
+    write_frame(stream, b"")
+    write_frame(stream, b"x" * 100000)
+    stream.seek(0)
+    assert read_frame(stream) == b"first"
+    assert read_frame(stream) == b""
+    assert read_frame(stream) == b"x" * 100000
+    assert read_frame(stream) is None
+
+
+def test_worker_message():
+    message = {"argv": ["path"], "request": {"data": b"x" * 1000}}
+    assert unpack_message(pack_message(message)) == message
+
+
+def test_worker_message_file_handoff():
+    message = {"argv": ["path"], "request": {"data": b"x" * 1000}}
+    packed = pack_message(message, threshold=100)
+    assert len(packed) < 1000
+    assert unpack_message(packed) == message
+
+
+def test_worker_message_shape():
+    ctx = pc.init("examples")
+    cube = ctx._get_part("/produce_part_cadquery_primitive:cube")
+    shape = asyncio.run(cube.get_wrapped())
+    register_cq_helper()
+    message = unpack_message(pack_message({"wrapped": shape}))
+    assert message["wrapped"].ShapeType() == shape.ShapeType()
+
+
+def test_worker_pool_reuse():
+    ctx = pc.init("examples")
+    runtime = ctx.get_python_runtime(version="3.10")
+    pool = runtime.get_worker_pool()
+    started = pool.stats_started
+
+    cube = ctx._get_part("/produce_part_cadquery_primitive:cube")
+    for _ in range(2):
+        asyncio.run(cube.render_svg_somewhere(ctx, None))
+    assert pool.stats_started - started <= 1
+    assert pool.stats_reused >= 1
+    if sys.platform == "linux":
+        assert pool.stats_peak_rss > 0
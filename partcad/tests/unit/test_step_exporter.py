@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-18
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import asyncio
+import os
+import tempfile
+
+from OCP.Bnd import Bnd_Box
+from OCP.BRepBndLib import BRepBndLib
+from OCP.BRepPrimAPI import BRepPrimAPI_MakeBox
+from OCP.gp import gp_Trsf, gp_Vec
+from OCP.STEPControl import STEPControl_Reader
+from OCP.TopAbs import TopAbs_SOLID
+from OCP.TopExp import TopExp_Explorer
+from OCP.TopLoc import TopLoc_Location
+
+from partcad import step_exporter
+
+
+class FakeLocation:
+    def __init__(self, x):
+        trsf = gp_Trsf()
+        trsf.SetTranslation(gp_Vec(x, 0, 0))
+        self.wrapped = TopLoc_Location(trsf)
+
+
+class FakePart:
+    def __init__(self, name, location=None):
+        self.name = name
+        self.shape = BRepPrimAPI_MakeBox(1, 1, 1).Shape()
+        if location is not None:
+            self.shape = self.shape.Located(location.wrapped)
+
+    async def get_wrapped(self):
+        return self.shape
+
+
+class FakeChild:
+    def __init__(self, item, name, location):
+        self.item = item
+        self.name = name
+        self.location = location
+
+
+class FakeAssembly:
+    def __init__(self, name, children):
+        self.name = name
+        self.children = children
+        self.location = None
+
+    async def do_instantiate(self):
+        pass
+
+
+def get_positions(filepath):
+    reader = STEPControl_Reader()
+    reader.ReadFile(filepath)
+    reader.TransferRoots()
+    shape = reader.OneShape()
+    positions = []
+    explorer = TopExp_Explorer(shape, TopAbs_SOLID)
+    while explorer.More():
+        box = Bnd_Box()
+        BRepBndLib.Add_s(explorer.Current(), box)
+        positions.append(round(box.CornerMin().X()))
+        explorer.Next()
+    return sorted(positions)
+
+
+def test_step_exporter_instances():
+    part = FakePart("box")
+    row = FakeAssembly(
+        "row",
+        [FakeChild(part, "box%d" % i, FakeLocation(i * 10)) for i in range(3)],
+    )
+    top = FakeAssembly(
+        "top",
+        [
+            FakeChild(row, "row0", FakeLocation(0)),
+            FakeChild(row, "row1", FakeLocation(100)),
+        ],
+    )
+    node = asyncio.run(step_exporter.get_assembly_node(top))
+    filepath = os.path.join(tempfile.mkdtemp(), "top.step")
+    step_exporter.write_step(step_exporter.build_document(node), filepath)
+
+    # The part is written once and referenced by all of its instances
+    with open(filepath) as f:
+        assert f.read().count("MANIFOLD_SOLID_BREP") == 1
+
+    # The locations of the instances survive the round trip
+    assert get_positions(filepath) == [0, 10, 20, 100, 110, 120]
+
+
+def test_step_exporter_located_part():
+    # The location of the child replaces the location of the part
+    part = FakePart("box", FakeLocation(5))
+    assembly = FakeAssembly(
+        "assembly",
+        [
+            FakeChild(part, "box0", None),
+            FakeChild(part, "box1", FakeLocation(10)),
+        ],
+    )
+    node = asyncio.run(step_exporter.get_assembly_node(assembly))
+    filepath = os.path.join(tempfile.mkdtemp(), "assembly.step")
+    step_exporter.write_step(step_exporter.build_document(node), filepath)
+    assert get_positions(filepath) == [5, 10]
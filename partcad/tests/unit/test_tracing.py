@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+#
+# OpenVMP, 2024
+#
+# Author: Roman Kuzmenko
+# Created: 2024-10-12
+#
+# Licensed under Apache License, Version 2.0.
+#
+
+import asyncio
+
+import partcad as pc
+import partcad.logging as pc_logging
+import partcad.sync_threads as pc_thread
+from partcad.tracing import tracer
+
+
+def test_tracing_actions():
+    async def action(i):
+        async with pc_logging.Action("TestAction", "test", "item%d" % i):
+            await asyncio.sleep(0.01)
+
+    async def process():
+        with pc_logging.Process("TestProcess", "test"):
+            await asyncio.gather(action(1), action(2))
+
+    tracer.clear()
+    tracer.enable()
+    try:
+        asyncio.run(process())
+    finally:
+        tracer.disable()
+
+    events = tracer.to_chrome()["traceEvents"]
+    spans = {e["name"]: e for e in events if e["ph"] == "X"}
+    tracer.clear()
+
+    root = spans["TestProcess: test"]
+    assert "parent" not in root["args"]
+    for i in [1, 2]:
+        child = spans["TestAction: test: item%d" % i]
+        assert child["args"]["parent"] == root["args"]["id"]
+        assert child["ts"] >= root["ts"]
+        assert child["dur"] >= 10000.0 * 0.9
+
+
+def test_tracing_threads():
+    def action():
+        with pc_logging.Action("TestAction", "test", "sync"):
+            pass
+
+    async def async_action():
+        async with pc_logging.Action("TestAction", "test", "async"):
+            pass
+
+    async def process():
+        with pc_logging.Process("TestProcess", "test"):
+            await pc_thread.run(action)
+            await pc_thread.run_async(async_action)
+
+    tracer.clear()
+    tracer.enable()
+    try:
+        asyncio.run(process())
+    finally:
+        tracer.disable()
+
+    events = tracer.to_chrome()["traceEvents"]
+    spans = {e["name"]: e for e in events if e["ph"] == "X"}
+    tracer.clear()
+
+    # The spans opened in the worker threads are nested under the caller's
+    root = spans["TestProcess: test"]
+    for item in ["sync", "async"]:
+        child = spans["TestAction: test: %s" % item]
+        assert child["args"]["parent"] == root["args"]["id"]
+
+
+def test_tracing_otlp():
+    tracer.clear()
+    tracer.enable()
+    try:
+        with pc_logging.Action("TestAction", "test"):
+            pass
+    finally:
+        tracer.disable()
+
+    data = tracer.to_otlp(pc.__version__)
+    tracer.clear()
+    spans = data["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    assert len(spans) == 1
+    assert spans[0]["name"] == "TestAction: test"
+    assert len(spans[0]["traceId"]) == 32